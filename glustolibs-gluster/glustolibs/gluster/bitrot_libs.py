@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+#  Copyright (C) 2019 Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+    Description: Module for benchmarking the bitrot scrubber.
+"""
+
+import time
+from glusto.core import Glusto as g
+from glustolibs.gluster.bitrot_ops import (BitrotSigningTracker,
+                                           get_scrub_status_record,
+                                           scrub_ondemand,
+                                           set_scrub_throttle)
+from glustolibs.gluster.lib_utils import (get_extended_attributes_info,
+                                          get_pathinfo_bulk)
+
+SCRUB_THROTTLES = ('lazy', 'normal', 'aggressive')
+
+
+def _format_gfid(value):
+    # 0x<32 hex> -> uuid
+    value = value[2:] if value.startswith('0x') else value
+    return '-'.join((value[:8], value[8:12], value[12:16], value[16:20],
+                     value[20:]))
+
+
+class ScrubBenchmark(object):
+    """Measures the throughput of the scrubber and the time it takes to
+    detect corrupted files, under every scrub throttle.
+
+    A dataset of known size is written from a mount, optionally with the
+    backend copy of some files corrupted at known paths once they are
+    signed. Then an on demand scrub is run under every throttle while the
+    scrub status of all the nodes is sampled as typed records.
+
+    Example:
+        bench = ScrubBenchmark(mnode, "testvol", mounts[0], num_files=2000,
+                               file_size=1048576, corrupt=5)
+        results = bench.run()
+        >>>[{'throttle': 'lazy', 'duration': 412.3, 'files': 4000,
+             'bytes': 4194304000, 'files_per_sec': 9.7, 'mb_per_sec': 9.7,
+             'nodes': {...}, 'detections': {'scrub_bench/file1': 37.8,
+             ...}}, ...]
+    """
+    def __init__(self, mnode, volname, mount, num_files=1000,
+                 file_size=1048576, corrupt=0, dirname='scrub_bench',
+                 throttles=SCRUB_THROTTLES, interval=5):
+        """Initializes the benchmark.
+
+        Args:
+            mnode (str): Node on which cmd has to be executed.
+            volname (str): volume name
+            mount (GlusterMount): mount of the volume used to write the
+                dataset.
+
+        Kwargs:
+            num_files (int): number of files of the dataset.
+            file_size (int): size in bytes of every file.
+            corrupt (int|list): number of files, or paths relative to
+                dirname of the files, whose backend copy is corrupted.
+            dirname (str): dir of the dataset, relative to the volume root.
+            throttles (tuple): scrub throttles benchmarked, in order.
+            interval (int): seconds between the scrub status samples.
+        """
+        self.mnode = mnode
+        self.volname = volname
+        self.mount = mount
+        self.num_files = num_files
+        self.file_size = file_size
+        self.dirname = dirname.strip('/')
+        self.throttles = throttles
+        self.interval = interval
+        self.files = ["file%d" % index for index in range(1, num_files + 1)]
+        if isinstance(corrupt, int):
+            step = max(1, num_files // max(1, corrupt))
+            corrupt = self.files[::step][:corrupt]
+        self.corrupt = list(corrupt)
+
+        # path -> {'brick', 'gfid', 'time'} of the corrupted copies
+        self.corrupted = {}
+        # (time, throttle, ScrubStatus) samples of all the runs
+        self.samples = []
+        self.results = []
+
+    def populate(self, sign_timeout=600):
+        """Writes the dataset and waits until all the copies are signed,
+        as the scrubber skips the files not yet signed.
+
+        Kwargs:
+            sign_timeout (int): seconds to wait for the signing.
+
+        Returns:
+            True on success, False otherwise
+        """
+        path = "%s/%s" % (self.mount.mountpoint, self.dirname)
+        cmd = ("mkdir -p %s && cd %s && for i in $(seq 1 %d); do "
+               "head -c %d /dev/urandom > file$i || exit 1; done"
+               % (path, path, self.num_files, self.file_size))
+        ret, _, err = g.run(self.mount.client_system, cmd)
+        if ret != 0:
+            g.log.error("Failed to write the dataset under %s: %s",
+                        path, err)
+            return False
+
+        tracker = BitrotSigningTracker(self.mnode, self.volname,
+                                       self.dirname, self.files)
+        if not tracker.wait_for_signing(sign_timeout, self.interval):
+            return False
+        g.log.info("Dataset signed, signing latency: %s",
+                   tracker.get_latency_stats())
+        return True
+
+    def inject_corruption(self):
+        """Corrupts one backend copy of each of the files to corrupt,
+        without changing their size.
+
+        Returns:
+            True on success, False otherwise
+        """
+        if not self.corrupt:
+            return True
+        locations = get_pathinfo_bulk(self.mnode, self.volname,
+                                      self.dirname, self.corrupt)
+        if locations is None:
+            return False
+
+        for path in self.corrupt:
+            if not locations.get(path):
+                g.log.error("No backend copy of %s found", path)
+                return False
+            node, backend_path = locations[path][0].split(':', 1)
+            attrs = get_extended_attributes_info(node, [backend_path],
+                                                 attr_name='trusted.gfid')
+            if attrs is None:
+                return False
+            cmd = ("dd if=/dev/urandom of=%s bs=1 count=16 conv=notrunc"
+                   % backend_path)
+            ret, _, err = g.run(node, cmd)
+            if ret != 0:
+                g.log.error("Failed to corrupt %s on %s: %s",
+                            backend_path, node, err)
+                return False
+            self.corrupted["%s/%s" % (self.dirname, path)] = {
+                'brick': locations[path][0],
+                'gfid': _format_gfid(attrs[backend_path]['trusted.gfid']),
+                'time': time.time(),
+            }
+        return True
+
+    def run_scrub(self, throttle, timeout=3600):
+        """Runs an on demand scrub under the throttle and samples the scrub
+        status until all the nodes complete it.
+
+        Args:
+            throttle (str): scrub throttle (lazy|normal|aggressive)
+
+        Kwargs:
+            timeout (int): seconds to wait for the scrub to complete.
+
+        Returns:
+            dict: result of the run, with the keys 'throttle', 'duration'
+                (seconds from the start of the scrub to its completion on
+                all the nodes), 'files' and 'bytes' scrubbed, the
+                'files_per_sec' and 'mb_per_sec' throughputs, 'nodes'
+                (node -> dict of its 'files', 'skipped', 'duration' and
+                'files_per_sec') and 'detections' (corrupted path ->
+                seconds from the start of the scrub until it was reported
+                corrupted) of the corrupted files detected by the run.
+            NoneType: None on failure or timeout.
+        """
+        ret, _, err = set_scrub_throttle(self.mnode, self.volname, throttle)
+        if ret != 0:
+            g.log.error("Failed to set scrub throttle %s on volume %s: %s",
+                        throttle, self.volname, err)
+            return None
+        before = get_scrub_status_record(self.mnode, self.volname)
+        if before is None:
+            return None
+        last_completed = dict((node.node, node.lastCompletedScrubTime)
+                              for node in before.nodes)
+        detected = set()
+        for _, _, status in self.samples:
+            for node in status.nodes:
+                detected.update(node.corruptedGfids)
+
+        start = time.time()
+        ret, _, err = scrub_ondemand(self.mnode, self.volname)
+        if ret != 0:
+            g.log.error("Failed to start on demand scrub on volume %s: %s",
+                        self.volname, err)
+            return None
+
+        gfids = dict((corrupted['gfid'], path)
+                     for path, corrupted in self.corrupted.items())
+        detections = {}
+        while True:
+            time.sleep(self.interval)
+            now = time.time()
+            status = get_scrub_status_record(self.mnode, self.volname)
+            if status is None:
+                return None
+            self.samples.append((now, throttle, status))
+
+            for node in status.nodes:
+                for gfid in node.corruptedGfids:
+                    if gfid in gfids and gfid not in detected:
+                        detected.add(gfid)
+                        detections[gfids[gfid]] = now - start
+
+            completed = [node for node in status.nodes
+                         if node.lastCompletedScrubTime is not None and
+                         node.lastCompletedScrubTime !=
+                         last_completed.get(node.node)]
+            if (len(completed) == len(status.nodes) and
+                    'progress' not in (status.state or '').lower()):
+                break
+            if now - start > timeout:
+                g.log.error("Scrub with throttle %s did not complete on "
+                            "volume %s in %s seconds", throttle,
+                            self.volname, timeout)
+                return None
+
+        duration = now - start
+        nodes = {}
+        for node in status.nodes:
+            node_duration = float(node.lastScrubDuration or duration)
+            nodes[node.node] = {
+                'files': node.scrubbedFiles,
+                'skipped': node.skippedFiles,
+                'duration': node_duration,
+                'files_per_sec': (node.scrubbedFiles or 0) / node_duration,
+            }
+        files = sum(node['files'] or 0 for node in nodes.values())
+        result = {
+            'throttle': throttle,
+            'duration': duration,
+            'files': files,
+            'bytes': files * self.file_size,
+            'files_per_sec': files / duration,
+            'mb_per_sec': files * self.file_size / duration / 1048576.0,
+            'nodes': nodes,
+            'detections': detections,
+        }
+        self.results.append(result)
+        return result
+
+    def run(self, sign_timeout=600, timeout=3600):
+        """Writes the dataset, corrupts the files to corrupt and runs the
+        scrub under every throttle. The throttle of the volume is restored
+        at the end.
+
+        Kwargs:
+            sign_timeout (int): seconds to wait for the signing.
+            timeout (int): seconds to wait for every scrub to complete.
+
+        Returns:
+            list: results of run_scrub for every throttle. None on failure.
+        """
+        status = get_scrub_status_record(self.mnode, self.volname)
+        if status is None:
+            return None
+        if not self.populate(sign_timeout) or not self.inject_corruption():
+            return None
+
+        try:
+            for throttle in self.throttles:
+                result = self.run_scrub(throttle, timeout)
+                if result is None:
+                    return None
+                g.log.info("Scrub throttle %s: %d files in %.1fs, %.1f "
+                           "files/s, %.2f MB/s", throttle, result['files'],
+                           result['duration'], result['files_per_sec'],
+                           result['mb_per_sec'])
+        finally:
+            if status.scrubImpact:
+                set_scrub_throttle(self.mnode, self.volname,
+                                   status.scrubImpact)
+
+        undetected = (set(self.corrupted) -
+                      set(path for result in self.results
+                          for path in result['detections']))
+        if undetected:
+            g.log.error("Corrupted files not detected by the scrubber: %s",
+                        sorted(undetected))
+        return self.results
@@ -22,8 +22,14 @@
 from glusto.core import Glusto as g
 from glustolibs.gluster.volume_ops import get_volume_options, get_volume_status
 from glustolibs.gluster.lib_utils import (get_pathinfo,
+                                          get_pathinfo_bulk,
                                           calculate_checksum,
                                           get_extended_attributes_info)
+from glustolibs.gluster.xml_records import ListOf, Schema, to_int, to_str
+from glustolibs.io.utils import run_tree_scans, iter_tree_scan_dump
+import binascii
+import os
+import struct
 import time
 import re
 
@@ -185,6 +191,308 @@ def is_file_signed(mnode, filename, volname, expected_file_version=None):
     return True
 
 
+def decode_bitrot_signature(signature):
+    """Decodes a trusted.bit-rot.signature value.
+
+    Args:
+        signature (str): hex value of the attribute, with or without the
+            '0x' prefix of getfattr.
+
+    Returns:
+        tuple: (signature type (int), signed version (int), checksum (str))
+        NoneType: None if the value is too short to be a signature.
+
+    Example:
+        decode_bitrot_signature("0x0102000000000000006f...")
+        >>>(1, 2, '6f...')
+    """
+    if signature.startswith('0x'):
+        signature = signature[2:]
+    if len(signature) < 18:
+        return None
+    version = struct.unpack('<Q', binascii.unhexlify(signature[2:18]))[0]
+    return int(signature[:2], 16), version, signature[18:]
+
+
+def get_files_bitrot_info(mnode, volname, path='', files=None,
+                          checksum=True, jobs=4, locations=None):
+    """Gets the checksum and the bit-rot signature of all the backend
+    copies of the files under a directory of the volume, or of a set of
+    files. Backend locations are resolved from a single pathinfo sweep and
+    one tree_scan.py run per brick node hashes the files in parallel and
+    dumps the attributes of all of them at once.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): path relative to the volume root of the directory
+            whose files are verified. Defaults to the volume root.
+        files (list): paths relative to path of the files to verify
+            instead of all the files under path.
+        checksum (bool): False to only read the attributes, without
+            reading the files. Defaults to True.
+        jobs (int): number of files hashed in parallel on every node.
+        locations (dict): backend locations as returned by
+            get_pathinfo_bulk, to skip the pathinfo sweep.
+
+    Returns:
+        NoneType: None if the sweep or a scan fails.
+        dict: relative path of every file -> list of dicts, one per
+            backend copy, with the keys:
+            'brick': '<node>:<backend path>',
+            'checksum': sha256 of the copy (None if checksum is False),
+            'signed': True if the copy has a signature,
+            'version': signed version (None if not signed),
+            'signature': checksum in the signature (None if not signed),
+            'bad': True if the scrubber marked the copy bad,
+            'mtime': modification time of the copy,
+            'seen': time (of the node) when the attributes were read.
+
+    Example:
+        get_files_bitrot_info(mnode, "testvol", "dir1")
+    """
+    if locations is None:
+        locations = get_pathinfo_bulk(mnode, volname, path, files)
+        if locations is None:
+            return None
+
+    # (node, backend path) -> relative path
+    owners = {}
+    node_files = {}
+    for relpath, bricks in locations.items():
+        for brick in bricks:
+            node, backend_path = brick.split(':', 1)
+            owners[(node, backend_path)] = relpath
+            node_files.setdefault(node, []).append(backend_path)
+
+    args = "bitrot -j %d" % jobs
+    if not checksum:
+        args += " --no-hash"
+    nodes = list(node_files)
+    dumps = run_tree_scans([(node, args, node_files[node])
+                            for node in nodes])
+    if dumps is None:
+        g.log.error("Failed to get bit-rot info of the files of volume %s"
+                    % volname)
+        return None
+
+    info = dict((relpath, []) for relpath in locations)
+    for node, dump in zip(nodes, dumps):
+        for record in iter_tree_scan_dump(dump, fields=6):
+            backend_path, chksum, signature, bad, mtime, seen = [
+                field.decode('utf-8') for field in record]
+            decoded = decode_bitrot_signature(signature)
+            info[owners[(node, backend_path)]].append({
+                'brick': "%s:%s" % (node, backend_path),
+                'checksum': chksum or None,
+                'signed': decoded is not None,
+                'version': decoded[1] if decoded else None,
+                'signature': decoded[2] if decoded else None,
+                'bad': bad == '1',
+                'mtime': float(mtime),
+                'seen': float(seen),
+            })
+        os.remove(dump)
+    return info
+
+
+def are_files_signed(mnode, volname, path='', files=None,
+                     expected_file_version=None, jobs=4):
+    """Verifies in bulk that all the backend copies of the files under a
+    directory of the volume, or of a set of files, are signed with their
+    checksum.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): path relative to the volume root of the directory
+            whose files are verified. Defaults to the volume root.
+        files (list): paths relative to path of the files to verify
+            instead of all the files under path.
+        expected_file_version (int): signed version expected for all the
+            files. Not verified if None. Defaults to None.
+        jobs (int): number of files hashed in parallel on every node.
+
+    Returns:
+        True if all the copies are signed as expected, False otherwise
+
+    Example:
+        are_files_signed("abc.com", "testvol", "dir1",
+                         expected_file_version=1)
+    """
+    info = get_files_bitrot_info(mnode, volname, path, files, jobs=jobs)
+    if info is None:
+        return False
+
+    _rc = True
+    for relpath, copies in sorted(info.items()):
+        if not copies:
+            g.log.error("No backend copy of %s was scanned" % relpath)
+            _rc = False
+        for copy in copies:
+            if not copy['signed']:
+                g.log.error("trusted.bit-rot.signature attribute not "
+                            "present for %s" % copy['brick'])
+                _rc = False
+            elif (expected_file_version is not None and
+                  copy['version'] != int(expected_file_version)):
+                g.log.error("File version mismatch in signature of %s. "
+                            "Expected file version: %s. Actual file "
+                            "version: %s" % (copy['brick'],
+                                             expected_file_version,
+                                             copy['version']))
+                _rc = False
+            elif copy['signature'] != copy['checksum']:
+                g.log.error("File signature mismatch of %s. Expected "
+                            "file signature: %s. Actual file signature: %s"
+                            % (copy['brick'], copy['checksum'],
+                               copy['signature']))
+                _rc = False
+    return _rc
+
+
+class BitrotSigningTracker(object):
+    """Tracks when the backend copies of a set of files first show up as
+    signed, to report the latency of the signing after the writes.
+
+    The files are polled without being read (attributes only) and the
+    latency of a copy is the time of the first poll which saw it signed
+    minus its mtime, both taken on its node, so the latencies are rounded
+    up to the polling interval.
+
+    Example:
+        tracker = BitrotSigningTracker(mnode, "testvol", "dir1")
+        # write the files
+        tracker.wait_for_signing(timeout=600, interval=5)
+        tracker.get_latency_stats()
+        >>>{'count': 200, 'unsigned': 0, 'min': 120.3, 'max': 131.9,
+            'mean': 124.1, 'p50': 123.7, 'p90': 127.2, 'p99': 131.0}
+    """
+    def __init__(self, mnode, volname, path='', files=None, jobs=4):
+        """Initializes the tracker.
+
+        Args:
+            mnode (str): Node on which cmd has to be executed.
+            volname (str): volume name
+
+        Kwargs:
+            path (str): path relative to the volume root of the directory
+                whose files are tracked. Defaults to the volume root.
+            files (list): paths relative to path of the files to track
+                instead of all the files under path.
+            jobs (int): number of files read in parallel on every node.
+        """
+        self.mnode = mnode
+        self.volname = volname
+        self.path = path
+        self.files = files
+        self.jobs = jobs
+        self._locations = None
+        # backend copy -> dict of the copy when first seen signed
+        self.signed = {}
+        self.unsigned = set()
+
+    def poll(self):
+        """Reads the signatures of the copies not yet seen signed. The
+        backend locations are resolved at the first poll, once the files
+        are written.
+
+        Returns:
+            bool: True if all the copies are signed, False if not.
+            NoneType: None if the scan fails.
+        """
+        if self._locations is None:
+            self._locations = get_pathinfo_bulk(self.mnode, self.volname,
+                                                self.path, self.files)
+            if self._locations is None:
+                return None
+            self.unsigned = set(brick for bricks in self._locations.values()
+                                for brick in bricks)
+        if not self.unsigned:
+            return True
+
+        pending = dict((relpath, [brick for brick in bricks
+                                  if brick in self.unsigned])
+                       for relpath, bricks in self._locations.items())
+        info = get_files_bitrot_info(
+            self.mnode, self.volname, checksum=False, jobs=self.jobs,
+            locations=dict((relpath, bricks) for relpath, bricks
+                           in pending.items() if bricks))
+        if info is None:
+            return None
+        for copies in info.values():
+            for copy in copies:
+                if copy['signed']:
+                    self.signed[copy['brick']] = copy
+                    self.unsigned.discard(copy['brick'])
+        return not self.unsigned
+
+    def wait_for_signing(self, timeout=300, interval=10):
+        """Polls until all the copies are signed.
+
+        Kwargs:
+            timeout (int): seconds to wait. Defaults to 300.
+            interval (int): seconds between the polls. Defaults to 10.
+
+        Returns:
+            True if all the copies were signed in time, False otherwise
+        """
+        deadline = time.time() + timeout
+        while True:
+            ret = self.poll()
+            if ret:
+                return True
+            if time.time() >= deadline:
+                break
+            time.sleep(interval)
+        g.log.error("%d copies of the files of volume %s are not signed "
+                    "after %s seconds: %s"
+                    % (len(self.unsigned), self.volname, timeout,
+                       sorted(self.unsigned)[:10]))
+        return False
+
+    def get_latencies(self):
+        """Returns the signing latencies in seconds.
+
+        Returns:
+            dict: backend copy ('<node>:<path>') -> latency of its signing
+        """
+        return dict((brick, copy['seen'] - copy['mtime'])
+                    for brick, copy in self.signed.items())
+
+    def get_latency_stats(self):
+        """Summarizes the distribution of the signing latencies.
+
+        Returns:
+            dict: 'count' of signed copies, 'unsigned' count and the
+                'min', 'max', 'mean', 'p50', 'p90', 'p99' latencies in
+                seconds (when some copies are signed).
+        """
+        latencies = sorted(self.get_latencies().values())
+        stats = {'count': len(latencies), 'unsigned': len(self.unsigned)}
+        if not latencies:
+            return stats
+
+        def _percentile(pct):
+            # nearest rank
+            rank = max(0, int(-(-pct * len(latencies) // 100)) - 1)
+            return latencies[rank]
+
+        stats.update({
+            'min': latencies[0],
+            'max': latencies[-1],
+            'mean': sum(latencies) / float(len(latencies)),
+            'p50': _percentile(50),
+            'p90': _percentile(90),
+            'p99': _percentile(99),
+        })
+        return stats
+
+
 def is_file_bad(mnode, filename):
     """Verifies if scrubber identifies bad file
     Args:
@@ -545,65 +853,190 @@ def get_scrub_status(mnode, volname):
         '/var/log/glusterfs/scrub.log'}
     """
 
-    cmd = "gluster volume bitrot %s scrub status" % volname
-    ret, out, err = g.run(mnode, cmd)
+    ret, out, _ = scrub_status(mnode, volname)
     if ret != 0:
         g.log.error("Unable to get scrub status for volume %s"
                     % volname)
         return None
 
-    match = re.search('(.*?)(==.*==.*)', out, re.S)
-    if match is None:
-        g.log.error("Mismatch in regex. Scrub status raw output is not"
-                    " in expected format")
+    parsed = _parse_scrub_status(out)
+    if parsed is None:
         return None
-    info = match.group(2).replace('\n\n', '\n')
-
-    if "Corrupted object's [GFID]" in info:
-        info = info.replace("Corrupted object's [GFID]:\n",
-                            "Corrupted object's [GFID]:")
-        regex = 'Node(?:(?!Node).)*?Corrupted object.*?:.*?\n+='
-        temp_list = re.findall(regex, info, re.S)
-        corrupt_list = []
-        for node in temp_list:
-            tmp_reg = (r'Node: (\S+)\n.*Error count.*'
-                       'Corrupted object.*?:(.*)\n=.*')
-            m = re.search(tmp_reg, node, re.S)
-            if m is None:
-                g.log.error("Mismatch in cli output when bad file"
-                            "is identified")
-                return None
-            corrupt_list.append(m.groups())
-    else:
-        corrupt_list = []
-    info_list = re.findall('Node:.*?\n.*:.*\n.*:.*\n.*:.*\n.*:.*\n.*:.*\n+',
-                           info)
-    temp_list = []
-    for item in info_list:
-        item = item.replace('\n\n', '')
-        temp_list.append(item)
-
-    tmp_dict1 = {}
-    for item in temp_list:
-        tmp = item.split('\n')
-        tmp_0 = tmp[0].split(':')
-        tmp.pop(0)
-        tmp_dict = {}
-        for tmp_item in tmp[:-1]:
-            tmp_1 = tmp_item.split(': ')
-            tmp_dict[tmp_1[0].strip(' ')] = tmp_1[1].strip(' ')
-        tmp_dict1[tmp_0[1].strip(' ')] = tmp_dict
-    status_dict = {}
-    for item in match.group(1).split('\n\n')[:-1]:
-        elmt = item.split(':')
-        tmp_elmt = elmt[1].strip(' ').strip('\n')
-        status_dict[elmt[0].strip(' ').strip('\n')] = tmp_elmt
-
-    status_dict['status_info'] = tmp_dict1
-    for elmt in corrupt_list:
-        if elmt[0].strip(' ') in list(status_dict['status_info'].keys()):
-            val = elmt[1].split('\n')
-            val = [_f for _f in val if _f is not None]
-            gfid = "corrupted_gfid"
-            status_dict['status_info'][elmt[0].strip(' ')][gfid] = val
+    status_dict, nodes = parsed
+    status_dict['status_info'] = {}
+    for node, node_dict, gfids in nodes:
+        status_dict['status_info'][node] = node_dict
+        if gfids:
+            node_dict['corrupted_gfid'] = gfids
     return status_dict
+
+
+_GFID_REGEX = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-'
+                         r'[0-9a-f]{4}-[0-9a-f]{12}', re.I)
+
+
+def _parse_scrub_status(out):
+    # Returns ({label: text} of the volume, [(node, {label: text},
+    # corrupted gfids)]) from the text output of scrub status
+    status, nodes = {}, []
+    labels, gfids = status, None
+    for line in out.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('='):
+            gfids = None
+            continue
+        if gfids is not None:
+            # '<gfid>' or '<gfid> ==> BRICK: <brick>' followed by
+            # 'path: <path>' in the newer versions
+            match = _GFID_REGEX.match(line)
+            if match:
+                gfids.append(match.group(0))
+            continue
+        if ': ' in line:
+            label, value = line.split(': ', 1)
+        elif line.endswith(':'):
+            label, value = line[:-1], ''
+        else:
+            continue
+        label, value = label.strip(), value.strip()
+        if label == 'Node':
+            labels = {}
+            nodes.append((value, labels, []))
+        elif label.startswith('Corrupted object'):
+            if not nodes:
+                break
+            gfids = nodes[-1][2]
+        else:
+            labels[label] = value
+
+    if 'Volume name' not in status:
+        g.log.error("Scrub status raw output is not in expected format")
+        return None
+    return status, nodes
+
+
+def _to_scrub_time(text):
+    # 'Scrubber pending to complete.' until the first scrub completes
+    if not text or not text[0].isdigit():
+        return None
+    return text
+
+
+def _to_scrub_duration(text):
+    # D:H:M:S (labelled D:M:H:M:S) -> seconds
+    try:
+        seconds = 0
+        for unit, value in zip((86400, 3600, 60, 1),
+                               [int(part) for part in text.split(':')]):
+            seconds += unit * value
+        return seconds
+    except (AttributeError, ValueError):
+        return None
+
+
+# label in scrub status -> (attribute, converter)
+_SCRUB_STATUS_LABELS = {
+    'Volume name': ('volName', to_str),
+    'State of scrub': ('state', to_str),
+    'Scrub impact': ('scrubImpact', to_str),
+    'Scrub frequency': ('scrubFrequency', to_str),
+    'Bitrot error log location': ('bitrotLog', to_str),
+    'Scrubber error log location': ('scrubberLog', to_str),
+}
+
+_SCRUB_NODE_LABELS = {
+    'Number of Scrubbed files': ('scrubbedFiles', to_int),
+    'Number of Skipped files': ('skippedFiles', to_int),
+    'Last completed scrub time': ('lastCompletedScrubTime', _to_scrub_time),
+    'Duration of last scrub (D:M:H:M:S)': ('lastScrubDuration',
+                                           _to_scrub_duration),
+    'Error count': ('errorCount', to_int),
+}
+
+# The scrub status has no xml output, the records are built from the
+# parsed text output. The item tags of the lists are nominal.
+_SCRUB_NODE_STATUS = Schema('ScrubNodeStatus', dict(
+    [('node', to_str), ('corruptedGfids', ListOf('gfid', to_str))] +
+    list(_SCRUB_NODE_LABELS.values())))
+ScrubNodeStatus = _SCRUB_NODE_STATUS.record_type
+
+ScrubStatus = Schema('ScrubStatus', dict(
+    [('nodes', ListOf('node', _SCRUB_NODE_STATUS))] +
+    list(_SCRUB_STATUS_LABELS.values()))).record_type
+
+
+def get_scrub_status_record(mnode, volname):
+    """Parses the output of gluster bitrot scrub status command into a
+    typed record.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Returns:
+        ScrubStatus: record with the attributes volName, state, scrubImpact,
+            scrubFrequency, bitrotLog, scrubberLog and nodes, the list of
+            ScrubNodeStatus records of the nodes with the attributes node,
+            scrubbedFiles, skippedFiles, lastCompletedScrubTime (None until
+            a scrub completes), lastScrubDuration (seconds), errorCount and
+            corruptedGfids (list).
+        NoneType: None if command execution fails, errors.
+
+    Example:
+        >>>status = get_scrub_status_record("abc.com", "testvol")
+        >>>[(node.node, node.errorCount) for node in status.nodes]
+        [('localhost', 0), ('10.70.47.118', 2)]
+    """
+    ret, out, _ = scrub_status(mnode, volname)
+    if ret != 0:
+        g.log.error("Unable to get scrub status for volume %s"
+                    % volname)
+        return None
+
+    parsed = _parse_scrub_status(out)
+    if parsed is None:
+        return None
+    status_labels, nodes = parsed
+
+    def _convert(labels, converters):
+        return dict((converters[label][0], converters[label][1](value))
+                    for label, value in labels.items()
+                    if label in converters)
+
+    status = ScrubStatus(**_convert(status_labels, _SCRUB_STATUS_LABELS))
+    status.nodes = []
+    for node, node_labels, gfids in nodes:
+        node_status = ScrubNodeStatus(
+            **_convert(node_labels, _SCRUB_NODE_LABELS))
+        node_status.node = node
+        node_status.corruptedGfids = gfids
+        status.nodes.append(node_status)
+    return status
+
+
+def scrub_ondemand(mnode, volname):
+    """Starts an on demand scrub of the volume
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Returns:
+        tuple: Tuple containing three elements (ret, out, err).
+            The first element 'ret' is of type 'int' and is the return value
+            of command execution.
+
+            The second element 'out' is of type 'str' and is the stdout value
+            of the command execution.
+
+            The third element 'err' is of type 'str' and is the stderr value
+            of the command execution.
+
+    Example:
+        scrub_ondemand("abc.com", testvol)
+    """
+
+    cmd = "gluster volume bitrot %s scrub ondemand" % volname
+    return g.run(mnode, cmd)
@@ -21,6 +21,7 @@ from math import ceil
 import time
 from glusto.core import Glusto as g
 from glustolibs.gluster.brickmux_ops import is_brick_mux_enabled
+from glustolibs.gluster.peer_ops import invalidate_peer_connectivity_cache
 from glustolibs.gluster.volume_ops import (get_volume_info, get_volume_status)
 from glustolibs.gluster.volume_libs import (get_subvols, is_tiered_volume,
                                             get_client_quorum_info,
@@ -306,6 +307,7 @@ def bring_bricks_online(mnode, volname, bricks_list,
         elif bring_brick_online_method == 'glusterd_restart':
             bring_brick_online_command = "service glusterd restart"
             brick_node, _ = brick.split(":")
+            invalidate_peer_connectivity_cache()
             ret, _, _ = g.run(brick_node, bring_brick_online_command)
             if ret != 0:
                 g.log.error("Unable to restart glusterd on node %s",
@@ -0,0 +1,560 @@
+#!/usr/bin/env python
+#  Copyright (C) 2019 Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+    Description: Module for bulk consistency checks of the backend of a
+    volume. Every brick is scanned in place by tree_scan.py, all of them
+    in parallel, and the ordered dumps are merged in one pass, so the
+    memory used is proportional to the inconsistencies found rather than
+    to the number of files.
+"""
+
+import os
+from glusto.core import Glusto as g
+from glustolibs.gluster.volume_libs import get_arbiter_bricks, get_subvols
+from glustolibs.gluster.volume_ops import get_volume_info
+from glustolibs.io.utils import (run_tree_scans, iter_tree_scan_dump,
+                                 iter_merged_tree_scan_dumps)
+
+
+def _scan_bricks(mnode, volname, *args):
+    # Runs the tree_scan.py sub commands on all the bricks, concurrently.
+    # Every args is formatted with the brick path. Returns (subvols,
+    # bricks, dumps), dumps holding the list of the dumps of the bricks
+    # for every args.
+    subvols = get_subvols(mnode, volname)['volume_subvols']
+    if not subvols:
+        g.log.error("Failed to get the subvols of volume %s", volname)
+        return None
+    bricks = [brick for bricks in subvols for brick in bricks]
+    scans = []
+    for scan_args in args:
+        for brick in bricks:
+            node, brick_path = brick.split(':', 1)
+            scans.append((node, scan_args % brick_path))
+    dumps = run_tree_scans(scans)
+    if dumps is None:
+        g.log.error("Failed to scan the bricks of volume %s", volname)
+        return None
+    return subvols, bricks, [dumps[index:index + len(bricks)]
+                             for index in range(0, len(dumps), len(bricks))]
+
+
+def audit_gfids(mnode, volname, path=''):
+    """Audits the gfids of all the entries of a tree on all the bricks of
+    the volume.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): path relative to the volume root of the dir to audit.
+            Defaults to the volume root, which also audits the .glusterfs
+            handles of the bricks.
+
+    Returns:
+        dict: the inconsistencies found, each key having a list:
+            'mismatches': (relpath, {brick: gfid}) of the entries whose
+                gfid differs within a replica set,
+            'dir_mismatches': (relpath, {brick: gfid}) of the dirs whose
+                gfid differs across the distribute subvols,
+            'duplicates': (relpath, {brick: gfid}) of the files with data
+                (not DHT linkto) on more than one distribute subvol,
+            'no_gfid': (brick, relpath) of the entries without gfid,
+            'missing_handles': (brick, relpath, gfid) of the entries whose
+                .glusterfs handle does not exist,
+            'orphan_handles': (brick, gfid, 'orphan' or 'dangling') of the
+                file handles without any other link and the dir handles
+                whose symlink does not resolve.
+        NoneType: None if a brick could not be scanned.
+
+    Example:
+        audit_gfids("abc.com", "testvol")
+        >>>{'mismatches': [('dir1/file1', {'server1:/bricks/brick0/b0':
+             '8f4b...', 'server2:/bricks/brick0/b1': '1d2e...'})],
+            'dir_mismatches': [], 'duplicates': [], 'no_gfid': [],
+            'missing_handles': [], 'orphan_handles': []}
+    """
+    subdir = path.strip('/')
+    args = ["gfids %%s -d '%s'" % subdir if subdir else "gfids %s"]
+    if not subdir:
+        args.append("handles %s")
+    scanned = _scan_bricks(mnode, volname, *args)
+    if scanned is None:
+        return None
+    subvols, bricks, dumps = scanned
+    subvol_of = []
+    for index, subvol_bricks in enumerate(subvols):
+        subvol_of.extend([index] * len(subvol_bricks))
+
+    result = {
+        'mismatches': [],
+        'dir_mismatches': [],
+        'duplicates': [],
+        'no_gfid': [],
+        'missing_handles': [],
+        'orphan_handles': [],
+    }
+    try:
+        for relpath, metas in iter_merged_tree_scan_dumps(dumps[0]):
+            relpath = relpath.decode('utf-8', 'replace')
+            # brick index -> (type, gfid, nlink, linkto, handle)
+            records = dict((index, meta.decode('ascii').split(' '))
+                           for index, meta in enumerate(metas)
+                           if meta is not None)
+            gfids = dict((bricks[index], record[1])
+                         for index, record in records.items())
+
+            for index, record in records.items():
+                if record[1] == '-':
+                    result['no_gfid'].append((bricks[index], relpath))
+                elif record[4] == '0':
+                    result['missing_handles'].append(
+                        (bricks[index], relpath, record[1]))
+
+            replica_gfids, dir_gfids = {}, {}
+            for index, record in records.items():
+                replica_gfids.setdefault(subvol_of[index],
+                                         set()).add(record[1])
+                if record[0] == 'd':
+                    dir_gfids.setdefault(subvol_of[index],
+                                         set()).add(record[1])
+            if any(len(values) > 1 for values in replica_gfids.values()):
+                result['mismatches'].append((relpath, gfids))
+            if len(set(frozenset(values)
+                       for values in dir_gfids.values())) > 1:
+                result['dir_mismatches'].append((relpath, gfids))
+
+            data_subvols = set(subvol_of[index]
+                               for index, record in records.items()
+                               if record[0] != 'd' and record[3] == '0')
+            if len(data_subvols) > 1:
+                result['duplicates'].append((relpath, gfids))
+
+        for brick, dump in zip(bricks, dumps[1] if not subdir else []):
+            for gfid, kind in iter_tree_scan_dump(dump):
+                result['orphan_handles'].append(
+                    (brick, gfid.decode('ascii'), kind.decode('ascii')))
+    finally:
+        for brick_dumps in dumps:
+            for dump in brick_dumps:
+                os.remove(dump)
+    return result
+
+
+# Size of the chunk of a stripe stored on every fragment of a disperse
+# volume
+EC_CHUNK_SIZE = 512
+
+
+def _decode_ec_counters(value):
+    # hex of trusted.ec.version or dirty -> (data, metadata)
+    if value == '-':
+        return (0, 0)
+    return (int(value[:16], 16), int(value[16:32] or '0', 16))
+
+
+def scan_ec_fragments(mnode, volname, path=''):
+    """Verifies that all the fragments of every entry of a tree agree on
+    the bricks of a disperse volume, from the trusted.ec.* xattrs and the
+    fragment sizes collected on all the bricks in parallel, without
+    reading any data through a client.
+
+    An entry is inconsistent when a fragment is missing, when the
+    fragments disagree on trusted.ec.version or trusted.ec.size, when the
+    fragment size does not match trusted.ec.size, or when it is dirty.
+    The good fragments are those with the highest data version held by at
+    least data count (disperse - redundancy) fragments, as the self heal
+    chooses its sources, and the bytes to heal are the expected fragment
+    size of every other fragment.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): path relative to the volume root of the dir to scan.
+            Defaults to the volume root.
+
+    Returns:
+        dict: 'entries' (number of entries scanned, per subvol),
+            'inconsistent' (sorted list of (subvol index, relpath, list of
+            reasons among 'missing', 'version', 'size', 'fragment_size',
+            'dirty' and 'no_source', list of the bricks to heal)),
+            'dirty' (number of dirty entries), 'bytes_to_heal' and
+            'consistent' (True if no entry is inconsistent).
+        NoneType: None if the volume is not disperse or a brick could
+            not be scanned.
+
+    Example:
+        scan_ec_fragments("abc.com", "testvol")
+        >>>{'entries': 20001, 'inconsistent': [(0, 'dir1/file3',
+             ['version', 'fragment_size'], ['server3:/bricks/brick0/b2'])],
+            'dirty': 0, 'bytes_to_heal': 1048576, 'consistent': False}
+    """
+    volinfo = get_volume_info(mnode, volname)
+    if volinfo is None:
+        g.log.error("Failed to get the volume info of %s", volname)
+        return None
+    try:
+        data_count = (int(volinfo[volname]['disperseCount']) -
+                      int(volinfo[volname]['redundancyCount']))
+    except (KeyError, ValueError):
+        data_count = 0
+    if data_count <= 0:
+        g.log.error("Volume %s is not a disperse volume", volname)
+        return None
+    stripe_size = data_count * EC_CHUNK_SIZE
+
+    subdir = path.strip('/')
+    scanned = _scan_bricks(mnode, volname, "ec %s/" + subdir)
+    if scanned is None:
+        return None
+    subvols, bricks, dumps = scanned
+    subvol_of = []
+    for index, subvol_bricks in enumerate(subvols):
+        subvol_of.extend([index] * len(subvol_bricks))
+
+    result = {'entries': 0, 'inconsistent': [], 'dirty': 0,
+              'bytes_to_heal': 0}
+    try:
+        for relpath, metas in iter_merged_tree_scan_dumps(dumps[0]):
+            relpath = relpath.decode('utf-8', 'replace')
+            # subvol -> {brick index: (type, fragment size, version,
+            # ec size, dirty)}
+            fragments = {}
+            for index, meta in enumerate(metas):
+                if meta is not None:
+                    ftype, size, version, ec_size, dirty = (
+                        meta.decode('ascii').split(' '))
+                    fragments.setdefault(subvol_of[index], {})[index] = (
+                        ftype, int(size), _decode_ec_counters(version),
+                        ec_size, _decode_ec_counters(dirty))
+
+            for subvol, frags in sorted(fragments.items()):
+                result['entries'] += 1
+                reasons = []
+                if len(frags) < len(subvols[subvol]):
+                    reasons.append('missing')
+                if len(set(frag[2] for frag in frags.values())) > 1:
+                    reasons.append('version')
+                if len(set(frag[3] for frag in frags.values())) > 1:
+                    reasons.append('size')
+                if any(frag[4] != (0, 0) for frag in frags.values()):
+                    reasons.append('dirty')
+                    result['dirty'] += 1
+
+                # Sources: highest data version with enough fragments
+                versions = {}
+                for index, frag in frags.items():
+                    versions.setdefault(frag[2][0], []).append(index)
+                sources = []
+                for version in sorted(versions, reverse=True):
+                    if len(versions[version]) >= data_count:
+                        sources = versions[version]
+                        break
+
+                fragment_size = 0
+                if frags[sources[0] if sources else min(frags)][0] == 'f':
+                    ec_size = frags[sources[0] if sources
+                                    else min(frags)][3]
+                    if ec_size != '-':
+                        fragment_size = (-(-int(ec_size, 16) //
+                                           stripe_size) * EC_CHUNK_SIZE)
+                        if any(frags[index][1] != fragment_size
+                               for index in sources):
+                            reasons.append('fragment_size')
+                if not sources:
+                    reasons.append('no_source')
+                if not reasons:
+                    continue
+
+                first = subvol_of.index(subvol)
+                sinks = [bricks[index] for index in
+                         range(first, first + len(subvols[subvol]))
+                         if index not in sources]
+                result['bytes_to_heal'] += fragment_size * len(sinks)
+                result['inconsistent'].append((subvol, relpath, reasons,
+                                               sinks))
+    finally:
+        for dump in dumps[0]:
+            os.remove(dump)
+
+    result['inconsistent'].sort()
+    result['consistent'] = not result['inconsistent']
+    return result
+
+
+def get_dht_subvol_names(volname, subvols, voltype):
+    """Returns the names of the DHT subvols of a volume, the names used in
+    trusted.glusterfs.dht.linkto.
+
+    Args:
+        volname (str): volume name
+        subvols (list): bricks of the subvols, as
+            get_subvols()['volume_subvols'].
+        voltype (str): typeStr of the volume info.
+
+    Returns:
+        list: name of every subvol. e.g ['testvol-replicate-0', ...]
+    """
+    names = []
+    first = 0
+    for index, bricks in enumerate(subvols):
+        if len(bricks) == 1:
+            names.append("%s-client-%d" % (volname, first))
+        elif 'Disperse' in voltype:
+            names.append("%s-disperse-%d" % (volname, index))
+        else:
+            names.append("%s-replicate-%d" % (volname, index))
+        first += len(bricks)
+    return names
+
+
+def scan_dht_linkto_files(mnode, volname, path=''):
+    """Finds the DHT linkto files of a tree on all the bricks of the volume
+    with one scan per brick, in parallel, and cross checks every linkto
+    file with the subvols which hold the data of the file, from the same
+    scans.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): path relative to the volume root of the dir to scan.
+            Defaults to the volume root.
+
+    Returns:
+        dict: 'linkto' (number of linkto files) and the lists:
+            'stale': (relpath, brick, target, data subvols) of the linkto
+                files whose target subvol does not hold the data, which
+                is on other subvols, or whose gfid is not the gfid of the
+                data,
+            'dangling': (relpath, brick, target) of the linkto files whose
+                data is not on any subvol,
+            'double': (relpath, bricks) of the files with linkto files on
+                more than one subvol, or pointing to a subvol holding
+                another linkto file,
+            'sticky': (relpath, brick) of the sticky bit empty files
+                without the linkto xattr.
+        NoneType: None if a brick could not be scanned.
+
+    Example:
+        scan_dht_linkto_files("abc.com", "testvol")
+        >>>{'linkto': 120, 'stale': [('dir1/file2',
+             'server1:/bricks/brick0/b0', 'testvol-replicate-0',
+             ['testvol-replicate-1'])], 'dangling': [], 'double': [],
+            'sticky': []}
+    """
+    volinfo = get_volume_info(mnode, volname)
+    if volinfo is None:
+        g.log.error("Failed to get the volume info of %s", volname)
+        return None
+
+    subdir = path.strip('/')
+    scanned = _scan_bricks(mnode, volname, "linkto %s/" + subdir)
+    if scanned is None:
+        return None
+    subvols, bricks, dumps = scanned
+    names = get_dht_subvol_names(volname, subvols,
+                                 volinfo[volname]['typeStr'])
+    subvol_of = []
+    for index, subvol_bricks in enumerate(subvols):
+        subvol_of.extend([index] * len(subvol_bricks))
+
+    result = {'linkto': 0, 'stale': [], 'dangling': [], 'double': [],
+              'sticky': []}
+    try:
+        for relpath, metas in iter_merged_tree_scan_dumps(dumps[0]):
+            relpath = relpath.decode('utf-8', 'replace')
+            # brick index -> (kind, gfid, target)
+            records = dict((index, meta.decode('utf-8').split(' ', 2))
+                           for index, meta in enumerate(metas)
+                           if meta is not None)
+            data = {}
+            linkto_subvols = set()
+            for index, (kind, gfid, _) in records.items():
+                if kind == 'D':
+                    data.setdefault(names[subvol_of[index]], set()).add(gfid)
+                elif kind == 'L':
+                    linkto_subvols.add(names[subvol_of[index]])
+                else:
+                    result['sticky'].append((relpath, bricks[index]))
+
+            linkto_bricks = [index for index, record in records.items()
+                             if record[0] == 'L']
+            result['linkto'] += len(linkto_bricks)
+            if (len(linkto_subvols) > 1 or
+                    any(records[index][2] in linkto_subvols
+                        for index in linkto_bricks)):
+                result['double'].append(
+                    (relpath, sorted(bricks[index]
+                                     for index in linkto_bricks)))
+
+            for index in linkto_bricks:
+                _, gfid, target = records[index]
+                if not data:
+                    result['dangling'].append((relpath, bricks[index],
+                                               target))
+                elif target not in data or data[target] != set([gfid]):
+                    result['stale'].append((relpath, bricks[index], target,
+                                            sorted(data)))
+    finally:
+        for dump in dumps[0]:
+            os.remove(dump)
+    return result
+
+
+def verify_arbiter_bricks(mnode, volname, path=''):
+    """Verifies in bulk that the arbiter brick of every replica set holds
+    only metadata: its files have no data and have the gfid and AFR
+    changelog xattrs, and it has the same entries as the data bricks.
+
+    Every brick of the volume is scanned once, in parallel, and reports
+    its entries without gfid (and on the arbiter bricks, the files with
+    data or without AFR changelog) and a digest of the entry names of
+    every directory. The entries are then listed only for the directories
+    whose digests differ within a replica set, so the output is
+    proportional to the violations rather than to the number of files.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): path relative to the volume root of the dir to verify.
+            Defaults to the volume root.
+
+    Returns:
+        dict: 'arbiter_bricks' (the arbiter brick of every replica set)
+            and the lists of violations, with paths relative to path:
+            'nonzero_size': (brick, relpath, size) of the arbiter files
+                with data,
+            'missing_gfid': (brick, relpath) of the entries without gfid,
+            'missing_afr': (brick, relpath) of the arbiter files without
+                any trusted.afr xattr,
+            'entry_mismatches': (relpath, {brick: type or None}) of the
+                entries not on all the bricks of their replica set with
+                the same type (d, f, l, o).
+        NoneType: None if the volume has no arbiter or a brick could not
+            be scanned.
+
+    Example:
+        verify_arbiter_bricks("abc.com", "testvol")
+        >>>{'arbiter_bricks': ['server3:/bricks/brick0/b2'],
+            'nonzero_size': [('server3:/bricks/brick0/b2', 'dir1/file3',
+                              1048576)],
+            'missing_gfid': [], 'missing_afr': [],
+            'entry_mismatches': [('dir1/file9', {
+                'server1:/bricks/brick0/b0': 'f',
+                'server2:/bricks/brick0/b1': 'f',
+                'server3:/bricks/brick0/b2': None})]}
+    """
+    arbiter_bricks = get_arbiter_bricks(mnode, volname)
+    if not arbiter_bricks:
+        g.log.error("Failed to get the arbiter bricks of volume %s",
+                    volname)
+        return None
+    subvols = get_subvols(mnode, volname)['volume_subvols']
+
+    subdir = path.strip('/')
+    scans = []
+    for bricks in subvols:
+        for brick in bricks:
+            node, brick_path = brick.split(':', 1)
+            args = "arbiter '%s'" % os.path.join(brick_path, subdir)
+            if brick in arbiter_bricks:
+                args = "arbiter --arbiter '%s'" % os.path.join(brick_path,
+                                                               subdir)
+            scans.append((node, args))
+    dumps = run_tree_scans(scans)
+    if dumps is None:
+        g.log.error("Failed to scan the bricks of volume %s", volname)
+        return None
+
+    result = {'arbiter_bricks': arbiter_bricks, 'nonzero_size': [],
+              'missing_gfid': [], 'missing_afr': [], 'entry_mismatches': []}
+    # subvol index -> dirs whose entries differ across its bricks
+    differing = {}
+    first = 0
+    try:
+        for index, bricks in enumerate(subvols):
+            subvol_dumps = dumps[first:first + len(bricks)]
+            first += len(bricks)
+            for relpath, metas in iter_merged_tree_scan_dumps(subvol_dumps):
+                digests = set()
+                for brick, meta in zip(bricks, metas):
+                    if meta is None:
+                        continue
+                    # 'D digest [flags]' or 'V flags'
+                    fields = meta.decode('ascii').split(' ')
+                    if fields[0] == 'D':
+                        digests.add(fields.pop(1))
+                    if len(fields) == 1:
+                        continue
+                    rel = relpath.decode('utf-8', 'replace')
+                    for flag in fields[1].split(','):
+                        if flag == 'nogfid':
+                            result['missing_gfid'].append((brick, rel))
+                        elif flag == 'noafr':
+                            result['missing_afr'].append((brick, rel))
+                        elif flag.startswith('size='):
+                            result['nonzero_size'].append(
+                                (brick, rel, int(flag[len('size='):])))
+                # A dir missing on a brick is reported from its parent
+                if None not in metas and len(digests) > 1:
+                    differing.setdefault(index, []).append(relpath)
+    finally:
+        for dump in dumps:
+            os.remove(dump)
+
+    if not differing:
+        return result
+
+    # Entries of the differing dirs only
+    scans = []
+    owners = []
+    for index in sorted(differing):
+        for brick in subvols[index]:
+            node, brick_path = brick.split(':', 1)
+            scans.append((node, "arbiter '%s'" % os.path.join(brick_path,
+                                                              subdir),
+                          differing[index]))
+            owners.append((index, brick))
+    dumps = run_tree_scans(scans)
+    if dumps is None:
+        g.log.error("Failed to list the differing dirs of volume %s",
+                    volname)
+        return None
+
+    # subvol index -> relpath -> {brick: type}
+    entries = {}
+    for (index, brick), dump in zip(owners, dumps):
+        for relpath, meta in iter_tree_scan_dump(dump):
+            entries.setdefault(index, {}).setdefault(
+                relpath.decode('utf-8', 'replace'), {})[brick] = \
+                meta.decode('ascii').split(' ')[1]
+        os.remove(dump)
+    for index in sorted(entries):
+        for relpath, types in sorted(entries[index].items()):
+            if (len(types) != len(subvols[index]) or
+                    len(set(types.values())) > 1):
+                result['entry_mismatches'].append((relpath, dict(
+                    (brick, types.get(brick)) for brick in subvols[index])))
+    return result
@@ -73,12 +73,25 @@ def file_exists(host, filename):
 
 class BrickDir(object):
     """Directory on a brick"""
-    def __init__(self, path):
+    def __init__(self, path, hashrange=None):
+        """Init the brickdir class
+
+        Args:
+            path (str): path of the directory as returned from pathinfo
+                (e.g., server1.example.com:/bricks/brick1/testdir1)
+
+        Kwargs:
+            hashrange (tuple): low and high hash of the brickdir, when
+                already known, e.g. from a GlusterFileSet snapshot.
+        """
         self._path = path
         (self._host, self._fqpath) = self._path.split(':')
         self._hashrange = None
         self._hashrange_low = None
         self._hashrange_high = None
+        if hashrange is not None:
+            self._hashrange = hashrange
+            (self._hashrange_low, self._hashrange_high) = hashrange
 
     def _get_hashrange(self):
         """get the hash range for a brick from a remote system"""
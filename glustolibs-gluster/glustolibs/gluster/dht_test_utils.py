@@ -380,3 +380,187 @@ def is_layout_complete(mnode, volname, dirpath):
             return False
         elif hash_difference < 1:
             g.log.error("Layout has overlaps")
+
+
+# Counts the data files (not the linkto files) under a brick in size
+# buckets, on the brick node. Prints one line per brick:
+# <brick> <capacity in bytes> <files> <bytes> <bucket>:<count>,...
+# where the bucket of a size is its bit length, i.e. files of bucket b
+# are smaller than 2**b bytes (and at least 2**(b-1)).
+_BRICK_DISTRIBUTION_CMD = (
+    "cap=$(stat -f -c '%%b %%S' %(path)s) && "
+    "find %(path)s -path %(path)s/.glusterfs -prune -o "
+    "-path %(path)s/.trashcan -prune -o %(skip)s"
+    "-type f ! -perm 1000 -printf '%%s\\n' | "
+    "awk -v brick=%(brick)s -v cap=\"$cap\" "
+    "'{n++; t+=$1; b=0; s=$1; while (s>0) {b++; s=int(s/2)}; h[b]++} "
+    "END {split(cap, c, \" \"); l=\"\"; "
+    "for (b in h) l=l b \":\" h[b] \",\"; "
+    "printf \"%%s %%.0f %%.0f %%.0f %%s\\n\", brick, c[1] * c[2], n, t, l}'")
+
+
+def get_bricks_file_distribution(bricks, skip=None):
+    """Gets the number of files, their total size and size histogram of
+    each brick. The counting is done on the brick nodes, in one
+    concurrent round over the nodes. DHT linkto files and the .glusterfs
+    and .trashcan directories are not counted.
+
+    Args:
+        bricks (list): bricks in <host>:<path> format.
+
+    Kwargs:
+        skip (str|list): directories, relative to the brick root, not to
+            be counted.
+
+    Returns:
+        dict: brick -> dict with 'files', 'bytes', 'capacity' (size of the
+            brick file system in bytes) and 'histogram' (size bucket ->
+            number of files, where files of bucket b are smaller than
+            2**b bytes and bucket 0 holds the empty files). None for the
+            bricks which could not be scanned.
+
+    Example:
+        get_bricks_file_distribution(['abc.com:/bricks/brick0/testvol'])
+        >>>{'abc.com:/bricks/brick0/testvol': {'files': 100,
+            'bytes': 104857600, 'capacity': 53660876800,
+            'histogram': {21: 100}}}
+    """
+    if isinstance(skip, str):
+        skip = [skip]
+
+    cmds = {}
+    for brick in bricks:
+        host, path = brick.split(':', 1)
+        skip_args = ''.join("-path %s/%s -prune -o " % (path, item.strip('/'))
+                            for item in skip or [])
+        cmds.setdefault(host, []).append(
+            _BRICK_DISTRIBUTION_CMD % {'path': path, 'brick': brick,
+                                       'skip': skip_args})
+
+    procs = {}
+    for host in cmds:
+        procs[host] = g.run_async(host, ' ; '.join(cmds[host]))
+
+    distribution = dict((brick, None) for brick in bricks)
+    for host, proc in procs.items():
+        ret, out, err = proc.async_communicate()
+        if ret != 0:
+            g.log.error("Failed to scan one or more bricks on %s: %s",
+                        host, err)
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) < 4 or fields[0] not in distribution:
+                continue
+            histogram = {}
+            if len(fields) > 4:
+                for bucket in fields[4].strip(',').split(','):
+                    size, count = bucket.split(':')
+                    histogram[int(size)] = int(count)
+            distribution[fields[0]] = {'capacity': int(fields[1]),
+                                       'files': int(fields[2]),
+                                       'bytes': int(fields[3]),
+                                       'histogram': histogram}
+    return distribution
+
+
+def get_distribution_skew(mnode, volname, weights='equal', tolerance=0.1,
+                          skip=None):
+    """Checks how evenly the files of a distributed volume are spread over
+    its subvolumes, against the expected share of each subvolume.
+
+    Args:
+        mnode (str): Node on which the gluster commands are executed.
+        volname (str): volume name
+
+    Kwargs:
+        weights (str|list): 'equal' for equal shares, 'capacity' for
+            shares proportional to the brick file system sizes, or a list
+            with the weight of each subvolume. Defaults to 'equal'.
+        tolerance (float): relative deviation from the expected share
+            above which a subvolume is over- or under-filled.
+            Defaults to 0.1 (10%).
+        skip (str|list): directories not to be counted, as in
+            get_bricks_file_distribution.
+
+    Returns:
+        dict: with 'subvols', one dict per subvolume with 'bricks',
+            'files', 'bytes', 'capacity', 'expected_share', 'file_share',
+            'byte_share', 'file_skew' and 'byte_skew' (relative deviation
+            of the shares from the expected one) and 'histogram', and the
+            indexes of the 'overfilled' and 'underfilled' subvolumes (by
+            file count or bytes), and 'max_file_skew' / 'max_byte_skew'.
+            None on failure.
+
+    Example:
+        skew = get_distribution_skew(mnode, volname, 'capacity')
+        if skew['overfilled'] or skew['underfilled']: ...
+    """
+    subvols = get_subvols(mnode, volname)['volume_subvols']
+    if not subvols:
+        g.log.error("Unable to get the subvols of volume %s", volname)
+        return None
+    if not isinstance(weights, str) and len(weights) != len(subvols):
+        g.log.error("Got %d weights for %d subvols of volume %s",
+                    len(weights), len(subvols), volname)
+        return None
+
+    distribution = get_bricks_file_distribution(
+        [brick for subvol in subvols for brick in subvol], skip)
+
+    result = {'subvols': [], 'overfilled': [], 'underfilled': []}
+    for subvol in subvols:
+        scanned = [distribution[brick] for brick in subvol
+                   if distribution[brick] is not None]
+        if not scanned:
+            g.log.error("None of the bricks of the subvol %s could be "
+                        "scanned", subvol)
+            return None
+        # Replicas (and EC fragments) of a subvol hold the same files; the
+        # most complete brick stands for the subvol.
+        fullest = max(scanned, key=lambda dist: (dist['files'],
+                                                 dist['bytes']))
+        result['subvols'].append({
+            'bricks': subvol,
+            'files': fullest['files'],
+            'bytes': fullest['bytes'],
+            'histogram': fullest['histogram'],
+            'capacity': min(dist['capacity'] for dist in scanned),
+        })
+
+    if weights == 'equal':
+        weights = [1] * len(subvols)
+    elif weights == 'capacity':
+        weights = [subvol['capacity'] for subvol in result['subvols']]
+    total_weight = float(sum(weights))
+    total_files = sum(subvol['files'] for subvol in result['subvols'])
+    total_bytes = sum(subvol['bytes'] for subvol in result['subvols'])
+
+    for index, (subvol, weight) in enumerate(zip(result['subvols'],
+                                                 weights)):
+        expected = weight / total_weight if total_weight else 0.0
+        subvol['expected_share'] = expected
+        subvol['file_share'] = (subvol['files'] / float(total_files)
+                                if total_files else 0.0)
+        subvol['byte_share'] = (subvol['bytes'] / float(total_bytes)
+                                if total_bytes else 0.0)
+        for kind in ('file', 'byte'):
+            subvol[kind + '_skew'] = (
+                subvol[kind + '_share'] / expected - 1 if expected else 0.0)
+        skews = (subvol['file_skew'], subvol['byte_skew'])
+        if max(skews) > tolerance:
+            result['overfilled'].append(index)
+        if min(skews) < -tolerance:
+            result['underfilled'].append(index)
+
+    result['max_file_skew'] = max(abs(subvol['file_skew'])
+                                  for subvol in result['subvols'])
+    result['max_byte_skew'] = max(abs(subvol['byte_skew'])
+                                  for subvol in result['subvols'])
+    for index in result['overfilled'] + result['underfilled']:
+        g.log.info("Subvol %s of volume %s holds %.1f%% of the files and "
+                   "%.1f%% of the data, expected %.1f%%",
+                   result['subvols'][index]['bricks'], volname,
+                   result['subvols'][index]['file_share'] * 100,
+                   result['subvols'][index]['byte_share'] * 100,
+                   result['subvols'][index]['expected_share'] * 100)
+    return result
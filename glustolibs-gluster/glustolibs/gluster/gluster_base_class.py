@@ -22,14 +22,11 @@
 import unittest
 import os
 import random
-import copy
-import datetime
 import time
-import socket
 from glusto.core import Glusto as g
-from glustolibs.gluster.exceptions import ConfigError, ExecutionError
-from glustolibs.gluster.peer_ops import is_peer_connected, peer_status
-from glustolibs.gluster.volume_ops import set_volume_options
+from glustolibs.gluster.exceptions import ExecutionError
+from glustolibs.gluster.peer_ops import validate_peers_connectivity
+from glustolibs.gluster.volume_ops import apply_volume_options
 from glustolibs.gluster.block_ops import block_delete
 from glustolibs.gluster.block_libs import (setup_block, if_block_exists,
                                            get_block_list,
@@ -44,6 +41,10 @@ from glustolibs.gluster.nfs_libs import export_volume_through_nfs
 from glustolibs.gluster.mount_ops import create_mount_objs
 from glustolibs.io.utils import log_mounts_info
 from glustolibs.gluster.lib_utils import inject_msg_in_logs
+from glustolibs.gluster.log_libs import LogMarker
+from glustolibs.gluster.session_config import (get_session_config,
+                                               get_ip_from_hostname)
+from glustolibs.gluster.snap_ops import invalidate_snap_catalog
 
 
 class runs_on(g.CarteTestClass):
@@ -128,47 +129,31 @@ class GlusterBaseClass(unittest.TestCase):
         Returns:
             list: List of IP's corresponding to the hostnames of nodes.
         """
-        nodes_ips = []
-        if isinstance(nodes, str):
-            nodes = [nodes]
-        for node in nodes:
-            try:
-                ip = socket.gethostbyname(node)
-            except socket.gaierror as e:
-                g.log.error("Failed to get the IP of Host: %s : %s", node,
-                            e.strerror)
-                ip = None
-            nodes_ips.append(ip)
-        return nodes_ips
+        return get_ip_from_hostname(nodes)
 
     @classmethod
     def validate_peers_are_connected(cls):
         """Validate whether each server in the cluster is connected to
         all other servers in cluster.
 
+        The peer status of all the servers is fetched afresh in one
+        parallel round, since nodes may have been rebooted or glusterd
+        stopped behind the back of the connectivity cache.
+
         Returns (bool): True if all peers are in connected with other peers.
             False otherwise.
         """
         # Validate if peer is connected from all the servers
         g.log.info("Validating if servers %s are connected from other servers "
                    "in the cluster", cls.servers)
-        for server in cls.servers:
-            g.log.info("Validate servers %s are in connected from  node %s",
-                       cls.servers, server)
-            ret = is_peer_connected(server, cls.servers)
-            if not ret:
-                g.log.error("Some or all servers %s are not in connected "
-                            "state from node %s", cls.servers, server)
-                return False
-            g.log.info("Successfully validated servers %s are all in "
-                       "connected state from node %s",
-                       cls.servers, server)
+        ret = validate_peers_connectivity(cls.servers, use_cache=False)
+        if not ret:
+            g.log.error("Some or all servers %s are not in connected "
+                        "state with each other", cls.servers)
+            return False
         g.log.info("Successfully validated all servers %s are in connected "
                    "state from other servers in the cluster", cls.servers)
 
-        # Peer Status from mnode
-        peer_status(cls.mnode)
-
         return True
 
     @classmethod
@@ -240,17 +225,17 @@ class GlusterBaseClass(unittest.TestCase):
                 if cls.enable_nfs_ganesha and cls.nfs_ganesha_export_options:
                     g.log.info("Setting NFS-Ganesha export specific "
                                "volume options on volume %s", cls.volname)
-                    ret = set_volume_options(
+                    ret = apply_volume_options(
                         mnode=cls.mnode, volname=cls.volname,
                         options=cls.nfs_ganesha_export_options)
-                    if not ret:
+                    if ret is None:
                         g.log.error("Failed to set NFS-Ganesha "
                                     "export specific options on "
                                     "volume %s", cls.volname)
                         return False
                     g.log.info("Successful in setting NFS-Ganesha export "
-                               "specific volume options on volume %s",
-                               cls.volname)
+                               "specific volume options on volume %s, "
+                               "changed: %s", cls.volname, ret)
 
             if "smb" in cls.mount_type or "cifs" in cls.mount_type:
                 ret = share_volume_over_smb(mnode=cls.mnode,
@@ -267,16 +252,17 @@ class GlusterBaseClass(unittest.TestCase):
                 if cls.smb_share_options:
                     g.log.info("Setting SMB share specific volume options "
                                "on volume %s", cls.volname)
-                    ret = set_volume_options(mnode=cls.mnode,
-                                             volname=cls.volname,
-                                             options=cls.smb_share_options)
-                    if not ret:
+                    ret = apply_volume_options(mnode=cls.mnode,
+                                               volname=cls.volname,
+                                               options=cls.smb_share_options)
+                    if ret is None:
                         g.log.error("Failed to set SMB share "
                                     "specific options "
                                     "on volume %s", cls.volname)
                         return False
                     g.log.info("Successful in setting SMB share specific "
-                               "volume options on volume %s", cls.volname)
+                               "volume options on volume %s, changed: %s",
+                               cls.volname, ret)
 
         # Log Volume Info and Status
         g.log.info("Log Volume %s Info and Status", cls.volname)
@@ -435,196 +421,77 @@ class GlusterBaseClass(unittest.TestCase):
     def setUpClass(cls):
         """Initialize all the variables necessary for testing Gluster
         """
+        # Snapshots cached by an earlier test class (which may have used
+        # the same volume and snapshot names) are not to be trusted.
+        invalidate_snap_catalog()
+
+        # The config is resolved once per session. Only the class specific
+        # values are derived here.
+        session_config = get_session_config()
+
         # Get all servers
-        cls.all_servers = None
-        if 'servers' in g.config and g.config['servers']:
-            cls.all_servers = g.config['servers']
-            cls.servers = cls.all_servers
-        else:
-            raise ConfigError("'servers' not defined in the global config")
+        cls.all_servers = session_config.all_servers
+        cls.servers = cls.all_servers
 
         # Get all slaves
-        cls.slaves = None
-        if 'slaves' in g.config and g.config['slaves']:
-            cls.slaves = g.config['slaves']
+        cls.slaves = session_config.slaves
+        if cls.slaves:
             # Set mnode_slave : Node on which slave commands are executed
             cls.mnode_slave = cls.slaves[0]
             # Slave IP's
-            cls.slaves_ip = []
-            cls.slaves_ip = cls.get_ip_from_hostname(cls.slaves)
+            cls.slaves_ip = session_config.slaves_ip
 
         # Get all clients
-        cls.all_clients = None
-        if 'clients' in g.config and g.config['clients']:
-            cls.all_clients = g.config['clients']
-            cls.clients = cls.all_clients
-        else:
-            raise ConfigError("'clients' not defined in the global config")
+        cls.all_clients = session_config.all_clients
+        cls.clients = cls.all_clients
 
         # Get all servers info
-        cls.all_servers_info = None
-        if 'servers_info' in g.config and g.config['servers_info']:
-            cls.all_servers_info = g.config['servers_info']
-        else:
-            raise ConfigError("'servers_info' not defined in the global "
-                              "config")
+        cls.all_servers_info = session_config.all_servers_info
+
         # Get all slaves info
-        cls.all_slaves_info = None
-        if 'slaves_info' in g.config and g.config['slaves_info']:
-            cls.all_slaves_info = g.config['slaves_info']
+        cls.all_slaves_info = session_config.all_slaves_info
 
         # All clients_info
-        cls.all_clients_info = None
-        if 'clients_info' in g.config and g.config['clients_info']:
-            cls.all_clients_info = g.config['clients_info']
-        else:
-            raise ConfigError("'clients_info' not defined in the global "
-                              "config")
+        cls.all_clients_info = session_config.all_clients_info
 
         # Set mnode : Node on which gluster commands are executed
         cls.mnode = cls.all_servers[0]
 
         # Server IP's
-        cls.servers_ips = []
-        cls.servers_ips = cls.get_ip_from_hostname(cls.servers)
+        cls.servers_ips = session_config.servers_ips
 
         # SMB Cluster info
-        try:
-            cls.smb_users_info = (
-                g.config['gluster']['cluster_config']['smb']['users_info'])
-        except KeyError:
-            cls.smb_users_info = {}
-            cls.smb_users_info['root'] = {}
-            cls.smb_users_info['root']['password'] = 'foobar'
-            cls.smb_users_info['root']['acl'] = 'rwx'
+        cls.smb_users_info = session_config.smb_users_info
 
         # NFS-Ganesha Cluster info
-        try:
-            cls.enable_nfs_ganesha = bool(g.config['gluster']['cluster_config']
-                                          ['nfs_ganesha']['enable'])
-            cls.num_of_nfs_ganesha_nodes = (g.config['gluster']
-                                            ['cluster_config']['nfs_ganesha']
-                                            ['num_of_nfs_ganesha_nodes'])
-            cls.vips = (g.config['gluster']['cluster_config']['nfs_ganesha']
-                        ['vips'])
-        except KeyError:
-            cls.enable_nfs_ganesha = False
-            cls.num_of_nfs_ganesha_nodes = None
-            cls.vips = []
+        cls.enable_nfs_ganesha = session_config.enable_nfs_ganesha
+        cls.num_of_nfs_ganesha_nodes = (
+            session_config.num_of_nfs_ganesha_nodes)
+        cls.vips = session_config.vips
 
         # Defining default volume_types configuration.
-        cls.default_volume_type_config = {
-            'replicated': {
-                'type': 'replicated',
-                'replica_count': 3,
-                'transport': 'tcp'
-                },
-            'dispersed': {
-                'type': 'dispersed',
-                'disperse_count': 6,
-                'redundancy_count': 2,
-                'transport': 'tcp'
-                },
-            'distributed': {
-                'type': 'distributed',
-                'dist_count': 4,
-                'transport': 'tcp'
-                },
-            'distributed-replicated': {
-                'type': 'distributed-replicated',
-                'dist_count': 2,
-                'replica_count': 3,
-                'transport': 'tcp'
-                },
-            'distributed-dispersed': {
-                'type': 'distributed-dispersed',
-                'dist_count': 2,
-                'disperse_count': 6,
-                'redundancy_count': 2,
-                'transport': 'tcp'
-                }
-            }
-
-        # Check if default volume_type configuration is provided in
-        # config yml
-        if (g.config.get('gluster') and
-                g.config['gluster'].get('volume_types')):
-            default_volume_type_from_config = (
-                g.config['gluster']['volume_types'])
-
-            for volume_type in default_volume_type_from_config.keys():
-                if default_volume_type_from_config[volume_type]:
-                    if volume_type in cls.default_volume_type_config:
-                        cls.default_volume_type_config[volume_type] = (
-                            default_volume_type_from_config[volume_type])
+        cls.default_volume_type_config = (
+            session_config.default_volume_type_config)
 
         # Create Volume with force option
-        cls.volume_create_force = False
-        if (g.config.get('gluster') and
-                g.config['gluster'].get('volume_create_force')):
-            cls.volume_create_force = (
-                g.config['gluster']['volume_create_force'])
+        cls.volume_create_force = session_config.volume_create_force
 
         # Default volume options which is applicable for all the volumes
-        cls.volume_options = {}
-        if (g.config.get('gluster') and
-                g.config['gluster'].get('volume_options')):
-            cls.volume_options = g.config['gluster']['volume_options']
+        cls.volume_options = session_config.volume_options
 
         # If the volume is exported as SMB Share, then set the following
         # volume options on the share.
-        cls.smb_share_options = {}
-        if (g.config.get('gluster') and
-                g.config['gluster'].get('smb_share_options')):
-            cls.smb_share_options = (
-                g.config['gluster']['smb_share_options'])
+        cls.smb_share_options = session_config.smb_share_options
 
         # If the volume is exported as NFS-Ganesha export,
         # then set the following volume options on the export.
-        cls.nfs_ganesha_export_options = {}
-        if (g.config.get('gluster') and
-                g.config['gluster'].get('nfs_ganesha_export_options')):
-            cls.nfs_ganesha_export_options = (
-                g.config['gluster']['nfs_ganesha_export_options'])
+        cls.nfs_ganesha_export_options = (
+            session_config.nfs_ganesha_export_options)
 
         # Get the volume configuration.
         cls.volume = {}
         if cls.volume_type:
-            found_volume = False
-            if 'gluster' in g.config:
-                if 'volumes' in g.config['gluster']:
-                    for volume in g.config['gluster']['volumes']:
-                        if volume['voltype']['type'] == cls.volume_type:
-                            cls.volume = copy.deepcopy(volume)
-                            found_volume = True
-                            break
-
-            if found_volume:
-                if 'name' not in cls.volume:
-                    cls.volume['name'] = 'testvol_%s' % cls.volume_type
-
-                if 'servers' not in cls.volume:
-                    cls.volume['servers'] = cls.all_servers
-
-            if not found_volume:
-                try:
-                    if g.config['gluster']['volume_types'][cls.volume_type]:
-                        cls.volume['voltype'] = (g.config['gluster']
-                                                 ['volume_types']
-                                                 [cls.volume_type])
-                except KeyError:
-                    try:
-                        cls.volume['voltype'] = (cls.default_volume_type_config
-                                                 [cls.volume_type])
-                    except KeyError:
-                        raise ConfigError("Unable to get configs of volume "
-                                          "type: %s", cls.volume_type)
-                cls.volume['name'] = 'testvol_%s' % cls.volume_type
-                cls.volume['servers'] = cls.all_servers
-
-            # Set volume options
-            if 'options' not in cls.volume:
-                cls.volume['options'] = cls.volume_options
+            cls.volume = session_config.get_volume_config(cls.volume_type)
 
             # Define Volume Useful Variables.
             cls.volname = cls.volume['name']
@@ -636,70 +503,8 @@ class GlusterBaseClass(unittest.TestCase):
         # Get the mount configuration.
         cls.mounts = []
         if cls.mount_type:
-            cls.mounts_dict_list = []
-            found_mount = False
-            if 'gluster' in g.config:
-                if 'mounts' in g.config['gluster']:
-                    for mount in g.config['gluster']['mounts']:
-                        if mount['protocol'] == cls.mount_type:
-                            temp_mount = {}
-                            temp_mount['protocol'] = cls.mount_type
-                            if 'volname' in mount and mount['volname']:
-                                if mount['volname'] == cls.volname:
-                                    temp_mount = copy.deepcopy(mount)
-                                else:
-                                    continue
-                            else:
-                                temp_mount['volname'] = cls.volname
-                            if ('server' not in mount or
-                                    (not mount['server'])):
-                                temp_mount['server'] = cls.mnode
-                            else:
-                                temp_mount['server'] = mount['server']
-                            if ('mountpoint' not in mount or
-                                    (not mount['mountpoint'])):
-                                temp_mount['mountpoint'] = (os.path.join(
-                                    "/mnt", '_'.join([cls.volname,
-                                                      cls.mount_type])))
-                            else:
-                                temp_mount['mountpoint'] = mount['mountpoint']
-                            if ('client' not in mount or
-                                    (not mount['client'])):
-                                temp_mount['client'] = (
-                                    cls.all_clients_info[
-                                        random.choice(
-                                            cls.all_clients_info.keys())]
-                                    )
-                            else:
-                                temp_mount['client'] = mount['client']
-                            if 'options' in mount and mount['options']:
-                                temp_mount['options'] = mount['options']
-                            else:
-                                temp_mount['options'] = ''
-                            cls.mounts_dict_list.append(temp_mount)
-                            found_mount = True
-
-            if not found_mount:
-                for client in cls.all_clients_info.keys():
-                    mount = {
-                        'protocol': cls.mount_type,
-                        'server': cls.mnode,
-                        'volname': cls.volname,
-                        'client': cls.all_clients_info[client],
-                        'mountpoint': (os.path.join(
-                            "/mnt", '_'.join([cls.volname, cls.mount_type]))),
-                        'options': ''
-                        }
-                    cls.mounts_dict_list.append(mount)
-
-            if cls.mount_type == 'cifs' or cls.mount_type == 'smb':
-                for mount in cls.mounts_dict_list:
-                    if 'smbuser' not in mount:
-                        mount['smbuser'] = random.choice(
-                            cls.smb_users_info.keys())
-                        mount['smbpasswd'] = (
-                            cls.smb_users_info[mount['smbuser']]['password'])
-
+            cls.mounts_dict_list = session_config.get_mounts_dict_list(
+                cls.mount_type, cls.volname, cls.mnode)
             cls.mounts = create_mount_objs(cls.mounts_dict_list)
 
             # Defining clients from mounts.
@@ -709,69 +514,124 @@ class GlusterBaseClass(unittest.TestCase):
             cls.clients = list(set(cls.clients))
 
         # Gluster Logs info
-        cls.server_gluster_logs_dirs = ["/var/log/glusterfs",
-                                        "/var/log/samba"]
-        cls.server_gluster_logs_files = ["/var/log/ganesha.log",
-                                         "/var/log/ganesha-gfapi.log"]
-        if ('gluster' in g.config and
-                'server_gluster_logs_info' in g.config['gluster']):
-            server_gluster_logs_info = (
-                g.config['gluster']['server_gluster_logs_info'])
-            if ('dirs' in server_gluster_logs_info and
-                    server_gluster_logs_info['dirs']):
-                cls.server_gluster_logs_dirs = (
-                    server_gluster_logs_info['dirs'])
-
-            if ('files' in server_gluster_logs_info and
-                    server_gluster_logs_info['files']):
-                cls.server_gluster_logs_files = (
-                    server_gluster_logs_info['files'])
-
-        cls.client_gluster_logs_dirs = ["/var/log/glusterfs"]
-        cls.client_gluster_logs_files = []
-        if ('gluster' in g.config and
-                'client_gluster_logs_info' in g.config['gluster']):
-            client_gluster_logs_info = (
-                g.config['gluster']['client_gluster_logs_info'])
-            if ('dirs' in client_gluster_logs_info and
-                    client_gluster_logs_info['dirs']):
-                cls.client_gluster_logs_dirs = (
-                    client_gluster_logs_info['dirs'])
-
-            if ('files' in client_gluster_logs_info and
-                    client_gluster_logs_info['files']):
-                cls.client_gluster_logs_files = (
-                    client_gluster_logs_info['files'])
+        cls.server_gluster_logs_dirs = session_config.server_gluster_logs_dirs
+        cls.server_gluster_logs_files = (
+            session_config.server_gluster_logs_files)
+        cls.client_gluster_logs_dirs = session_config.client_gluster_logs_dirs
+        cls.client_gluster_logs_files = (
+            session_config.client_gluster_logs_files)
 
         # Have a unique string to recognize the test run for logging in
         # gluster logs
-        if 'glustotest_run_id' not in g.config:
-            g.config['glustotest_run_id'] = (
-                datetime.datetime.now().strftime('%H_%M_%d_%m_%Y'))
-        cls.glustotest_run_id = g.config['glustotest_run_id']
+        cls.glustotest_run_id = session_config.glustotest_run_id
+
+        # Gluster logs are marked by recording the log files offsets,
+        # optionally injecting the marker message into the logs as well.
+        cls.inject_log_messages = session_config.inject_log_messages
+        cls.failed_test_logs_dir = session_config.failed_test_logs_dir
+        cls.failed_test_logs_severities = (
+            session_config.failed_test_logs_severities)
+        cls.log_marker = LogMarker(cls.get_gluster_logs_paths())
 
         msg = "Setupclass: %s : %s" % (cls.__name__, cls.glustotest_run_id)
-        g.log.info(msg)
-        cls.inject_msg_in_gluster_logs(msg)
+        cls.mark_gluster_logs(msg)
 
         # Log the baseclass variables for debugging purposes
         g.log.debug("GlusterBaseClass Variables:\n %s", cls.__dict__)
 
     def setUp(self):
         msg = "Starting Test : %s : %s" % (self.id(), self.glustotest_run_id)
-        g.log.info(msg)
-        self.inject_msg_in_gluster_logs(msg)
+        self._test_start_log_marker = msg
+        self.mark_gluster_logs(msg)
 
     def tearDown(self):
         msg = "Ending Test: %s : %s" % (self.id(), self.glustotest_run_id)
-        g.log.info(msg)
-        self.inject_msg_in_gluster_logs(msg)
+        self.mark_gluster_logs(msg)
+
+        start_msg = getattr(self, '_test_start_log_marker', None)
+        if (start_msg is not None and self.failed_test_logs_dir and
+                self._is_test_failed()):
+            dest_dir = os.path.join(self.failed_test_logs_dir,
+                                    self.glustotest_run_id, self.id())
+            g.log.info("Collecting gluster logs of failed test %s in %s",
+                       self.id(), dest_dir)
+            self.log_marker.fetch_ranges(
+                start_msg, msg, dest_dir,
+                severities=self.failed_test_logs_severities)
+        self.log_marker.discard(start_msg, msg)
 
     @classmethod
     def tearDownClass(cls):
         msg = "Teardownclass: %s : %s" % (cls.__name__, cls.glustotest_run_id)
+        cls.mark_gluster_logs(msg)
+        cls.log_marker.discard(
+            "Setupclass: %s : %s" % (cls.__name__, cls.glustotest_run_id),
+            msg)
+
+    @classmethod
+    def get_gluster_logs_paths(cls):
+        """Returns the gluster log dirs and files of servers and clients.
+
+        Returns:
+            dict: node as key and tuple of (list_of_dirs, list_of_files)
+                as value.
+        """
+        nodes_log_paths = {}
+        for server in cls.servers:
+            nodes_log_paths[server] = (list(cls.server_gluster_logs_dirs),
+                                       list(cls.server_gluster_logs_files))
+
+        if cls.mount_type is not None and "glusterfs" in cls.mount_type:
+            for client in cls.clients:
+                dirs, files = nodes_log_paths.setdefault(client, ([], []))
+                dirs.extend([log_dir for log_dir in
+                             cls.client_gluster_logs_dirs
+                             if log_dir not in dirs])
+                files.extend([log_file for log_file in
+                              cls.client_gluster_logs_files
+                              if log_file not in files])
+        return nodes_log_paths
+
+    @classmethod
+    def mark_gluster_logs(cls, msg):
+        """Records the current offsets of all the gluster logs on servers,
+        clients with msg as the marker name.
+
+        Args:
+            msg (str): Marker name
+
+        Returns:
+            bool: True if the log offsets were recorded on all the nodes.
+                False Otherwise.
+        """
         g.log.info(msg)
-        cls.inject_msg_in_gluster_logs(msg)
+        _rc = cls.log_marker.mark(msg)
+        if cls.inject_log_messages:
+            if not cls.inject_msg_in_gluster_logs(msg):
+                _rc = False
+        return _rc
+
+    def _is_test_failed(self):
+        """Returns True if the currently running test has failed or errored
+        so far.
+        """
+        # python 3
+        outcome = getattr(self, '_outcome', None)
+        if outcome is not None:
+            errors = getattr(outcome, 'errors', None)
+            if errors is not None:
+                return any(exc_info is not None for _, exc_info in errors)
+            result = getattr(outcome, 'result', None)
+        else:
+            # python 2.7
+            result = getattr(self, '_resultForDoCleanups', None)
+
+        if result is None:
+            return False
+        for test, _ in list(result.failures) + list(result.errors):
+            if test is self:
+                return True
+        return False
 
 
 class GlusterBlockBaseClass(GlusterBaseClass):
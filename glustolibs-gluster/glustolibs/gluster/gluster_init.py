@@ -20,6 +20,8 @@
         and other initial gluster environment setup helpers.
 """
 from glusto.core import Glusto as g
+from glustolibs.gluster.peer_ops import invalidate_peer_connectivity_cache
+from glustolibs.gluster.snap_ops import invalidate_snap_catalog
 
 
 def start_glusterd(servers):
@@ -37,6 +39,8 @@ def start_glusterd(servers):
         servers = [servers]
 
     cmd = "pgrep glusterd || service glusterd start"
+    invalidate_peer_connectivity_cache()
+    invalidate_snap_catalog()
     results = g.run_parallel(servers, cmd)
 
     _rc = True
@@ -66,6 +70,8 @@ def stop_glusterd(servers):
         servers = [servers]
 
     cmd = "service glusterd stop"
+    invalidate_peer_connectivity_cache()
+    invalidate_snap_catalog()
     results = g.run_parallel(servers, cmd)
 
     _rc = True
@@ -95,6 +101,8 @@ def restart_glusterd(servers):
         servers = [servers]
 
     cmd = "service glusterd restart"
+    invalidate_peer_connectivity_cache()
+    invalidate_snap_catalog()
     results = g.run_parallel(servers, cmd)
 
     _rc = True
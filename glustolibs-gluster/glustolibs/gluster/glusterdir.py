@@ -116,6 +116,7 @@ class GlusterDir(GlusterFile):
         """
         if not self.exists_on_client:
             ret = mkdir(self._host, self._fqpath, parents, mode)
+            self._invalidate(self._fqpath, self.parent_dir)
             if ret:
                 return True
 
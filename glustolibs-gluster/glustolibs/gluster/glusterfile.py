@@ -19,9 +19,11 @@
 
 A GlusterFile is a file object that exists on the client and backend brick.
 This module provides low-level functions and a GlusterFile class to maintain
-state and manage properties of a file in both locations.
+state and manage properties of a file in both locations, and a GlusterFileSet
+class to prefetch the properties of many files at once.
 """
 
+import binascii
 import ctypes
 import os
 import re
@@ -29,6 +31,7 @@ import re
 from glusto.core import Glusto as g
 
 from glustolibs.gluster.layout import Layout
+from glustolibs.io.utils import iter_tree_scan_dump, run_tree_scans
 
 
 def calculate_hash(host, filename):
@@ -364,8 +367,13 @@ def get_pathinfo(host, fqpath):
     Returns:
         A dictionary of pathinfo data for a remote file. None on fail.
     """
+    return _parse_pathinfo(get_fattr(host, fqpath,
+                                     'trusted.glusterfs.pathinfo'))
+
+
+def _parse_pathinfo(raw):
     pathinfo = {}
-    pathinfo['raw'] = get_fattr(host, fqpath, 'trusted.glusterfs.pathinfo')
+    pathinfo['raw'] = raw
     pathinfo['brickdir_paths'] = re.findall(r".*?POSIX.*?:(\S+)\>",
                                             pathinfo['raw'])
 
@@ -419,9 +427,20 @@ def get_dht_linkto_xattr(host, fqpath):
 
 class GlusterFile(object):
     """Class to handle files specific to Gluster (client and backend)"""
-    def __init__(self, host, fqpath):
+    def __init__(self, host, fqpath, fileset=None):
+        """Init the file class
+
+        Args:
+            host (str): The hostname/ip of the client system.
+            fqpath (str): The fully-qualified path of the file on the client.
+
+        Kwargs:
+            fileset (GlusterFileSet): set whose prefetched snapshot backs the
+                properties of the file instead of remote calls.
+        """
         self._host = host
         self._fqpath = fqpath
+        self._fileset = fileset
 
         self._mountpoint = None
         self._calculated_hash = None
@@ -431,6 +450,58 @@ class GlusterFile(object):
 
         self._previous_fqpath = None
 
+    def _get_snapshot(self, host, fqpath):
+        """Returns the prefetched record of a path. None if not backed."""
+        if self._fileset is None:
+            return None
+
+        return self._fileset.get_snapshot(host, fqpath)
+
+    def _invalidate(self, *fqpaths):
+        """Drops the prefetched records of paths after a change."""
+        if self._fileset is not None:
+            for fqpath in fqpaths:
+                self._fileset.invalidate(fqpath)
+
+    def _file_exists(self, host, fqpath):
+        record = self._get_snapshot(host, fqpath)
+        if record is not None:
+            return record['stat'] is not None
+
+        return file_exists(host, fqpath)
+
+    def _file_stat(self, host, fqpath):
+        record = self._get_snapshot(host, fqpath)
+        if record is not None:
+            return record['stat']
+
+        return get_file_stat(host, fqpath)
+
+    def _md5sum(self, host, fqpath):
+        record = self._get_snapshot(host, fqpath)
+        if record is not None and 'md5sum' in record:
+            return record['md5sum']
+
+        return get_md5sum(host, fqpath)
+
+    def _get_pathinfo(self, fqpath):
+        record = self._get_snapshot(self._host, fqpath)
+        if record is not None and record['pathinfo'] is not None:
+            return record['pathinfo']
+
+        return get_pathinfo(self._host, fqpath)
+
+    def _is_linkto_file(self, host, fqpath):
+        record = self._get_snapshot(host, fqpath)
+        if record is not None:
+            stat = record['stat']
+            return (stat is not None and
+                    stat['filetype'] == 'regular empty file' and
+                    bool(int(stat['access'], 8) & 0o1000) and
+                    'trusted.glusterfs.dht.linkto' in record['xattrs'])
+
+        return is_linkto_file(host, fqpath)
+
     @property
     def host(self):
         """str: the hostname/ip of the client system hosting the file."""
@@ -467,7 +538,7 @@ class GlusterFile(object):
     @property
     def pathinfo(self):
         """dict: a dictionary of path_info-related values"""
-        self._pathinfo = get_pathinfo(self._host, self._fqpath)
+        self._pathinfo = self._get_pathinfo(self._fqpath)
 
         return self._pathinfo
 
@@ -476,14 +547,14 @@ class GlusterFile(object):
         """"dict: a dictionary of path_info-related values for the parent dir
                     of the file's fqpath.
         """
-        parent_dir_pathinfo = get_pathinfo(self._host, self.parent_dir)
+        parent_dir_pathinfo = self._get_pathinfo(self.parent_dir)
 
         return parent_dir_pathinfo
 
     @property
     def exists_on_client(self):
         """bool: Does the file exists on the client?"""
-        ret = file_exists(self._host, self._fqpath)
+        ret = self._file_exists(self._host, self._fqpath)
 
         if ret:
             return True
@@ -496,7 +567,7 @@ class GlusterFile(object):
         flag = 0
         for brickdir_path in self.pathinfo['brickdir_paths']:
             (host, fqpath) = brickdir_path.split(':')
-            if not file_exists(host, fqpath):
+            if not self._file_exists(host, fqpath):
                 flag = flag | 1
 
         if flag == 0:
@@ -511,7 +582,7 @@ class GlusterFile(object):
         flag = 0
         for brickdir_path in self.hashed_bricks:
             (host, fqpath) = brickdir_path.split(':')
-            if not file_exists(host, fqpath):
+            if not self._file_exists(host, fqpath):
                 flag = flag | 1
 
         if flag == 0:
@@ -531,7 +602,7 @@ class GlusterFile(object):
         flag = 0
         for brickdir_path in self.cached_bricks:
             (host, fqpath) = brickdir_path.split(':')
-            if not file_exists(host, fqpath):
+            if not self._file_exists(host, fqpath):
                 flag = flag | 1
 
         if flag == 0:
@@ -547,7 +618,7 @@ class GlusterFile(object):
     @property
     def stat_on_client(self):
         """dict: a dictionary of stat data"""
-        return get_file_stat(self._host, self._fqpath)
+        return self._file_stat(self._host, self._fqpath)
 
     @property
     def stat_on_bricks(self):
@@ -555,7 +626,7 @@ class GlusterFile(object):
         file_stats = {}
         for brickdir_path in self.pathinfo['brickdir_paths']:
             (host, fqpath) = brickdir_path.split(':')
-            file_stats[brickdir_path] = get_file_stat(host, fqpath)
+            file_stats[brickdir_path] = self._file_stat(host, fqpath)
 
         return file_stats
 
@@ -567,7 +638,7 @@ class GlusterFile(object):
     @property
     def md5sum_on_client(self):
         """str: the md5sum for the file on the client"""
-        return get_md5sum(self._host, self._fqpath)
+        return self._md5sum(self._host, self._fqpath)
 
     @property
     def md5sum_on_bricks(self):
@@ -576,7 +647,7 @@ class GlusterFile(object):
         file_md5s = {}
         for brickdir_path in self.pathinfo['brickdir_paths']:
             (host, fqpath) = brickdir_path.split(':')
-            file_md5s[brickdir_path] = get_md5sum(host, fqpath)
+            file_md5s[brickdir_path] = self._md5sum(host, fqpath)
 
         return file_md5s
 
@@ -597,7 +668,21 @@ class GlusterFile(object):
     def parent_dir_layout(self):
         """obj: Layout instance of the file's parent directory"""
         if self._parent_dir_layout is None:
-            layout = Layout(self.parent_dir_pathinfo)
+            pathinfo = self.parent_dir_pathinfo
+            hashranges = {}
+            for brickdir_path in pathinfo['brickdir_paths']:
+                (host, fqpath) = brickdir_path.split(':')
+                record = self._get_snapshot(host, fqpath)
+                if record is None:
+                    continue
+                value = record['xattrs'].get('trusted.glusterfs.dht')
+                if value is not None:
+                    # Trailing 16 hex bytes are the low and high hash
+                    full_hash_hex = binascii.hexlify(value).decode('ascii')
+                    hashranges[brickdir_path] = (
+                        int(full_hash_hex[-16:-8], 16),
+                        int(full_hash_hex[-8:], 16))
+            layout = Layout(pathinfo, hashranges)
             self._parent_dir_layout = layout
         else:
             layout = self._parent_dir_layout
@@ -627,8 +712,8 @@ class GlusterFile(object):
         brickpaths = []
         for brickdir in self.parent_dir_layout.brickdirs:
             fqpath = os.path.join(brickdir.fqpath, self.basename)
-            if file_exists(brickdir.host, fqpath):
-                if not is_linkto_file(brickdir.host, fqpath):
+            if self._file_exists(brickdir.host, fqpath):
+                if not self._is_linkto_file(brickdir.host, fqpath):
                     brickpaths.append(brickdir.path)
 
         return brickpaths
@@ -645,6 +730,7 @@ class GlusterFile(object):
         ret = move_file(self._host, self._fqpath, dest_fqpath)
 
         if ret:
+            self._invalidate(self._fqpath, dest_fqpath)
             # TODO: change this to use a setter/getter for heavy lifting once
             #        and can reset everything from one place
             self._previous_fqpath = self._fqpath
@@ -670,6 +756,7 @@ class GlusterFile(object):
                 return False
             command = "cp /etc/inittab %s" % self._fqpath
             rcode, _, _ = g.run(self._host, command)
+            self._invalidate(self._fqpath, self.parent_dir)
             if rcode == 0:
                 return True
 
@@ -684,6 +771,12 @@ class GlusterFile(object):
         Returns:
             Result of get_fattr function.
         """
+        record = self._get_snapshot(self._host, self._fqpath)
+        # Virtual xattrs of the client are not listed, read them live
+        if record is not None and xattr in record['xattrs']:
+            return record['xattrs'][xattr].rstrip(b'\0').decode(
+                'utf-8', 'replace').strip()
+
         return get_fattr(self._host, self._fqpath, xattr)
 
     def set_xattr(self, xattr, value):
@@ -696,7 +789,10 @@ class GlusterFile(object):
         Returns:
             Return of set_fattr function.
         """
-        return set_fattr(self._host, self._fqpath, xattr, value)
+        ret = set_fattr(self._host, self._fqpath, xattr, value)
+        self._invalidate(self._fqpath)
+
+        return ret
 
     def delete_xattr(self, xattr):
         """Delete the specified xattr for the file instance.
@@ -707,4 +803,236 @@ class GlusterFile(object):
         Returns:
             Return of delete_fattr function.
         """
-        return delete_fattr(self._host, self._fqpath, xattr)
+        ret = delete_fattr(self._host, self._fqpath, xattr)
+        self._invalidate(self._fqpath)
+
+        return ret
+
+
+class GlusterFileSet(object):
+    """Set of files of a client whose client and backend properties are
+    prefetched at once, instead of with remote calls per property and per
+    brick.
+
+    The stat, the extended attributes, the pathinfo and optionally the
+    md5sum of the files and of their parent directories are read with one
+    tree_scan.py run on the client. Then the stat, the extended attributes
+    and optionally the md5sum of all their candidate backend copies (the
+    pathinfo locations, and the file name under every brickdir of the
+    parent directory layout) are read with one run per brick node, all the
+    nodes in parallel.
+
+    The GlusterFile objects of the set are backed by that snapshot. The
+    records of a file are dropped when it is changed through its object
+    (move, create, set_xattr, delete_xattr) or by invalidate(), after which
+    its properties are read live until the next prefetch().
+
+    Example:
+        fileset = GlusterFileSet(client, ["/mnt/testvol/file%d" % i
+                                          for i in range(100)])
+        for gfile in fileset:
+            assert gfile.exists_on_hashed_bricks
+    """
+    def __init__(self, host, fqpaths, md5sum=False, jobs=4):
+        """Init the file set class
+
+        Args:
+            host (str): The hostname/ip of the client system.
+            fqpaths (list): The fully-qualified paths of the files on the
+                client.
+
+        Kwargs:
+            md5sum (bool): True to also prefetch the md5sum of the files on
+                the client and on the bricks. Defaults to False.
+            jobs (int): number of files read in parallel on every node.
+        """
+        if isinstance(fqpaths, str):
+            fqpaths = [fqpaths]
+        self._host = host
+        self._fqpaths = list(fqpaths)
+        self._md5sum = md5sum
+        self._jobs = jobs
+
+        # "host:fqpath" -> record, None until prefetched
+        self._records = None
+        # fqpath on the client -> "host:fqpath" of its records
+        self._owned = {}
+        self._files = {}
+
+    def __len__(self):
+        return len(self._fqpaths)
+
+    def __iter__(self):
+        for fqpath in self._fqpaths:
+            yield self[fqpath]
+
+    def __getitem__(self, fqpath):
+        """GlusterFile (GlusterDir for directories) backed by the set."""
+        if fqpath not in self._files:
+            record = self.get_snapshot(self._host, fqpath)
+            if (record is not None and record['stat'] is not None and
+                    record['stat']['filetype'] == 'directory'):
+                from glustolibs.gluster.glusterdir import GlusterDir
+                self._files[fqpath] = GlusterDir(self._host, fqpath, self)
+            else:
+                self._files[fqpath] = GlusterFile(self._host, fqpath, self)
+
+        return self._files[fqpath]
+
+    @property
+    def host(self):
+        """str: the hostname/ip of the client system hosting the files."""
+        return self._host
+
+    @property
+    def fqpaths(self):
+        """list: the fully-qualified paths of the files of the set."""
+        return list(self._fqpaths)
+
+    def _scan(self, node_paths, args):
+        """Runs the stat scan of the paths of every node and returns the
+        records, keyed by "node:path". None on fail.
+        """
+        nodes = list(node_paths)
+        dumps = run_tree_scans([(node, args, node_paths[node])
+                                for node in nodes])
+        if dumps is None:
+            g.log.error("Failed to prefetch the files of %s" % nodes)
+            return None
+
+        records = {}
+        for node, dump in zip(nodes, dumps):
+            for fields in iter_tree_scan_dump(dump, fields=5):
+                fqpath = fields[0].decode('utf-8')
+                record = {'stat': None, 'xattrs': {}, 'pathinfo': None}
+                if fields[1]:
+                    (filetype, inode, access, size, links,
+                     uid, gid, username, groupname) = \
+                        fields[1].decode('utf-8').split(':')
+                    record['stat'] = {
+                        'filetype': filetype,
+                        'filename': fqpath,
+                        'inode': inode,
+                        'access': access,
+                        'size': size,
+                        'links': links,
+                        'username': username,
+                        'groupname': groupname,
+                        'uid': uid,
+                        'gid': gid,
+                    }
+                for pair in fields[2].split():
+                    (name, value) = pair.split(b'=', 1)
+                    record['xattrs'][name.decode('utf-8')] = \
+                        binascii.unhexlify(value)
+                if fields[3]:
+                    record['pathinfo'] = _parse_pathinfo(
+                        fields[3].decode('utf-8'))
+                if self._md5sum:
+                    record['md5sum'] = None
+                    if fields[4]:
+                        record['md5sum'] = "%s  %s" % (
+                            fields[4].decode('ascii'), fqpath)
+                records["%s:%s" % (node, fqpath)] = record
+            os.remove(dump)
+
+        return records
+
+    def prefetch(self):
+        """Reads the snapshot of the files of the set, replacing the
+        previous one.
+
+        Returns:
+            True on success. False on fail, the properties of the files are
+            then read live.
+        """
+        args = "stat -j %d" % self._jobs
+        if self._md5sum:
+            args += " --md5"
+
+        parent_dirs = sorted(set(os.path.dirname(fqpath)
+                                 for fqpath in self._fqpaths))
+        client_paths = list(self._fqpaths) + [
+            fqpath for fqpath in parent_dirs if fqpath not in self._fqpaths]
+        self._records = {}
+        self._owned = {}
+        records = self._scan({self._host: client_paths},
+                             args + " --pathinfo")
+        if records is None:
+            return False
+
+        # Candidate backend copies: the pathinfo locations of the file and
+        # its name under every brickdir of the parent directory.
+        owned = {}
+        for fqpath in client_paths:
+            key = "%s:%s" % (self._host, fqpath)
+            owned[fqpath] = set([key])
+            pathinfo = records[key]['pathinfo']
+            if pathinfo is not None:
+                owned[fqpath].update(pathinfo['brickdir_paths'])
+        for fqpath in self._fqpaths:
+            pathinfo = records["%s:%s" % (self._host,
+                                          os.path.dirname(fqpath))]['pathinfo']
+            if pathinfo is None:
+                continue
+            for brickdir_path in pathinfo['brickdir_paths']:
+                owned[fqpath].add(os.path.join(brickdir_path,
+                                               os.path.basename(fqpath)))
+
+        node_paths = {}
+        for keys in owned.values():
+            for key in keys:
+                (node, fqpath) = key.split(':', 1)
+                if key not in records:
+                    node_paths.setdefault(node, set()).add(fqpath)
+        if node_paths:
+            brick_records = self._scan(
+                dict((node, sorted(paths))
+                     for node, paths in node_paths.items()), args)
+            if brick_records is None:
+                return False
+            records.update(brick_records)
+
+        self._records = records
+        self._owned = owned
+        return True
+
+    def get_snapshot(self, host, fqpath):
+        """Get the prefetched record of a path of the client or of a brick,
+        prefetching the set on first use.
+
+        Args:
+            host (str): The hostname/ip of the client or of the brick node.
+            fqpath (str): The fully-qualified path on the host.
+
+        Returns:
+            A dictionary with the keys 'stat' (as get_file_stat, None if
+            the path does not exist), 'xattrs' (name -> raw value),
+            'pathinfo' (as get_pathinfo, None if not on the client) and
+            'md5sum' (as get_md5sum, only if md5sums are prefetched).
+            None if the path is not in the snapshot.
+        """
+        if self._records is None:
+            self.prefetch()
+
+        return self._records.get("%s:%s" % (host, fqpath))
+
+    def invalidate(self, fqpath=None):
+        """Drops the prefetched records of a file of the client (its own,
+        and those of its backend copies), or of all the files.
+
+        Kwargs:
+            fqpath (str): The fully-qualified path of the file on the
+                client. Defaults to all the files.
+
+        Returns:
+            None
+        """
+        if fqpath is None:
+            self._records = {}
+            self._owned = {}
+            return
+
+        for key in self._owned.pop(fqpath, ()):
+            if self._records is not None:
+                self._records.pop(key, None)
@@ -20,9 +20,14 @@
     Description: Module for gluster heal related helper functions.
 """
 
+import binascii
+import os
+import struct
 import time
+from array import array
 from glusto.core import Glusto as g
 from glustolibs.gluster.volume_ops import get_volume_status
+from glustolibs.io.utils import run_tree_scans, iter_tree_scan_dump
 try:
     import xml.etree.cElementTree as etree
 except ImportError:
@@ -207,16 +212,16 @@ def is_heal_complete(mnode, volname):
     Return:
         bool: True if heal is complete. False otherwise
     """
-    from glustolibs.gluster.heal_ops import get_heal_info
-    heal_info_data = get_heal_info(mnode, volname)
-    if heal_info_data is None:
+    from glustolibs.gluster.heal_ops import get_heal_info_counts
+    heal_info_counts = get_heal_info_counts(mnode, volname)
+    if heal_info_counts is None:
         g.log.error("Unable to verify whether heal is successful or not on "
                     "volume %s" % volname)
         return False
 
     heal_complete = True
-    for brick_heal_info_data in heal_info_data:
-        if brick_heal_info_data['numberOfEntries'] != '0':
+    for brick_heal_info_counts in heal_info_counts.values():
+        if brick_heal_info_counts['numberOfEntries'] != 0:
             heal_complete = False
 
     if not heal_complete:
@@ -262,6 +267,43 @@ def is_volume_in_split_brain(mnode, volname):
     return False
 
 
+def diff_heal_pending_gfids(before, after):
+    """Compares two samples of pending gfids taken with
+        heal_ops.get_heal_pending_gfids and finds the entries healed and the
+        entries newly marked for heal on every brick in between.
+
+    Args:
+        before (dict): brick -> set of gfids pending heal at first sample.
+        after (dict): brick -> set of gfids pending heal at second sample.
+
+    Returns:
+        dict: brick names are the keys of the dict with each key having
+            a dict with 'healed' and 'new' sets of gfids. None instead of the
+            dict when the pending entries of the brick are not known in any
+            of the samples. e.g brick was offline.
+            Example:
+                {
+                    'ijk.lab.eng.xyz.com:/bricks/brick0': {
+                        'healed': set(['a2c4...', ...]),
+                        'new': set()
+                        },
+                    'def.lab.eng.xyz.com:/bricks/brick0': None
+                    }
+    """
+    heal_diff = {}
+    for brick in set(before) | set(after):
+        gfids_before = before.get(brick)
+        gfids_after = after.get(brick)
+        if gfids_before is None or gfids_after is None:
+            heal_diff[brick] = None
+            continue
+        heal_diff[brick] = {
+            'healed': gfids_before - gfids_after,
+            'new': gfids_after - gfids_before
+        }
+    return heal_diff
+
+
 def get_unhealed_entries_info(volname, mnode=''):
     """Get the information of all gfid's on which heal is pending. The
         information includes - stat of gfid, getfattr output for all the dirs/
@@ -513,3 +555,259 @@ def bring_self_heal_daemon_process_offline(nodes):
         _rc = False
 
     return _rc
+
+
+# Pending counters of an AFR changelog xattr, in order
+AFR_CHANGELOG_TYPES = ('data', 'metadata', 'entry')
+
+
+def decode_afr_changelog(value):
+    """Decodes the value of a trusted.afr.* xattr.
+
+    Args:
+        value (str): hex value of the xattr, with or without the '0x'
+            prefix of getfattr.
+
+    Returns:
+        tuple: (data, metadata, entry) pending counters.
+
+    Example:
+        decode_afr_changelog("0x000000020000000000000000")
+        >>>(2, 0, 0)
+    """
+    if value.startswith('0x'):
+        value = value[2:]
+    raw = binascii.unhexlify(value)[:12].ljust(12, b'\0')
+    return struct.unpack('>3i', raw)
+
+
+class AfrChangelogScan(object):
+    """AFR changelogs (trusted.afr.<volname>-client-N xattrs) of all the
+    entries of a tree, from all the bricks of every replica subvol, as
+    per entry blame matrices.
+
+    A blame matrix of an entry of a subvol with n bricks is an array of
+    3 * n * n pending counters, the counter of type t (data, metadata,
+    entry) held by brick i against brick j being at t * n * n + i * n + j.
+    Only entries with pending counters or dirty xattrs are kept. Paths are
+    relative to the scanned dir, '.' being the dir itself.
+
+    Example:
+        scan = scan_afr_changelogs(mnode, "testvol", "dir1")
+        scan.get_summary()
+        scan.get_split_brain_candidates()
+        later = scan_afr_changelogs(mnode, "testvol", "dir1")
+        scan.diff(later)
+    """
+    def __init__(self, volname, subvols):
+        """Initializes an empty scan.
+
+        Args:
+            volname (str): volume name
+            subvols (list): bricks of the replica subvols, as
+                get_subvols()['volume_subvols'].
+        """
+        self.volname = volname
+        self.subvols = subvols
+        # (subvol index, path) -> blame matrix
+        self.matrices = {}
+        # (subvol index, path) -> dirty counters, 3 per brick
+        self.dirty = {}
+        # bricks which could not be scanned
+        self.failed_bricks = []
+
+    def add_brick_dump(self, brick, dump):
+        """Adds the trusted.afr.* xattrs dumped by tree_scan.py from a
+        brick to the scan.
+
+        Args:
+            brick (str): brick in <host>:<path> format.
+            dump (str): local path of the xattrs dump of the brick.
+        """
+        for index, bricks in enumerate(self.subvols):
+            if brick in bricks:
+                subvol, accuser = index, bricks.index(brick)
+                break
+        else:
+            g.log.error("Brick %s is not in volume %s", brick, self.volname)
+            return
+        size = len(self.subvols[subvol])
+        # Client indices of the bricks are their indices in the volume
+        first = sum(len(bricks) for bricks in self.subvols[:subvol])
+        prefix = "trusted.afr.%s-client-" % self.volname
+
+        for relpath, pairs in iter_tree_scan_dump(dump):
+            key = (subvol, relpath.decode('utf-8', 'replace'))
+            for pair in pairs.decode('ascii').split(' '):
+                name, value = pair.split('=', 1)
+                counters = decode_afr_changelog(value)
+                if name == 'trusted.afr.dirty':
+                    dirty = self.dirty.setdefault(
+                        key, array('i', [0] * (3 * size)))
+                    for kind, counter in enumerate(counters):
+                        dirty[kind * size + accuser] = counter
+                    continue
+                if not name.startswith(prefix):
+                    continue
+                accused = int(name[len(prefix):]) - first
+                if not 0 <= accused < size:
+                    continue
+                matrix = self.matrices.setdefault(
+                    key, array('i', [0] * (3 * size * size)))
+                for kind, counter in enumerate(counters):
+                    matrix[kind * size * size + accuser * size +
+                           accused] = counter
+
+    def get_matrix(self, subvol, path):
+        """Returns the blame matrices of an entry.
+
+        Args:
+            subvol (int): index of the replica subvol.
+            path (str): path of the entry.
+
+        Returns:
+            dict: 'data', 'metadata' and 'entry' -> n x n list of lists,
+                row i holding the counters of brick i against every brick.
+        """
+        size = len(self.subvols[subvol])
+        matrix = self.matrices.get((subvol, path),
+                                   [0] * (3 * size * size))
+        return dict((kind, [list(matrix[(index * size + row) * size:
+                                        (index * size + row + 1) * size])
+                            for row in range(size)])
+                    for index, kind in enumerate(AFR_CHANGELOG_TYPES))
+
+    def _get_blamed(self, key, kind):
+        # bricks blamed by another brick for the changelog type
+        size = len(self.subvols[key[0]])
+        matrix = self.matrices[key]
+        base = AFR_CHANGELOG_TYPES.index(kind) * size * size
+        return set(accused for accuser in range(size)
+                   for accused in range(size)
+                   if accused != accuser and
+                   matrix[base + accuser * size + accused])
+
+    def get_summary(self):
+        """Summarizes the pending counters of the scan.
+
+        Returns:
+            dict: number of entries with pending changelogs ('pending'),
+                with dirty xattrs ('dirty'), with pending 'data',
+                'metadata' and 'entry' changelogs, the number of entries
+                blamed on every brick ('blamed') and the 'failed_bricks'.
+        """
+        summary = {
+            'pending': 0,
+            'dirty': len(self.dirty),
+            'blamed': {},
+            'failed_bricks': list(self.failed_bricks),
+        }
+        for kind in AFR_CHANGELOG_TYPES:
+            summary[kind] = 0
+
+        for key in self.matrices:
+            bricks = self.subvols[key[0]]
+            blamed = set()
+            for kind in AFR_CHANGELOG_TYPES:
+                kind_blamed = self._get_blamed(key, kind)
+                if kind_blamed:
+                    summary[kind] += 1
+                    blamed |= kind_blamed
+            if blamed:
+                summary['pending'] += 1
+            for accused in blamed:
+                summary['blamed'][bricks[accused]] = (
+                    summary['blamed'].get(bricks[accused], 0) + 1)
+        return summary
+
+    def get_split_brain_candidates(self):
+        """Finds the entries which can not be healed without a policy:
+        the entries for which every scanned brick of the subvol is blamed
+        by another brick, leaving no source.
+
+        Returns:
+            list: sorted (subvol index, path, list of changelog types in
+                split-brain) tuples.
+        """
+        failed = set(self.failed_bricks)
+        candidates = []
+        for key in sorted(self.matrices):
+            bricks = self.subvols[key[0]]
+            scanned = set(index for index, brick in enumerate(bricks)
+                          if brick not in failed)
+            kinds = [kind for kind in AFR_CHANGELOG_TYPES
+                     if scanned and scanned <= self._get_blamed(key, kind)]
+            if kinds:
+                candidates.append((key[0], key[1], kinds))
+        return candidates
+
+    def diff(self, other):
+        """Compares the scan with a later scan of the same tree.
+
+        Args:
+            other (AfrChangelogScan): later scan.
+
+        Returns:
+            dict: 'healed' (pending before, not after), 'new' (pending
+                after, not before) and 'changed' (pending counters
+                changed) sorted lists of (subvol index, path).
+        """
+        before, after = set(self.matrices), set(other.matrices)
+        return {
+            'healed': sorted(before - after),
+            'new': sorted(after - before),
+            'changed': sorted(key for key in before & after
+                              if self.matrices[key] != other.matrices[key]),
+        }
+
+
+def scan_afr_changelogs(mnode, volname, path=''):
+    """Dumps the AFR changelogs of all the entries of a tree from all the
+    bricks of the volume, with one tree_scan.py run per brick, in
+    parallel, and builds the blame matrices of the entries.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): path relative to the volume root of the dir to scan.
+            Defaults to the volume root.
+
+    Returns:
+        AfrChangelogScan: the scan. Bricks which could not be scanned (e.g
+            offline nodes) are in failed_bricks.
+        NoneType: None on failure.
+
+    Example:
+        scan_afr_changelogs("abc.com", "testvol", "dir1")
+    """
+    # volume_libs imports this module
+    from glustolibs.gluster.volume_libs import get_subvols
+
+    subvols = get_subvols(mnode, volname)['volume_subvols']
+    if not subvols:
+        g.log.error("Failed to get the subvols of volume %s", volname)
+        return None
+    bricks = [brick for bricks in subvols for brick in bricks]
+
+    scans = []
+    for brick in bricks:
+        node, brick_path = brick.split(':', 1)
+        scans.append((node, "xattrs -p trusted.afr. --nonzero --brick %s" %
+                      os.path.join(brick_path, path.strip('/'))))
+    dumps = run_tree_scans(scans, partial=True)
+    if dumps is None:
+        return None
+
+    scan = AfrChangelogScan(volname, subvols)
+    for brick, dump in zip(bricks, dumps):
+        if dump is None:
+            scan.failed_bricks.append(brick)
+            continue
+        scan.add_brick_dump(brick, dump)
+        os.remove(dump)
+    if scan.failed_bricks:
+        g.log.error("Failed to scan the AFR changelogs on the bricks %s",
+                    scan.failed_bricks)
+    return scan
@@ -20,6 +20,8 @@
 """
 
 from glusto.core import Glusto as g
+from glustolibs.gluster.xml_records import (parse_xml_records, StringReader,
+                                            HEAL_INFO_BRICK)
 try:
     import xml.etree.cElementTree as etree
 except ImportError:
@@ -258,6 +260,100 @@ def heal_info_split_brain(mnode, volname):
     return g.run(mnode, cmd)
 
 
+def parse_heal_info_xml(xml_output, entries='files'):
+    """Lazily parses the xml output of heal info commands and yields the
+        heal info data of one brick at a time. Elements are freed as soon
+        as they are parsed, hence the memory used does not grow with the
+        number of pending entries unless they are asked to be collected.
+
+    Args:
+        xml_output (str): xml output of 'gluster volume heal <volname> info'
+            or 'gluster volume heal <volname> info split-brain' commands.
+
+    Kwargs:
+        entries (str|None): How the pending entries of a brick are collected.
+            'files': list of {gfid: path} dicts under the key 'file'
+                (only when the brick has entries, as in get_heal_info).
+            'gfids': set of gfids under the key 'gfids'.
+            None: entries are discarded.
+            Defaults to 'files'.
+
+    Yields:
+        dict: heal info data of a brick. i.e name, status, numberOfEntries
+            and the pending entries as requested.
+
+    Raises:
+        etree.ParseError: if the xml output can not be parsed.
+    """
+    bricks_elem = brick_elem = None
+    brick_info, files, gfids = {}, [], set()
+    for event, elem in etree.iterparse(StringReader(xml_output),
+                                       events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'bricks':
+                bricks_elem = elem
+            elif elem.tag == 'brick':
+                brick_elem = elem
+                brick_info, files, gfids = {}, [], set()
+            continue
+
+        if brick_elem is None:
+            continue
+        if elem.tag == 'file':
+            if entries == 'files':
+                files.append({elem.attrib.get('gfid'): elem.text})
+            elif entries == 'gfids':
+                gfids.add(elem.attrib.get('gfid') or elem.text)
+            brick_elem.remove(elem)
+        elif elem is brick_elem:
+            if files:
+                brick_info['file'] = files
+            if entries == 'gfids':
+                brick_info['gfids'] = gfids
+            elem.clear()
+            if bricks_elem is not None:
+                bricks_elem.remove(elem)
+            brick_elem = None
+            yield brick_info
+        else:
+            brick_info[elem.tag] = elem.text
+
+
+def _get_heal_info_xml(mnode, volname, info_type='', entries='files'):
+    """Runs heal info command of the given type with xml output.
+        The pending entries not needed by the caller are stripped
+        on the node itself, so that they are neither transferred
+        nor parsed.
+
+    Args:
+        mnode : Node on which commands are executed
+        volname : Name of the volume
+
+    Kwargs:
+        info_type (str): heal info sub-command. e.g. 'split-brain'
+        entries (str|None): Same as in parse_heal_info_xml.
+
+    Returns:
+        NoneType: None if the command fails.
+        str: xml output of the command.
+    """
+    cmd = "gluster volume heal %s info --xml" % volname
+    if info_type:
+        cmd = "gluster volume heal %s info %s --xml" % (volname, info_type)
+    if entries is None:
+        cmd = ("set -o pipefail; %s | sed -e 's|<file [^>]*/>||g' "
+               "-e 's|<file [^>]*>[^<]*</file>||g'" % cmd)
+    elif entries == 'gfids':
+        cmd = ("set -o pipefail; %s | "
+               "sed -e 's|\\(<file [^>]*\\)>[^<]*</file>|\\1/>|g'" % cmd)
+    ret, out, _ = g.run(mnode, cmd, log_level='DEBUG')
+    if ret != 0:
+        g.log.error("Failed to get the heal info %s xml output for the "
+                    "volume %s", info_type, volname)
+        return None
+    return out
+
+
 def get_heal_info(mnode, volname):
     """From the xml output of heal info command get the heal info data.
 
@@ -270,37 +366,152 @@ def get_heal_info(mnode, volname):
         list: list of dictionaries. Each element in the list is the
             heal_info data per brick.
     """
-    cmd = "gluster volume heal %s info --xml" % volname
-    ret, out, _ = g.run(mnode, cmd, log_level='DEBUG')
-    if ret != 0:
+    out = _get_heal_info_xml(mnode, volname)
+    if out is None:
         g.log.error("Failed to get the heal info xml output for the volume %s."
                     "Hence failed to get the heal info summary." % volname)
         return None
 
     try:
-        root = etree.XML(out)
+        return list(parse_heal_info_xml(out))
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster heal info xml output.")
+        return None
+
+
+def get_heal_info_counts(mnode, volname, split_brain=False):
+    """Gets the number of pending (or split-brain) entries of every brick.
+        The pending entries are stripped from the heal info output on the
+        node, hence this is cheap even with millions of pending entries.
+
+    Args:
+        mnode : Node on which commands are executed
+        volname : Name of the volume
+
+    Kwargs:
+        split_brain (bool): count entries in split-brain instead of the
+            entries pending heal. Defaults to False.
+
+    Returns:
+        NoneType: None if parse errors.
+        dict: dict of dictionaries. brick names are the keys of the dict with
+            each key having brick's status and numberOfEntries as int
+            (None when the count is not known. e.g brick is offline).
+            Example:
+                heal_info_counts = {
+                    'ijk.lab.eng.xyz.com:/bricks/brick0': {
+                        'status': 'Connected',
+                        'numberOfEntries': 11
+                        },
+                    'def.lab.eng.xyz.com:/bricks/brick0': {
+                        'status': 'Transport endpoint is not connected',
+                        'numberOfEntries': None
+                        }
+                    }
+    """
+    heal_info_records = get_heal_info_records(mnode, volname, split_brain)
+    if heal_info_records is None:
+        return None
+
+    heal_info_counts = {}
+    for brick in heal_info_records:
+        heal_info_counts[brick.name] = {
+            'status': brick.status,
+            'numberOfEntries': brick.numberOfEntries
+        }
+    return heal_info_counts
+
+
+def get_heal_info_records(mnode, volname, split_brain=False):
+    """Gets the heal info of every brick as typed HealInfoBrick records,
+        i.e name, status and numberOfEntries (int, None when not known).
+        The pending entries are stripped on the node.
+
+    Args:
+        mnode : Node on which commands are executed
+        volname : Name of the volume
+
+    Kwargs:
+        split_brain (bool): count entries in split-brain instead of the
+            entries pending heal. Defaults to False.
+
+    Returns:
+        NoneType: None if parse errors.
+        list: list of HealInfoBrick records.
+    """
+    info_type = 'split-brain' if split_brain else ''
+    out = _get_heal_info_xml(mnode, volname, info_type, entries=None)
+    if out is None:
+        return None
+
+    try:
+        return parse_xml_records(out, "healInfo/bricks/brick",
+                                 HEAL_INFO_BRICK)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster heal info xml output.")
+        return None
+
+
+def _get_heal_info_brick_summary(mnode, volname, split_brain=False):
+    """Gets status and numberOfEntries of every brick from heal info
+        output without collecting the pending entries.
+    """
+    info_type = 'split-brain' if split_brain else ''
+    out = _get_heal_info_xml(mnode, volname, info_type, entries=None)
+    if out is None:
+        g.log.error("Unable to get heal info summary for the volume %s",
+                    volname)
+        return None
+
+    summary = {}
+    try:
+        for brick_info in parse_heal_info_xml(out, entries=None):
+            summary[brick_info['name']] = {
+                'status': brick_info.get('status'),
+                'numberOfEntries': brick_info.get('numberOfEntries')
+            }
     except etree.ParseError:
         g.log.error("Failed to parse the gluster heal info xml output.")
         return None
+    return summary
+
+
+def get_heal_pending_gfids(mnode, volname, split_brain=False):
+    """Gets the set of gfids pending heal (or in split-brain) on every
+        brick. Only the gfids are transferred from the node and kept, the
+        paths of the entries are dropped on the node.
+
+    Args:
+        mnode : Node on which commands are executed
+        volname : Name of the volume
+
+    Kwargs:
+        split_brain (bool): get entries in split-brain instead of the
+            entries pending heal. Defaults to False.
 
-    heal_info_data = []
-    for brick in root.findall("healInfo/bricks/brick"):
-        brick_heal_info = {}
-        brick_files_to_heal = []
-        file_to_heal_exist = False
-        for element in brick.getchildren():
-            if element.tag == "file":
-                file_to_heal_exist = True
-                file_info = {}
-                file_info[element.attrib['gfid']] = element.text
-                brick_files_to_heal.append(file_info)
+    Returns:
+        NoneType: None if parse errors.
+        dict: brick names are the keys of the dict with each key having
+            the set of gfids pending heal on the brick. None instead of the
+            set when the brick is not connected, as the pending entries of
+            the brick are not known.
+    """
+    info_type = 'split-brain' if split_brain else ''
+    out = _get_heal_info_xml(mnode, volname, info_type, entries='gfids')
+    if out is None:
+        return None
 
+    pending_gfids = {}
+    try:
+        for brick_info in parse_heal_info_xml(out, entries='gfids'):
+            if brick_info.get('numberOfEntries') == '-':
+                pending_gfids[brick_info['name']] = None
             else:
-                brick_heal_info[element.tag] = element.text
-        if file_to_heal_exist:
-            brick_heal_info['file'] = brick_files_to_heal
-        heal_info_data.append(brick_heal_info)
-    return heal_info_data
+                pending_gfids[brick_info['name']] = brick_info['gfids']
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster heal info xml output.")
+        return None
+    return pending_gfids
 
 
 def get_heal_info_summary(mnode, volname):
@@ -328,19 +539,7 @@ def get_heal_info_summary(mnode, volname):
                     }
 
     """
-    heal_info_data = get_heal_info(mnode, volname)
-    if heal_info_data is None:
-        g.log.error("Unable to get heal info summary for the volume %s" %
-                    volname)
-        return None
-
-    heal_info_summary_data = {}
-    for info_data in heal_info_data:
-        heal_info_summary_data[info_data['name']] = {
-            'status': info_data['status'],
-            'numberOfEntries': info_data['numberOfEntries']
-        }
-    return heal_info_summary_data
+    return _get_heal_info_brick_summary(mnode, volname)
 
 
 def get_heal_info_split_brain(mnode, volname):
@@ -356,38 +555,18 @@ def get_heal_info_split_brain(mnode, volname):
         list: list of dictionaries. Each element in the list is the
             heal_info_split_brain data per brick.
     """
-    cmd = "gluster volume heal %s info split-brain --xml" % volname
-    ret, out, _ = g.run(mnode, cmd, log_level='DEBUG')
-    if ret != 0:
+    out = _get_heal_info_xml(mnode, volname, 'split-brain')
+    if out is None:
         g.log.error("Failed to get the heal info xml output for the volume %s."
                     "Hence failed to get the heal info summary." % volname)
         return None
 
     try:
-        root = etree.XML(out)
+        return list(parse_heal_info_xml(out))
     except etree.ParseError:
         g.log.error("Failed to parse the gluster heal info xml output.")
         return None
 
-    heal_info_split_brain_data = []
-    for brick in root.findall("healInfo/bricks/brick"):
-        brick_heal_info_split_brain = {}
-        brick_files_in_split_brain = []
-        is_file_in_split_brain = False
-        for element in brick.getchildren():
-            if element.tag == "file":
-                is_file_in_split_brain = True
-                file_info = {}
-                file_info[element.attrib['gfid']] = element.text
-                brick_files_in_split_brain.append(file_info)
-
-            else:
-                brick_heal_info_split_brain[element.tag] = element.text
-        if is_file_in_split_brain:
-            brick_heal_info_split_brain['file'] = brick_files_in_split_brain
-        heal_info_split_brain_data.append(brick_heal_info_split_brain)
-    return heal_info_split_brain_data
-
 
 def get_heal_info_split_brain_summary(mnode, volname):
     """Get heal info split_brain summary i.e Bricks and it's
@@ -414,16 +593,4 @@ def get_heal_info_split_brain_summary(mnode, volname):
                     }
 
     """
-    heal_info_split_brain_data = get_heal_info_split_brain(mnode, volname)
-    if heal_info_split_brain_data is None:
-        g.log.error("Unable to get heal info summary for the volume %s" %
-                    volname)
-        return None
-
-    heal_info_split_brain_summary_data = {}
-    for info_data in heal_info_split_brain_data:
-        heal_info_split_brain_summary_data[info_data['name']] = {
-            'status': info_data['status'],
-            'numberOfEntries': info_data['numberOfEntries']
-        }
-    return heal_info_split_brain_summary_data
+    return _get_heal_info_brick_summary(mnode, volname, split_brain=True)
@@ -30,17 +30,23 @@ class Layout(object):
         """Discover brickdir data and cache in instance for further use"""
         self._brickdirs = []
         for brickdir_path in self._pathinfo['brickdir_paths']:
-            brickdir = BrickDir(brickdir_path)
+            brickdir = BrickDir(brickdir_path,
+                                self._hashranges.get(brickdir_path))
             g.log.debug("%s: %s" % (brickdir.path, brickdir.hashrange))
             self._brickdirs.append(brickdir)
 
-    def __init__(self, pathinfo):
+    def __init__(self, pathinfo, hashranges=None):
         """Init the layout class
 
         Args:
             pathinfo (dict): pathinfo collected from client directory
+
+        Kwargs:
+            hashranges (dict): brickdir path -> (low, high) hash of the
+                brickdirs whose hashrange is already known.
         """
         self._pathinfo = pathinfo
+        self._hashranges = hashranges or {}
         self._get_layout()
         self._zero_hashrange_brickdirs = None
         self._brickdirs = None
@@ -22,6 +22,9 @@
 from glusto.core import Glusto as g
 from glustolibs.gluster.volume_ops import get_volume_info
 from glustolibs.gluster.mount_ops import mount_volume, umount_volume
+from glustolibs.io.utils import (collect_checksums, iter_tree_scan_dump,
+                                 run_tree_scans)
+import os
 import re
 import time
 from collections import OrderedDict
@@ -119,6 +122,9 @@ def search_pattern_in_file(mnode, search_pattern, filename, start_str_to_parse,
 def calculate_checksum(mnode, file_list, chksum_type='sha256sum'):
     """This module calculates given checksum for the given file list
 
+    The list of files is uploaded to the node, so it is not limited by the
+    length of a command line, and the files are hashed in parallel.
+
     Example:
         calculate_checksum("abc.com", [file1, file2])
 
@@ -128,31 +134,23 @@ def calculate_checksum(mnode, file_list, chksum_type='sha256sum'):
             to be calculated
 
     Kwargs:
-        chksum_type (str): type of the checksum algorithm.
-            Defaults to sha256sum
+        chksum_type (str): type of the checksum algorithm (md5sum,
+            sha1sum, sha256sum, ...). Defaults to sha256sum
 
     Returns:
         NoneType: None if command execution fails, parse errors.
         dict: checksum value for each file in the given file list
     """
+    algorithm = chksum_type
+    if algorithm.endswith('sum'):
+        algorithm = algorithm[:-len('sum')]
 
-    cmd = chksum_type + " %s" % ' '.join(file_list)
-    ret = g.run(mnode, cmd)
-    if ret[0] != 0:
-        g.log.error("Failed to execute checksum command in server %s"
-                    % mnode)
+    checksums = collect_checksums({mnode: file_list}, algorithm)
+    if checksums is None:
+        g.log.error("Failed to calculate checksums in server %s" % mnode)
         return None
 
-    checksum_dict = {}
-    for line in ret[1].split('\n')[:-1]:
-        match = re.search(r'^(\S+)\s+(\S+)', line.strip())
-        if match is None:
-            g.log.error("checksum output is not in expected format")
-            return None
-
-        checksum_dict[match.group(2)] = match.group(1)
-
-    return checksum_dict
+    return checksums[mnode]
 
 
 def get_extended_attributes_info(mnode, file_list, encoding='hex',
@@ -250,6 +248,62 @@ def get_pathinfo(mnode, filename, volname):
     return re.findall(r".*?POSIX.*?:(\S+)\>", pathinfo)
 
 
+def get_pathinfo_bulk(mnode, volname, path='', files=None):
+    """Gets the backend locations of the files under a directory of the
+    volume, or of a set of files, from a single pathinfo sweep run on the
+    node instead of one getfattr per file.
+
+    Args:
+        mnode (str): Node on which the volume is mounted for the sweep.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): path relative to the volume root of the directory
+            whose regular files are looked up. Defaults to the volume root.
+        files (list): paths relative to path of the files to look up
+            instead of all the files under path.
+
+    Returns:
+        NoneType: None if the mount or the sweep fails.
+        dict: relative path of every file (relative to path) -> list of
+            its backend locations ('<node>:<brick path>/<file path>'), all
+            the replicas (or fragments) of the file.
+
+    Example:
+        get_pathinfo_bulk(mnode, "testvol", "dir1", ["file1", "dir2/file2"])
+    """
+    mount_point = tempfile.mkdtemp()
+    ret, _, _ = mount_volume(volname, mtype='glusterfs',
+                             mpoint=mount_point,
+                             mserver=mnode,
+                             mclient=mnode)
+    if ret != 0:
+        g.log.error("Failed to do gluster mount on volume %s to fetch"
+                    "pathinfo from server %s"
+                    % (volname, mnode))
+        return None
+
+    scan = [mnode, "pathinfo %s/%s" % (mount_point, path.strip('/'))]
+    if files is not None:
+        scan.append(files)
+    dump = run_tree_scans([tuple(scan)])
+
+    umount_volume(mnode, mount_point)
+    g.run(mnode, "rm -rf " + mount_point)
+
+    if not dump or dump[0] is None:
+        g.log.error("Failed to get path info of the files under %s of "
+                    "volume %s" % (path, volname))
+        return None
+
+    locations = {}
+    for relpath, pathinfo in iter_tree_scan_dump(dump[0]):
+        locations[relpath.decode('utf-8')] = re.findall(
+            r"<POSIX\(.*?\):(.*?)>", pathinfo.decode('utf-8'))
+    os.remove(dump[0])
+    return locations
+
+
 def list_files(mnode, dir_path, parse_str="", user="root"):
     """This module list files from the given file path
 
@@ -778,6 +832,77 @@ def inject_msg_in_logs(nodes, log_msg, list_of_dirs=None, list_of_files=None):
     return _rc
 
 
+def get_core_files(nodes, testrun_timestamp,
+                   paths=['/', '/var/log/core', '/tmp']):
+    """Gets the core files created after testrun_timestamp in the paths on
+    all the nodes. A single find is run on each node covering all the
+    paths, on all the nodes concurrently.
+
+    Args:
+        nodes (str|list): A node|List of nodes on which core files are to
+            be looked for.
+        testrun_timestamp (int|str): epoch time from which the core files
+            are reported. Output of 'date +%s' can be passed as is.
+
+    Kwargs:
+        paths (list): dirs in which core files are looked for.
+            Defaults to "/", "/var/log/core" and "/tmp".
+
+    Returns:
+        list: list of dicts, one per core file, with keys 'node', 'path',
+            'size' (int), 'mtime' (float) and 'binary' (the binary which
+            dumped the core as reported by 'file', None if unknown).
+        NoneType: None if the sweep failed on any of the nodes.
+
+    Example:
+        >>> get_core_files(['abc.com'], '1530000000')
+        [{'node': 'abc.com', 'path': '/core.1234', 'size': 4096,
+          'mtime': 1530000100.5, 'binary': '/usr/sbin/glusterfsd'}]
+    """
+    if isinstance(nodes, str):
+        nodes = [nodes]
+    if isinstance(paths, str):
+        paths = [paths]
+
+    timestamp = int(float(str(testrun_timestamp).strip()))
+    # Paths which don't exist on a node are skipped, any other failure of
+    # find (like an unreadable dir) fails the sweep through pipefail.
+    cmd = ("set -o pipefail; set --; for dir in %s; do "
+           "[ -e \"$dir\" ] && set -- \"$@\" \"$dir\"; done; "
+           "[ $# -eq 0 ] && exit 0; "
+           "find \"$@\" -maxdepth 1 -type f -name 'core*' -newermt @%d "
+           "-printf '%%s %%T@ %%p\\n' | "
+           "while read size mtime path; do "
+           "printf '%%s\\t%%s\\t%%s\\t%%s\\n' \"$size\" \"$mtime\" "
+           "\"$path\" \"$(file -b \"$path\" 2>/dev/null)\"; done"
+           % (' '.join(paths), timestamp))
+    results = g.run_parallel(nodes, cmd)
+
+    core_files = []
+    for node in nodes:
+        ret, out, err = results[node]
+        if ret != 0:
+            g.log.error("Failed to look for core files on node %s: %s",
+                        node, err)
+            return None
+        for line in out.splitlines():
+            fields = line.split('\t')
+            if len(fields) != 4:
+                continue
+            size, mtime, path, file_info = fields
+            if not re.match(r'core(\.|$)', path.rsplit('/', 1)[-1]):
+                continue
+            match = (re.search(r"execfn: '([^']+)'", file_info) or
+                     re.search(r"from '(\S+)", file_info))
+            core_files.append({
+                'node': node,
+                'path': path,
+                'size': int(size),
+                'mtime': float(mtime),
+                'binary': match.group(1).rstrip("'") if match else None})
+    return core_files
+
+
 def is_core_file_created(nodes, testrun_timestamp,
                          paths=['/', '/var/log/core', '/tmp']):
     '''
@@ -799,36 +924,17 @@ def is_core_file_created(nodes, testrun_timestamp,
        If test case need to verify core file in specific path,
        need to pass path from test method
     '''
-    count = 0
-    cmd_list = []
-    for path in paths:
-        cmd = ' '.join(['cd', path, '&&', 'ls', 'core*'])
-        cmd_list.append(cmd)
+    core_files = get_core_files(nodes, testrun_timestamp, paths)
+    if core_files is None:
+        g.log.error("Failed to check for core files on nodes %s", nodes)
+        return False
 
-    # Checks for core file in "/", "/var/log/core", "/tmp" directory
-    for node in nodes:
-        for cmd in cmd_list:
-            ret, out, _ = g.run(node, cmd)
-            g.log.info("storing all files and directory names into list")
-            dir_list = re.split(r'\s+', out)
-
-            # checking for core file created or not in "/"
-            # "/var/log/core", "/tmp" directory
-            g.log.info("checking core file created or not")
-            for file1 in dir_list:
-                if (re.search(r'\bcore\.[\S]+\b', file1)):
-                    file_path_list = re.split(r'[\s]+', cmd)
-                    file_path = file_path_list[1] + '/' + file1
-                    time_cmd = 'stat ' + '-c ' + '%X ' + file_path
-                    ret, file_timestamp, _ = g.run(node, time_cmd)
-                    file_timestamp = file_timestamp.strip()
-                    if(file_timestamp > testrun_timestamp):
-                        count += 1
-                        g.log.error("New core file created %s " % file1)
-                    else:
-                        g.log.info("Old core file Found")
     # return the status of core file
-    if (count >= 1):
+    if core_files:
+        for core_file in core_files:
+            g.log.error("New core file created %s:%s (size: %d, binary: %s)",
+                        core_file['node'], core_file['path'],
+                        core_file['size'], core_file['binary'])
         g.log.error("Core file created glusterd crashed")
         return False
     else:
@@ -0,0 +1,445 @@
+#  Copyright (C) 2018 Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+"""
+    Description: Library for marking and slicing gluster logs on nodes.
+
+    Instead of writing marker messages into every log file, a marker
+    records the size (byte offset) of every log file on every node. The
+    part of the logs written between two markers can then be fetched as
+    compressed byte ranges.
+"""
+
+import os
+import re
+import time
+from multiprocessing.pool import ThreadPool
+from glusto.core import Glusto as g
+
+
+def get_log_files_size_cmd(list_of_dirs=None, list_of_files=None):
+    """Forms the command which prints '<size> <path>' of every '*.log' file
+    under the dirs and of every file in the list of files.
+
+    Args:
+        list_of_dirs (list): List of dirs to look for log files.
+        list_of_files (list): List of log files.
+
+    Returns:
+        str: command to be executed on the node.
+    """
+    cmd = ""
+    if list_of_dirs:
+        cmd += ("find %s -type f -name '*.log' -printf '%%s %%p\\n' "
+                "2>/dev/null; " % ' '.join(list_of_dirs))
+    if list_of_files:
+        cmd += ("stat -c '%%s %%n' %s 2>/dev/null; " %
+                ' '.join(list_of_files))
+    return cmd + "true"
+
+
+def _parse_log_files_size(out):
+    """Parses the output of the command formed by get_log_files_size_cmd.
+
+    Returns:
+        dict: size of each log file keyed by the log file path.
+    """
+    sizes = {}
+    for line in out.splitlines():
+        size, _, path = line.partition(' ')
+        if path and size.isdigit():
+            sizes[path] = int(size)
+    return sizes
+
+
+def get_log_files_size(nodes_log_paths):
+    """Gets the size of all the log files on all the nodes in one parallel
+    round.
+
+    Args:
+        nodes_log_paths (dict): dict with node as key and tuple of
+            (list_of_dirs, list_of_files) as value.
+
+    Returns:
+        dict: node as key and dict of log file path to its size as value.
+            Value is None for the nodes on which the sizes couldn't be
+            fetched.
+    """
+    procs = {}
+    for node, (list_of_dirs, list_of_files) in nodes_log_paths.items():
+        cmd = get_log_files_size_cmd(list_of_dirs, list_of_files)
+        procs[node] = g.run_async(node, cmd)
+
+    sizes = {}
+    for node, proc in procs.items():
+        ret, out, err = proc.async_communicate()
+        if ret != 0:
+            g.log.error("Failed to get size of log files on node %s: %s",
+                        node, err)
+            sizes[node] = None
+        else:
+            sizes[node] = _parse_log_files_size(out)
+    return sizes
+
+
+class LogMarker(object):
+    """Keeps the byte offsets of the log files on the nodes at named
+    points of time (markers).
+
+    Example:
+        marker = LogMarker({'server1': (['/var/log/glusterfs'], []),
+                            'client1': (['/var/log/glusterfs'], [])})
+        marker.mark('start test_1')
+        ...
+        marker.mark('end test_1')
+        ranges = marker.get_ranges('start test_1', 'end test_1')
+    """
+    def __init__(self, nodes_log_paths):
+        """
+        Args:
+            nodes_log_paths (dict): dict with node as key and tuple of
+                (list_of_dirs, list_of_files) to look for log files as
+                value.
+        """
+        self.nodes_log_paths = nodes_log_paths
+        self._markers = {}
+
+    def mark(self, name):
+        """Records the current size of all the log files on all the nodes
+        as the marker 'name'.
+
+        Args:
+            name (str): name of the marker.
+
+        Returns:
+            bool: True if the sizes were recorded from all the nodes,
+                False otherwise.
+        """
+        timestamp = time.time()
+        sizes = get_log_files_size(self.nodes_log_paths)
+        self._markers[name] = {'timestamp': timestamp, 'sizes': sizes}
+        return all(value is not None for value in sizes.values())
+
+    def get_marker(self, name):
+        """Returns the marker recorded with 'name'.
+
+        Returns:
+            dict: dict with 'timestamp' (epoch at which the marker was
+                recorded) and 'sizes' (node -> log file -> size).
+            NoneType: None if no such marker.
+        """
+        return self._markers.get(name)
+
+    def discard(self, *names):
+        """Drops the markers with the given names."""
+        for name in names:
+            self._markers.pop(name, None)
+
+    def get_ranges(self, start_marker, end_marker=None):
+        """Returns the byte ranges of the log files written between the
+        two markers.
+
+        Args:
+            start_marker (str): name of the marker at the start.
+
+        Kwargs:
+            end_marker (str): name of the marker at the end. Current size
+                of the log files is fetched when None.
+
+        Returns:
+            dict: node as key and dict of log file path to (start, end)
+                byte offsets as value. Only the files which grew are
+                listed. Files which were not present or shrunk (rotated)
+                since the start marker are taken from offset 0.
+            NoneType: None if start_marker is not known.
+        """
+        start = self._markers.get(start_marker)
+        if start is None:
+            g.log.error("Log marker '%s' not found", start_marker)
+            return None
+
+        if end_marker is None:
+            end_sizes = get_log_files_size(self.nodes_log_paths)
+        else:
+            end = self._markers.get(end_marker)
+            if end is None:
+                g.log.error("Log marker '%s' not found", end_marker)
+                return None
+            end_sizes = end['sizes']
+
+        ranges = {}
+        for node, sizes in end_sizes.items():
+            if sizes is None:
+                continue
+            start_sizes = start['sizes'].get(node) or {}
+            node_ranges = {}
+            for path, end_offset in sizes.items():
+                start_offset = start_sizes.get(path, 0)
+                if start_offset > end_offset:
+                    start_offset = 0
+                if end_offset > start_offset:
+                    node_ranges[path] = (start_offset, end_offset)
+            ranges[node] = node_ranges
+        return ranges
+
+    def fetch_ranges(self, start_marker, end_marker, dest_dir,
+                     severities=None, log_types=None):
+        """Fetches the log slices written between the two markers from all
+        the nodes as compressed archives into dest_dir.
+
+        Args:
+            start_marker (str): name of the marker at the start.
+            end_marker (str): name of the marker at the end. Current size
+                of the log files is used when None.
+            dest_dir (str): local dir to save the archives. One
+                '<node>.tar.gz' is saved per node.
+
+        Kwargs:
+            severities (str|list): log severities (like 'E', 'W', 'C') to
+                filter the log lines on the node. All lines when None.
+            log_types (str|list): types of logs to be fetched from
+                LOG_TYPES. All the log files when None.
+
+        Returns:
+            list: paths of the archives saved.
+            NoneType: None if the ranges could not be computed.
+        """
+        ranges = self.get_ranges(start_marker, end_marker)
+        if ranges is None:
+            return None
+        return collect_log_slices(ranges, dest_dir, severities=severities,
+                                  log_types=log_types)
+
+
+# Patterns of the log file paths of each type of gluster process.
+LOG_TYPES = {
+    'brick': r'/bricks/[^/]+\.log$',
+    'glusterd': r'/glusterd\.log$',
+    'shd': r'/glustershd\.log$',
+    'rebalance': r'-rebalance\.log$',
+    'client': r'/mnt-[^/]*\.log$',
+    'cli': r'/cli\.log$',
+    'nfs': r'(/nfs\.log|ganesha[^/]*\.log)$',
+    'quota': r'/quotad\.log$',
+    'snapd': r'/snaps/.*\.log$',
+    'bitd': r'/(bitd|scrub)\.log$',
+}
+
+
+def _filter_ranges_by_log_type(node_ranges, log_types):
+    """Returns the ranges of only the log files of the given log types."""
+    if not log_types:
+        return node_ranges
+    if isinstance(log_types, str):
+        log_types = [log_types]
+    patterns = [re.compile(LOG_TYPES[log_type]) for log_type in log_types]
+    return dict([(path, offsets) for path, offsets in node_ranges.items()
+                 if any(pattern.search(path) for pattern in patterns)])
+
+
+def _format_log_time(epoch):
+    """Formats epoch as the timestamp used in gluster logs (UTC)."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+
+
+def get_log_lines_filter_cmd(severities=None, start_time=None,
+                             end_time=None):
+    """Forms the awk command which filters gluster log lines on severity
+    and timestamp. Lines without a timestamp (like backtraces) follow the
+    line they belong to.
+
+    Kwargs:
+        severities (str|list): log severities to be kept, like 'E', 'W',
+            'C'. All severities when None.
+        start_time (float): epoch from which the lines are kept.
+        end_time (float): epoch till which the lines are kept.
+
+    Returns:
+        str: filter command, empty string when nothing is to be filtered.
+    """
+    conditions = []
+    if severities:
+        if isinstance(severities, str):
+            severities = [severities]
+        conditions.append("$3 ~ /^(%s)$/" % '|'.join(severities))
+    if start_time is not None:
+        conditions.append("substr($0, 2, 19) >= \"%s\"" %
+                          _format_log_time(start_time))
+    if end_time is not None:
+        conditions.append("substr($0, 2, 19) <= \"%s\"" %
+                          _format_log_time(end_time))
+    if not conditions:
+        return ""
+
+    return ("awk '/^\\[[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] / "
+            "{keep = (%s)} keep'" %
+            ' && '.join(conditions))
+
+
+def get_log_slices_archive_cmd(node_ranges, line_filter=""):
+    """Forms the command which copies the given byte ranges of the log
+    files into a compressed archive on the node and prints the archive
+    path.
+
+    Args:
+        node_ranges (dict): log file path as key and (start, end) byte
+            offsets as value.
+
+    Kwargs:
+        line_filter (str): command through which the slices are filtered
+            on the node, as formed by get_log_lines_filter_cmd.
+
+    Returns:
+        str: command to be executed on the node.
+    """
+    ranges_list = '\n'.join(["%d %d %s" % (start, end - start, path)
+                             for path, (start, end) in
+                             sorted(node_ranges.items())])
+    if line_filter:
+        line_filter = "| %s " % line_filter
+    return ("slices=$(mktemp -d /tmp/glusto_log_slices.XXXXXX) && "
+            "while read offset length path; do "
+            "mkdir -p \"$slices$(dirname \"$path\")\" && "
+            "tail -c +$((offset + 1)) \"$path\" 2>/dev/null | "
+            "head -c $length %s> \"$slices$path\"; "
+            "[ -s \"$slices$path\" ] || rm -f \"$slices$path\"; "
+            "done <<'EOF'\n%s\nEOF\n"
+            "tar czf $slices.tar.gz -C $slices . && rm -rf $slices && "
+            "echo $slices.tar.gz" % (line_filter, ranges_list))
+
+
+def collect_log_slices(ranges, dest_dir, severities=None, log_types=None,
+                       start_time=None, end_time=None):
+    """Extracts the given byte ranges of the log files on all the nodes,
+    filters and compresses them on the nodes and downloads the archives
+    from all the nodes concurrently.
+
+    Args:
+        ranges (dict): node as key and dict of log file path to (start,
+            end) byte offsets as value. As returned by
+            LogMarker.get_ranges or get_log_files_ranges.
+        dest_dir (str): local dir to save the archives. One
+            '<node>.tar.gz' is saved per node.
+
+    Kwargs:
+        severities (str|list): log severities (like 'E', 'W', 'C') to
+            filter the log lines on the node. All lines when None.
+        log_types (str|list): types of logs to be collected from
+            LOG_TYPES. All the log files when None.
+        start_time (float): epoch from which the log lines are collected.
+        end_time (float): epoch till which the log lines are collected.
+
+    Returns:
+        list: paths of the archives saved.
+    """
+    if not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir)
+
+    line_filter = get_log_lines_filter_cmd(severities, start_time, end_time)
+    procs = {}
+    for node, node_ranges in ranges.items():
+        node_ranges = _filter_ranges_by_log_type(node_ranges, log_types)
+        if node_ranges:
+            procs[node] = g.run_async(
+                node, get_log_slices_archive_cmd(node_ranges, line_filter))
+
+    remote_archives = {}
+    for node, proc in procs.items():
+        ret, out, err = proc.async_communicate()
+        if ret != 0 or not out.strip():
+            g.log.error("Failed to archive log slices on node %s: %s",
+                        node, err)
+            continue
+        remote_archives[node] = out.strip().splitlines()[-1]
+
+    def _download(node):
+        local_archive = os.path.join(dest_dir, "%s.tar.gz" % node)
+        try:
+            g.download(node, remote_archives[node], local_archive)
+        except Exception as err:
+            g.log.error("Failed to download log slices %s from node %s: %s",
+                        remote_archives[node], node, err)
+            local_archive = None
+        g.run(node, "rm -f %s" % remote_archives[node], log_level='DEBUG')
+        return local_archive
+
+    archives = []
+    if remote_archives:
+        pool = ThreadPool(len(remote_archives))
+        try:
+            for local_archive in pool.map(_download, list(remote_archives)):
+                if local_archive is not None:
+                    archives.append(local_archive)
+        finally:
+            pool.close()
+            pool.join()
+
+    g.log.info("Collected log slices from nodes %s in %s",
+               list(remote_archives), dest_dir)
+    return archives
+
+
+def get_log_files_ranges(nodes_log_paths):
+    """Returns the byte ranges covering the whole of all the log files on
+    all the nodes. To be used with collect_log_slices when the logs are
+    to be sliced on timestamps.
+
+    Args:
+        nodes_log_paths (dict): dict with node as key and tuple of
+            (list_of_dirs, list_of_files) as value.
+
+    Returns:
+        dict: node as key and dict of log file path to (0, size) as value.
+    """
+    ranges = {}
+    for node, sizes in get_log_files_size(nodes_log_paths).items():
+        if sizes is not None:
+            ranges[node] = dict([(path, (0, size))
+                                 for path, size in sizes.items() if size])
+    return ranges
+
+
+def collect_logs_by_time(nodes_log_paths, dest_dir, start_time,
+                         end_time=None, severities=None, log_types=None):
+    """Collects the log lines written between start_time and end_time from
+    all the log files on all the nodes.
+
+    The whole log files are read on the nodes, only the matching lines are
+    compressed and transferred.
+
+    Args:
+        nodes_log_paths (dict): dict with node as key and tuple of
+            (list_of_dirs, list_of_files) as value.
+        dest_dir (str): local dir to save the archives.
+        start_time (float): epoch from which the log lines are collected.
+
+    Kwargs:
+        end_time (float): epoch till which the log lines are collected.
+            Defaults to now.
+        severities (str|list): log severities (like 'E', 'W', 'C') to
+            be collected. All lines when None.
+        log_types (str|list): types of logs to be collected from
+            LOG_TYPES. All the log files when None.
+
+    Returns:
+        list: paths of the archives saved.
+    """
+    if end_time is None:
+        end_time = time.time()
+    ranges = get_log_files_ranges(nodes_log_paths)
+    return collect_log_slices(ranges, dest_dir, severities=severities,
+                              log_types=log_types, start_time=start_time,
+                              end_time=end_time)
@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+#  Copyright (C) 2019 Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+    Description: Module for comparing the performance of a volume with
+    different combinations of volume options.
+"""
+
+import itertools
+import math
+import os
+import time
+from glusto.core import Glusto as g
+from glustolibs.gluster.profile_ops import (profile_start, profile_stop,
+                                            get_profile_info_record)
+from glustolibs.gluster.volume_ops import (get_volume_options,
+                                           set_volume_options,
+                                           reset_volume_options_to_baseline)
+from glustolibs.misc.misc_libs import drop_caches, upload_scripts
+
+FIO_DIR = "/usr/share/glustolibs/io/tools/fio"
+FILE_DIR_OPS_SCRIPT = "/usr/share/glustolibs/io/scripts/file_dir_ops.py"
+
+# Two sided 95% quantiles of the Student's t distribution by degrees of
+# freedom. 1.96 (normal distribution) is used beyond 30.
+_T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447,
+         7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228, 11: 2.201, 12: 2.179,
+         13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110, 18: 2.101,
+         19: 2.093, 20: 2.086, 21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064,
+         25: 2.060, 26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042}
+
+
+def expand_option_matrix(option_matrix):
+    """Expands an option matrix to the list of option combinations.
+
+    Args:
+        option_matrix (dict|list): option -> list of values, whose
+            cartesian product is taken. A list of option dicts is returned
+            as is.
+
+    Returns:
+        list: list of option dicts.
+
+    Example:
+        expand_option_matrix({'client.event-threads': [2, 4],
+                              'performance.readdir-ahead': ['on', 'off']})
+        >>>[{'client.event-threads': 2, 'performance.readdir-ahead': 'on'},
+            {'client.event-threads': 2, 'performance.readdir-ahead': 'off'},
+            {'client.event-threads': 4, 'performance.readdir-ahead': 'on'},
+            {'client.event-threads': 4, 'performance.readdir-ahead': 'off'}]
+    """
+    if isinstance(option_matrix, list):
+        return option_matrix
+    options = sorted(option_matrix)
+    return [dict(zip(options, values)) for values in
+            itertools.product(*[option_matrix[option]
+                                for option in options])]
+
+
+def get_workload_cmd(workload, dirname):
+    """Returns the command running the workload in the given directory.
+
+    Args:
+        workload (dict): workload definition, one of
+            {'type': 'fio', 'job_files': [<ini files>]}: fio job files,
+                relative to FIO_DIR unless absolute, run with run_fio.py.
+            {'type': 'file_dir_ops', 'args': <args>}: file_dir_ops.py
+                operation, e.g. 'create_deep_dirs_with_files -d 2 -l 2
+                -n 2 -f 50'.
+            {'type': 'command', 'cmd': <cmd>}: any command, with
+                '%(dirname)s' replaced by the directory.
+        dirname (str): directory in which the workload runs.
+
+    Returns:
+        str: command to be run on the client. None if the workload type is
+            not known.
+    """
+    if workload['type'] == 'fio':
+        # run_fio.py edits the job files, so every run uses its own copy
+        job_files = [os.path.join(FIO_DIR, job_file)
+                     for job_file in workload['job_files']]
+        return ("tmpdir=$(mktemp -d) && cp %s $tmpdir/ && "
+                "python %s/run_fio.py --job-files \"%s\" %s; rc=$?; "
+                "rm -rf $tmpdir; exit $rc"
+                % (' '.join(job_files), FIO_DIR,
+                   ' '.join("$tmpdir/%s" % os.path.basename(job_file)
+                            for job_file in job_files), dirname))
+    if workload['type'] == 'file_dir_ops':
+        return "python %s %s %s" % (workload.get('script',
+                                                 FILE_DIR_OPS_SCRIPT),
+                                    workload['args'], dirname)
+    if workload['type'] == 'command':
+        return workload['cmd'] % {'dirname': dirname}
+    g.log.error("Unknown workload type %s", workload['type'])
+    return None
+
+
+def get_confidence_interval(samples):
+    """Returns the mean and the 95% confidence interval of the mean.
+
+    Args:
+        samples (list): measured values.
+
+    Returns:
+        tuple: (mean, low, high). low and high are the mean when there is
+            a single sample.
+    """
+    count = len(samples)
+    mean = sum(samples) / float(count)
+    if count < 2:
+        return mean, mean, mean
+    stdev = math.sqrt(sum((sample - mean) ** 2 for sample in samples) /
+                      (count - 1))
+    margin = _T_95.get(count - 1, 1.96) * stdev / math.sqrt(count)
+    return mean, mean - margin, mean + margin
+
+
+def _summarize_profile(info):
+    """Returns fop -> {'hits', 'avg_latency'} across the bricks of the
+    interval stats of a profile info record.
+    """
+    summary = {}
+    for brick in info.brick:
+        if brick.intervalStats is None:
+            continue
+        for fop in brick.intervalStats.fopStats or []:
+            if not fop.hits:
+                continue
+            entry = summary.setdefault(fop.name, {'hits': 0,
+                                                  'latency_sum': 0.0})
+            entry['hits'] += fop.hits
+            entry['latency_sum'] += fop.hits * (fop.avgLatency or 0.0)
+    for entry in summary.values():
+        entry['avg_latency'] = entry.pop('latency_sum') / entry['hits']
+    return summary
+
+
+class OptionSweep(object):
+    """Runs a workload from all the mounts of a volume with every
+    combination of an option matrix, repeatedly, and ranks the
+    combinations by the workload run time.
+
+    Every run applies the options (only the ones which differ are set),
+    drops the caches of the servers and clients, runs the workload
+    concurrently from all the mounts in a fresh directory and records
+    its wall clock time and the incremental profile info of the run.
+    The repetitions go round robin over the combinations so that a drift
+    of the cluster over time does not favour any of them. The volume
+    options are brought back to what they were before the sweep at the
+    end.
+
+    Example:
+        sweep = OptionSweep(cls.mnode, cls.volname, cls.mounts,
+                            cls.servers,
+                            {'client.event-threads': [2, 4, 8],
+                             'server.event-threads': [2, 4]},
+                            {'type': 'fio',
+                             'job_files': ['small_files_fio_job.ini']},
+                            repeat=3)
+        results = sweep.run()
+        g.log.info(format_sweep_table(results))
+    """
+    def __init__(self, mnode, volname, mounts, servers, option_matrix,
+                 workload, repeat=3, profile=True):
+        """
+        Args:
+            mnode (str): Node on which the gluster commands are executed.
+            volname (str): Name of the volume.
+            mounts (list): GlusterMount objects of the volume, from which
+                the workload is run.
+            servers (list): servers of the volume, whose caches are
+                dropped before every run.
+            option_matrix (dict|list): see expand_option_matrix.
+            workload (dict): see get_workload_cmd.
+
+        Kwargs:
+            repeat (int): runs per option combination. Defaults to 3.
+            profile (bool): True to capture the profile info of every run.
+                Defaults to True.
+        """
+        self.mnode = mnode
+        self.volname = volname
+        self.mounts = mounts
+        self.servers = servers
+        self.combinations = expand_option_matrix(option_matrix)
+        self.workload = workload
+        self.repeat = repeat
+        self.profile = profile
+        self.runs = []
+
+    def prepare(self):
+        """Uploads the workload scripts to the clients.
+
+        Returns:
+            bool: True on success, False otherwise.
+        """
+        if get_workload_cmd(self.workload, '') is None:
+            return False
+        clients = list(set(mount.client_system for mount in self.mounts))
+        if self.workload['type'] == 'fio':
+            files = [os.path.join(FIO_DIR, 'run_fio.py')]
+            files.extend(os.path.join(FIO_DIR, job_file)
+                         for job_file in self.workload['job_files'])
+            return upload_scripts(clients, files, upload_dir=FIO_DIR)
+        if self.workload['type'] == 'file_dir_ops':
+            script = self.workload.get('script', FILE_DIR_OPS_SCRIPT)
+            return upload_scripts(clients, [script],
+                                  upload_dir=os.path.dirname(script))
+        return True
+
+    def run_once(self, options, tag):
+        """Applies the options and runs the workload once from all the
+        mounts.
+
+        Args:
+            options (dict): volume options of the run.
+            tag (str): name of the directories created by the run.
+
+        Returns:
+            dict: run with 'options', 'elapsed' (seconds), 'profile' (fop ->
+                hits and avg_latency, None if not captured) and 'ret'
+                (False if the workload failed on any mount).
+                None if the options could not be set.
+        """
+        if not set_volume_options(self.mnode, self.volname, options):
+            g.log.error("Failed to set the options %s on volume %s",
+                        options, self.volname)
+            return None
+
+        clients = list(set(mount.client_system for mount in self.mounts))
+        if not drop_caches(list(set(self.servers + clients))):
+            g.log.warning("Failed to drop the caches before the run %s",
+                          tag)
+        if self.profile:
+            # Resets the incremental counters
+            get_profile_info_record(self.mnode, self.volname, 'incremental')
+
+        dirnames = []
+        procs = []
+        start = time.time()
+        for index, mount in enumerate(self.mounts):
+            dirname = "%s/%s_%d" % (mount.mountpoint, tag, index)
+            dirnames.append(dirname)
+            cmd = ("mkdir -p %s && %s" %
+                   (dirname, get_workload_cmd(self.workload, dirname)))
+            procs.append(g.run_async(mount.client_system, cmd))
+        _rc = True
+        for mount, proc in zip(self.mounts, procs):
+            ret, _, err = proc.async_communicate()
+            if ret != 0:
+                g.log.error("Workload failed on %s:%s: %s",
+                            mount.client_system, mount.mountpoint, err)
+                _rc = False
+        elapsed = time.time() - start
+
+        profile = None
+        if self.profile:
+            info = get_profile_info_record(self.mnode, self.volname,
+                                           'incremental')
+            if info is not None:
+                profile = _summarize_profile(info)
+
+        for mount, dirname in zip(self.mounts, dirnames):
+            g.run(mount.client_system, "rm -rf %s" % dirname)
+
+        run = {'options': options, 'elapsed': elapsed, 'profile': profile,
+               'ret': _rc}
+        g.log.info("Run %s with options %s took %.2f seconds", tag,
+                   options, elapsed)
+        return run
+
+    def run(self):
+        """Runs the sweep.
+
+        Returns:
+            list: ranked results as returned by rank_sweep_runs. None if
+                the sweep could not be run.
+        """
+        if not self.prepare():
+            g.log.error("Failed to prepare the workload on the clients")
+            return None
+        baseline = get_volume_options(self.mnode, self.volname, 'all')
+        if self.profile:
+            ret, _, _ = profile_start(self.mnode, self.volname)
+            if ret != 0:
+                g.log.warning("Failed to start profile on volume %s, the "
+                              "runs won't have profile info", self.volname)
+                self.profile = False
+
+        _rc = True
+        try:
+            for rep in range(self.repeat):
+                for index, options in enumerate(self.combinations):
+                    run = self.run_once(options,
+                                        "sweep_%d_%d" % (index, rep))
+                    if run is None:
+                        _rc = False
+                        break
+                    run['combination'] = index
+                    self.runs.append(run)
+                if not _rc:
+                    break
+        finally:
+            if self.profile:
+                profile_stop(self.mnode, self.volname)
+            if baseline is not None:
+                reset_volume_options_to_baseline(self.mnode, self.volname,
+                                                 baseline)
+        if not _rc:
+            return None
+        return rank_sweep_runs(self.runs)
+
+
+def rank_sweep_runs(runs):
+    """Ranks the option combinations of a sweep by their mean run time.
+
+    Args:
+        runs (list): run dicts as returned by OptionSweep.run_once, with
+            the 'combination' index.
+
+    Returns:
+        list: one dict per combination, fastest first, with 'options',
+            'runs', 'failed_runs', 'mean', 'ci_low' and 'ci_high'
+            (95% confidence interval of the mean run time, in seconds) and
+            'profile' (fop -> mean hits and avg_latency over the runs).
+            Combinations all of whose runs failed are last.
+    """
+    by_combination = {}
+    for run in runs:
+        by_combination.setdefault(run['combination'], []).append(run)
+
+    results = []
+    for combination_runs in by_combination.values():
+        elapsed = [run['elapsed'] for run in combination_runs if run['ret']]
+        result = {'options': combination_runs[0]['options'],
+                  'runs': len(elapsed),
+                  'failed_runs': len(combination_runs) - len(elapsed),
+                  'mean': None, 'ci_low': None, 'ci_high': None}
+        if elapsed:
+            (result['mean'], result['ci_low'],
+             result['ci_high']) = get_confidence_interval(elapsed)
+
+        profile = {}
+        profiles = [run['profile'] for run in combination_runs
+                    if run['ret'] and run['profile'] is not None]
+        for run_profile in profiles:
+            for fop, stats in run_profile.items():
+                entry = profile.setdefault(fop, {'hits': 0.0,
+                                                 'avg_latency': 0.0})
+                entry['hits'] += stats['hits'] / float(len(profiles))
+                entry['avg_latency'] += (stats['avg_latency'] /
+                                         float(len(profiles)))
+        result['profile'] = profile
+        results.append(result)
+
+    results.sort(key=lambda result: (result['mean'] is None,
+                                     result['mean']))
+    return results
+
+
+def format_sweep_table(results):
+    """Formats the ranked results of a sweep as a text table.
+
+    Args:
+        results (list): as returned by rank_sweep_runs.
+
+    Returns:
+        str: table with the rank, mean run time, its confidence interval,
+            the number of runs and the options of every combination.
+    """
+    lines = ["%-4s %10s %23s %6s  %s" % ('rank', 'mean(s)', '95% ci(s)',
+                                         'runs', 'options')]
+    for rank, result in enumerate(results, 1):
+        options = ', '.join("%s=%s" % (option, result['options'][option])
+                            for option in sorted(result['options']))
+        if result['mean'] is None:
+            lines.append("%-4d %10s %23s %6s  %s" % (rank, '-', '-',
+                                                     '0', options))
+            continue
+        lines.append("%-4d %10.2f %23s %6d  %s"
+                     % (rank, result['mean'],
+                        "[%.2f, %.2f]" % (result['ci_low'],
+                                          result['ci_high']),
+                        result['runs'], options))
+    return '\n'.join(lines)
@@ -28,6 +28,13 @@ try:
     import xml.etree.cElementTree as etree
 except ImportError:
     import xml.etree.ElementTree as etree
+from glustolibs.gluster.session_config import get_ip_from_hostname
+from glustolibs.gluster.xml_records import parse_xml_records, PEER
+
+
+# Healthy peer connectivity matrices, keyed by the sorted tuple of servers.
+# Dropped whenever peers are probed/detached or glusterd is (re)started.
+_PEER_CONNECTIVITY_CACHE = {}
 
 
 def peer_probe(mnode, server):
@@ -49,6 +56,7 @@ def peer_probe(mnode, server):
             of the command execution.
     """
     cmd = "gluster peer probe %s" % server
+    invalidate_peer_connectivity_cache()
     return g.run(mnode, cmd)
 
 
@@ -77,6 +85,7 @@ def peer_detach(mnode, server, force=False):
         cmd = "gluster peer detach %s force --mode=script" % server
     else:
         cmd = "gluster peer detach %s --mode=script" % server
+    invalidate_peer_connectivity_cache()
     return g.run(mnode, cmd)
 
 
@@ -122,10 +131,15 @@ def pool_list(mnode):
     return g.run(mnode, cmd)
 
 
-def peer_probe_servers(mnode, servers, validate=True, time_delay=10):
+def peer_probe_servers(mnode, servers, validate=True, time_delay=10,
+                       parallel=True):
     """Probe specified servers and validate whether probed servers
     are in cluster and connected state if validate is set to True.
 
+    All the probes are issued concurrently from mnode. Probes which glusterd
+    rejects because another transaction is in progress are retried one at a
+    time.
+
     Args:
         mnode (str): Node on which command has to be executed.
         servers (str|list): A server|List of servers to be peer probed.
@@ -133,8 +147,10 @@ def peer_probe_servers(mnode, servers, validate=True, time_delay=10):
     Kwargs:
         validate (bool): True to validate if probed peer is in cluster and
             connected state. False otherwise. Defaults to True.
-        time_delay (int): time delay before validating peer status.
-            Defaults to 10 seconds.
+        time_delay (int): maximum time to wait for the probed peers to be
+            in cluster and connected state. Defaults to 10 seconds.
+        parallel (bool): True to probe the servers concurrently, False to
+            probe them one after the other. Defaults to True.
 
     Returns:
         bool: True on success and False on failure.
@@ -154,20 +170,39 @@ def peer_probe_servers(mnode, servers, validate=True, time_delay=10):
                     "Failing peer probe.")
         return False
 
-    for server in servers:
-        if server not in nodes_in_pool_list:
-            ret, out, _ = peer_probe(mnode, server)
-            if (ret != 0 or
-                    re.search(r'^peer\sprobe\:\ssuccess(.*)', out) is None):
-                g.log.error("Failed to peer probe the node '%s'.", server)
-                return False
-            else:
-                g.log.info("Successfully peer probed the node '%s'.", server)
+    servers_to_probe = [server for server in servers
+                        if server not in nodes_in_pool_list]
+
+    probe_results = {}
+    if parallel and len(servers_to_probe) > 1:
+        invalidate_peer_connectivity_cache()
+        procs = {}
+        for server in servers_to_probe:
+            procs[server] = g.run_async(mnode, "gluster peer probe %s" %
+                                        server)
+        for server in servers_to_probe:
+            probe_results[server] = procs[server].async_communicate()
+
+    for server in servers_to_probe:
+        if server in probe_results:
+            ret, out, err = probe_results[server]
+            if ret != 0 and is_transient_glusterd_error(out + err):
+                g.log.info("Retrying peer probe of the node '%s' as "
+                           "glusterd is busy.", server)
+                ret, out, err = peer_probe(mnode, server)
+        else:
+            ret, out, err = peer_probe(mnode, server)
+
+        if (ret != 0 or
+                re.search(r'^peer\sprobe\:\ssuccess(.*)', out) is None):
+            g.log.error("Failed to peer probe the node '%s'.", server)
+            return False
+        else:
+            g.log.info("Successfully peer probed the node '%s'.", server)
 
     # Validating whether peer is in connected state after peer probe
     if validate:
-        time.sleep(time_delay)
-        if not is_peer_connected(mnode, servers):
+        if not wait_for_peers_to_connect(mnode, servers, time_delay):
             g.log.error("Validation after peer probe failed.")
             return False
         else:
@@ -176,6 +211,49 @@ def peer_probe_servers(mnode, servers, validate=True, time_delay=10):
     return True
 
 
+def is_transient_glusterd_error(msg):
+    """Checks whether the given command output says glusterd was busy
+    with another transaction, in which case the command can be retried.
+
+    Args:
+        msg (str): stdout/stderr of the gluster command.
+
+    Returns:
+        bool: True if the failure is transient, False otherwise.
+    """
+    return re.search(r'(Another transaction.*in progress|'
+                     r'[Ll]ocking failed|[Ll]ock.*held)', msg) is not None
+
+
+def wait_for_peers_to_connect(mnode, servers, timeout=10):
+    """Waits till the specified servers are in cluster and connected
+    state as seen from mnode.
+
+    Args:
+        mnode (str): Node from which peer status is checked.
+        servers (str|list): A server|List of servers to be validated.
+
+    Kwargs:
+        timeout (int): timeout value in seconds to wait for the servers
+            to be connected. Defaults to 10 seconds.
+
+    Returns:
+        bool: True if all servers are connected within timeout,
+            False otherwise.
+    """
+    start = time.time()
+    while True:
+        if is_peer_connected(mnode, servers):
+            return True
+        if time.time() - start >= timeout:
+            break
+        time.sleep(1)
+
+    g.log.error("Servers %s are not in connected state from node %s even "
+                "after %d seconds", servers, mnode, timeout)
+    return False
+
+
 def peer_detach_servers(mnode, servers, force=False, validate=True,
                         time_delay=10):
     """Detach peers and validate status of peer if validate is set to True.
@@ -281,24 +359,58 @@ def get_peer_status(mnode):
                     "Hence failed to parse the peer status.", mnode)
         return None
 
+    return _parse_peer_status_xml(out)
+
+
+def _parse_peer_status_xml(out, as_dict=True):
+    """Parse the xml output of 'gluster peer status --xml'.
+
+    Args:
+        out (str): xml output of the peer status command.
+
+    Kwargs:
+        as_dict (bool): return dicts of strings instead of Peer records.
+
+    Returns:
+        NoneType: None if parse errors.
+        list: list of peer dicts (or Peer records) on success.
+    """
     try:
-        root = etree.XML(out)
+        return parse_xml_records(out, "peerStatus/peer", PEER, as_dict)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster peer status xml output.")
         return None
 
-    peer_status_list = []
-    for peer in root.findall("peerStatus/peer"):
-        peer_dict = {}
-        for element in peer.getchildren():
-            if element.tag == "hostnames":
-                hostnames_list = []
-                for hostname in element.getchildren():
-                    hostnames_list.append(hostname.text)
-                element.text = hostnames_list
-            peer_dict[element.tag] = element.text
-        peer_status_list.append(peer_dict)
-    return peer_status_list
+
+def get_peer_status_records(mnode, pool_list=False):
+    """Gets the peer status (or pool list) as typed Peer records.
+        'connected' is bool and 'state' is int (see xml_records.PeerState).
+
+    Args:
+        mnode (str): Node on which command has to be executed.
+
+    Kwargs:
+        pool_list (bool): get the records from 'gluster pool list', which
+            includes mnode itself (with hostname 'localhost').
+
+    Returns:
+        NoneType: None if command execution fails or parse errors.
+        list: list of Peer records on success.
+
+    Examples:
+        >>> [peer.hostname for peer in get_peer_status_records('abc.com')
+        ...  if not peer.connected]
+        ['def.lab.eng.xyz.com']
+    """
+    cmd = "gluster peer status --xml"
+    if pool_list:
+        cmd = "gluster pool list --xml"
+    ret, out, _ = g.run(mnode, cmd, log_level='DEBUG')
+    if ret != 0:
+        g.log.error("Failed to execute '%s' on node '%s'.", cmd, mnode)
+        return None
+
+    return _parse_peer_status_xml(out, as_dict=False)
 
 
 def get_pool_list(mnode):
@@ -334,25 +446,15 @@ def get_pool_list(mnode):
         return None
 
     try:
-        root = etree.XML(out)
+        pool_list_list = parse_xml_records(out, "peerStatus/peer", PEER,
+                                           as_dict=True)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster pool list xml output.")
         return None
 
-    pool_list_list = []
-    for peer in root.findall("peerStatus/peer"):
-        peer_dict = {}
-        for element in peer.getchildren():
-            if element.tag == "hostname" and element.text == 'localhost':
-                element.text = mnode
-            if element.tag == "hostnames":
-                hostnames_list = []
-                for hostname in element.getchildren():
-                    hostnames_list.append(hostname.text)
-                element.text = hostnames_list
-            peer_dict[element.tag] = element.text
-
-        pool_list_list.append(peer_dict)
+    for peer_dict in pool_list_list:
+        if peer_dict.get('hostname') == 'localhost':
+            peer_dict['hostname'] = mnode
     return pool_list_list
 
 
@@ -421,3 +523,162 @@ def is_peer_connected(mnode, servers):
     g.log.info("Servers: '%s' are all 'Peer in Cluster' and 'Connected' "
                "state.", servers)
     return True
+
+
+def invalidate_peer_connectivity_cache():
+    """Drops the cached peer connectivity matrices. Has to be called after
+    any operation which can disrupt the peer connectivity like peer
+    probe/detach, glusterd stop/restart or node reboot.
+    """
+    _PEER_CONNECTIVITY_CACHE.clear()
+
+
+def get_peer_connectivity_matrix(servers, use_cache=True):
+    """Fetches 'gluster peer status --xml' from all the servers in one
+    parallel round and builds the node x node peer state matrix.
+
+    Args:
+        servers (str|list): A server|List of servers in the pool.
+
+    Kwargs:
+        use_cache (bool): True to return the matrix cached by an earlier
+            successful validation of the same servers. Defaults to True.
+
+    Returns:
+        NoneType: None if the peer status could not be fetched or parsed
+            from any of the servers.
+        dict: matrix[server][peer] is the peer status dict of 'peer' as seen
+            from 'server' (keys 'uuid', 'hostname', 'hostnames', 'state',
+            'stateStr', 'connected'), None if 'server' doesn't list 'peer'.
+
+    Example:
+        >>> get_peer_connectivity_matrix(['abc.com', 'def.com'])
+        {'abc.com': {'def.com': {'uuid': 'b15b8337-...',
+                                 'hostname': 'def.com',
+                                 'state': '3',
+                                 'hostnames': ['def.com'],
+                                 'connected': '1',
+                                 'stateStr': 'Peer in Cluster'}},
+         'def.com': {'abc.com': {...}}}
+    """
+    if isinstance(servers, str):
+        servers = [servers]
+
+    key = tuple(sorted(servers))
+    if use_cache and key in _PEER_CONNECTIVITY_CACHE:
+        g.log.debug("Using cached peer connectivity matrix of %s", servers)
+        return _PEER_CONNECTIVITY_CACHE[key]
+
+    results = g.run_parallel(servers, "gluster peer status --xml")
+
+    peer_status_lists = {}
+    for server in servers:
+        ret, out, _ = results[server]
+        if ret != 0:
+            g.log.error("Failed to execute peer status command on node "
+                        "'%s'.", server)
+            return None
+        peer_status_lists[server] = _parse_peer_status_xml(out)
+        if peer_status_lists[server] is None:
+            return None
+
+    # Peers are listed by the name/ip they were probed with which need not
+    # be the one in the config. Resolve all the names in one go.
+    names = set(servers)
+    for peer_status_list in peer_status_lists.values():
+        for peer_stat in peer_status_list:
+            names.add(peer_stat['hostname'])
+            if isinstance(peer_stat.get('hostnames'), list):
+                names.update(peer_stat['hostnames'])
+    names = list(names)
+    ip_by_name = {}
+    for name, ip in zip(names, get_ip_from_hostname(names)):
+        ip_by_name[name] = ip if ip is not None else name
+
+    server_by_ip = {}
+    for server in servers:
+        server_by_ip[ip_by_name[server]] = server
+
+    matrix = {}
+    for server in servers:
+        row = dict.fromkeys([peer for peer in servers if peer != server])
+        for peer_stat in peer_status_lists[server]:
+            peer_names = peer_stat.get('hostnames')
+            if not isinstance(peer_names, list):
+                peer_names = []
+            for name in [peer_stat['hostname']] + peer_names:
+                peer = server_by_ip.get(ip_by_name[name])
+                if peer is not None and peer != server:
+                    row[peer] = peer_stat
+                    break
+        matrix[server] = row
+
+    if is_peer_connectivity_matrix_connected(matrix, log_errors=False):
+        _PEER_CONNECTIVITY_CACHE[key] = matrix
+    return matrix
+
+
+def is_peer_connectivity_matrix_connected(matrix, log_errors=True):
+    """Checks whether every node of the matrix sees every other node as
+    'Peer in Cluster' and 'Connected'.
+
+    Args:
+        matrix (dict): peer state matrix as returned by
+            get_peer_connectivity_matrix.
+
+    Kwargs:
+        log_errors (bool): True to log the node pairs which are not
+            connected. Defaults to True.
+
+    Returns:
+        bool: True if all the node pairs are connected, False otherwise.
+    """
+    if not matrix:
+        return False
+
+    _rc = True
+    for server, row in matrix.items():
+        for peer, peer_stat in row.items():
+            if peer_stat is None:
+                if log_errors:
+                    g.log.error("Peer '%s' is not in the pool as seen from "
+                                "node '%s'", peer, server)
+                _rc = False
+            elif (peer_stat.get('stateStr') != "Peer in Cluster" or
+                  peer_stat.get('connected') != '1'):
+                if log_errors:
+                    g.log.error("Peer '%s' is in state '%s' (connected: %s) "
+                                "as seen from node '%s'", peer,
+                                peer_stat.get('stateStr'),
+                                peer_stat.get('connected'), server)
+                _rc = False
+    return _rc
+
+
+def validate_peers_connectivity(servers, use_cache=True):
+    """Validates whether each server in the pool is connected to all the
+    other servers using a single parallel round of peer status.
+
+    Args:
+        servers (str|list): A server|List of servers in the pool.
+
+    Kwargs:
+        use_cache (bool): True to rely on the cached matrix of an earlier
+            successful validation. Defaults to True.
+
+    Returns:
+        bool: True if all the servers are connected with each other,
+            False otherwise.
+    """
+    matrix = get_peer_connectivity_matrix(servers, use_cache=use_cache)
+    if matrix is None:
+        g.log.error("Failed to get the peer connectivity matrix of %s",
+                    servers)
+        return False
+
+    if not is_peer_connectivity_matrix_connected(matrix):
+        return False
+
+    g.log.info("Servers: '%s' are all 'Peer in Cluster' and 'Connected' "
+               "state with each other.", servers)
+    return True
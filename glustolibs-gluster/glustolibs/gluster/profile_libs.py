@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+#  Copyright (C) 2019 Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+    Description: Module for sampling volume profile info over the course
+    of a test and analysing the per brick, per fop statistics.
+"""
+
+import csv
+import json
+import threading
+import time
+from glusto.core import Glusto as g
+from glustolibs.gluster.profile_ops import get_profile_info_record
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Columns of the fop and brick tables of ProfileSampler
+FOP_COLUMNS = ('time', 'sample', 'brick', 'fop', 'hits', 'avg_latency',
+               'min_latency', 'max_latency')
+BRICK_COLUMNS = ('time', 'sample', 'brick', 'duration', 'total_read',
+                 'total_write')
+
+
+def _weighted_percentiles(values, weights, percentiles):
+    """Returns the weighted percentiles of values (numpy arrays)."""
+    order = numpy.argsort(values, kind='mergesort')
+    values = values[order]
+    cumulative = numpy.cumsum(weights[order])
+    total = cumulative[-1]
+    result = {}
+    for pct in percentiles:
+        index = numpy.searchsorted(cumulative, total * pct / 100.0)
+        result['p%s' % pct] = float(values[min(index, len(values) - 1)])
+    return result
+
+
+class ProfileSampler(object):
+    """Samples 'gluster volume profile <volname> info incremental' at a
+    fixed interval in a background thread and stores the per brick, per
+    fop statistics of every interval in columns (numpy arrays when numpy
+    is installed, lists otherwise).
+
+    Profiling has to be started on the volume (profile_start) before the
+    sampler is started. Latencies are in microseconds, as reported by
+    gluster. The analysis methods need numpy, which is installed with the
+    'profile' extra of glustolibs-gluster (glustolibs-gluster[profile]).
+
+    Example:
+        sampler = ProfileSampler(mnode, "testvol", interval=5)
+        with sampler:
+            ... run IO ...
+        sampler.get_fop_summary()
+        sampler.get_latency_percentiles('WRITE', window=60)
+        sampler.export_csv('/tmp/profile_fops.csv')
+    """
+    def __init__(self, mnode, volname, interval=10):
+        """
+        Args:
+            mnode (str): Node on which the profile command is executed.
+            volname (str): Name of the profiled volume.
+
+        Kwargs:
+            interval (int|float): seconds between two samples.
+                Defaults to 10.
+        """
+        self.mnode = mnode
+        self.volname = volname
+        self.interval = interval
+        self.failed_samples = 0
+        self._fops = dict((column, []) for column in FOP_COLUMNS)
+        self._bricks = dict((column, []) for column in BRICK_COLUMNS)
+        self._sample_durations = []
+        self._start_time = None
+        self._stop_time = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Takes a first sample (to reset the incremental counters) and
+        starts sampling in the background.
+
+        Returns:
+            bool: True if the sampler was started, False otherwise.
+        """
+        if self._thread is not None:
+            g.log.error("Profile sampler of volume %s is already running",
+                        self.volname)
+            return False
+        if get_profile_info_record(self.mnode, self.volname,
+                                   'incremental') is None:
+            g.log.error("Unable to start the profile sampler of volume %s",
+                        self.volname)
+            return False
+        self._start_time = time.time()
+        self._stop_time = None
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Stops the background sampling after taking a last sample."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.sample()
+        self._stop_time = time.time()
+
+    def _run(self):
+        next_sample = time.time() + self.interval
+        while not self._stop_event.wait(max(0, next_sample - time.time())):
+            self.sample()
+            next_sample += self.interval
+
+    def sample(self):
+        """Fetches the incremental profile info and appends it to the
+        columns.
+
+        Returns:
+            bool: True on success, False otherwise.
+        """
+        started = time.time()
+        info = get_profile_info_record(self.mnode, self.volname,
+                                       'incremental')
+        if info is None:
+            with self._lock:
+                self.failed_samples += 1
+            return False
+
+        fops = dict((column, []) for column in FOP_COLUMNS)
+        bricks = dict((column, []) for column in BRICK_COLUMNS)
+        with self._lock:
+            index = len(self._sample_durations)
+        for brick in info.brick:
+            stats = brick.intervalStats
+            if stats is None:
+                continue
+            bricks['time'].append(started)
+            bricks['sample'].append(index)
+            bricks['brick'].append(brick.brickName)
+            bricks['duration'].append(stats.duration or 0)
+            bricks['total_read'].append(stats.totalRead or 0)
+            bricks['total_write'].append(stats.totalWrite or 0)
+            for fop in stats.fopStats or []:
+                fops['time'].append(started)
+                fops['sample'].append(index)
+                fops['brick'].append(brick.brickName)
+                fops['fop'].append(fop.name)
+                fops['hits'].append(fop.hits or 0)
+                fops['avg_latency'].append(fop.avgLatency or 0.0)
+                fops['min_latency'].append(fop.minLatency or 0.0)
+                fops['max_latency'].append(fop.maxLatency or 0.0)
+
+        with self._lock:
+            for column in FOP_COLUMNS:
+                self._fops[column].extend(fops[column])
+            for column in BRICK_COLUMNS:
+                self._bricks[column].extend(bricks[column])
+            self._sample_durations.append(time.time() - started)
+        return True
+
+    def get_fop_columns(self):
+        """Returns the per brick, per fop statistics of all the samples.
+
+        Returns:
+            dict: column name (FOP_COLUMNS) -> numpy array (list if numpy
+                is not installed). 'time' is the epoch of the sample.
+        """
+        with self._lock:
+            return self._to_arrays(self._fops)
+
+    def get_brick_columns(self):
+        """Returns the per brick totals (duration of the interval, bytes
+        read and written) of all the samples.
+
+        Returns:
+            dict: column name (BRICK_COLUMNS) -> numpy array (list if numpy
+                is not installed).
+        """
+        with self._lock:
+            return self._to_arrays(self._bricks)
+
+    @staticmethod
+    def _to_arrays(columns):
+        if numpy is None:
+            return dict((name, list(values))
+                        for name, values in columns.items())
+        return dict((name, numpy.array(values))
+                    for name, values in columns.items())
+
+    def _get_numpy_fop_columns(self):
+        if numpy is None:
+            g.log.error("numpy is required for the profile analysis")
+            return None
+        return self.get_fop_columns()
+
+    def get_fop_summary(self):
+        """Aggregates the statistics of every fop across the bricks and
+        the samples.
+
+        Returns:
+            dict: fop -> dict with 'hits', 'avg_latency' (hits weighted),
+                'min_latency' and 'max_latency'. None if numpy is not
+                installed.
+        """
+        cols = self._get_numpy_fop_columns()
+        if cols is None:
+            return None
+
+        summary = {}
+        for fop in numpy.unique(cols['fop']):
+            mask = (cols['fop'] == fop) & (cols['hits'] > 0)
+            hits = cols['hits'][mask]
+            if not hits.size:
+                continue
+            summary[str(fop)] = {
+                'hits': int(hits.sum()),
+                'avg_latency': float(numpy.average(cols['avg_latency'][mask],
+                                                   weights=hits)),
+                'min_latency': float(cols['min_latency'][mask].min()),
+                'max_latency': float(cols['max_latency'][mask].max()),
+            }
+        return summary
+
+    def get_brick_timeseries(self, fop=None):
+        """Returns the statistics of every brick over time.
+
+        Kwargs:
+            fop (str): only this fop is considered. Defaults to all the
+                fops.
+
+        Returns:
+            dict: brick -> dict with 'time' (seconds since the start of
+                the sampler), 'hits' and 'avg_latency' (hits weighted
+                across the fops) arrays, one entry per sample. None if
+                numpy is not installed.
+        """
+        cols = self._get_numpy_fop_columns()
+        if cols is None:
+            return None
+
+        start = self._start_time or 0
+        series = {}
+        for brick in numpy.unique(cols['brick']):
+            mask = cols['brick'] == brick
+            if fop is not None:
+                mask &= cols['fop'] == fop
+            samples, inverse = numpy.unique(cols['sample'][mask],
+                                            return_inverse=True)
+            hits = numpy.bincount(inverse, weights=cols['hits'][mask],
+                                  minlength=len(samples))
+            latency_sum = numpy.bincount(
+                inverse, minlength=len(samples),
+                weights=cols['hits'][mask] * cols['avg_latency'][mask])
+            times = numpy.zeros(len(samples))
+            times[inverse] = cols['time'][mask] - start
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                avg_latency = numpy.where(hits > 0, latency_sum / hits, 0.0)
+            series[str(brick)] = {'time': times, 'hits': hits.astype(int),
+                                  'avg_latency': avg_latency}
+        return series
+
+    def get_latency_percentiles(self, fop=None, percentiles=(50, 90, 99),
+                                window=None):
+        """Returns the percentiles of the fop latency, approximated by the
+        interval average latencies of the bricks weighted by their hits.
+
+        Kwargs:
+            fop (str): only this fop is considered. Defaults to all the
+                fops.
+            percentiles (tuple): percentiles to compute.
+                Defaults to (50, 90, 99).
+            window (int|float): when given, the percentiles are computed
+                for every window of this many seconds since the start of
+                the sampler. Defaults to the whole run.
+
+        Returns:
+            dict: 'p<pct>' -> latency for the whole run, or a list of
+                (window start in seconds, dict) when window is given.
+                None if numpy is not installed.
+        """
+        cols = self._get_numpy_fop_columns()
+        if cols is None:
+            return None
+
+        mask = cols['hits'] > 0
+        if fop is not None:
+            mask &= cols['fop'] == fop
+        values = cols['avg_latency'][mask]
+        weights = cols['hits'][mask]
+        if window is None:
+            if not values.size:
+                return {}
+            return _weighted_percentiles(values, weights, percentiles)
+
+        times = cols['time'][mask] - (self._start_time or 0)
+        buckets = (times // window).astype(int)
+        result = []
+        for bucket in numpy.unique(buckets):
+            in_bucket = buckets == bucket
+            result.append((float(bucket * window),
+                           _weighted_percentiles(values[in_bucket],
+                                                 weights[in_bucket],
+                                                 percentiles)))
+        return result
+
+    def get_overhead(self):
+        """Reports the cost of the sampling.
+
+        Returns:
+            dict: 'samples', 'failed_samples', 'total' and 'mean' / 'max'
+                seconds spent per sample (profile command and parsing) and
+                'fraction' of the sampler run time spent sampling.
+        """
+        with self._lock:
+            durations = list(self._sample_durations)
+        elapsed = (self._stop_time or time.time()) - (self._start_time or 0)
+        total = sum(durations)
+        return {
+            'samples': len(durations),
+            'failed_samples': self.failed_samples,
+            'total': total,
+            'mean': total / len(durations) if durations else 0.0,
+            'max': max(durations) if durations else 0.0,
+            'fraction': (total / elapsed if self._start_time and elapsed
+                         else 0.0),
+        }
+
+    def export_csv(self, path, table='fops'):
+        """Writes the fop (or brick) table to a csv file.
+
+        Args:
+            path (str): path of the csv file.
+
+        Kwargs:
+            table (str): 'fops' or 'bricks'. Defaults to 'fops'.
+        """
+        columns_names = FOP_COLUMNS if table == 'fops' else BRICK_COLUMNS
+        with self._lock:
+            columns = self._fops if table == 'fops' else self._bricks
+            rows = list(zip(*[columns[name] for name in columns_names]))
+        with open(path, 'w') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(columns_names)
+            writer.writerows(rows)
+
+    def export_json(self, path):
+        """Writes both the tables and the sampler overhead to a json file.
+
+        Args:
+            path (str): path of the json file.
+        """
+        with self._lock:
+            data = {
+                'volname': self.volname,
+                'interval': self.interval,
+                'start_time': self._start_time,
+                'fops': dict((name, list(values))
+                             for name, values in self._fops.items()),
+                'bricks': dict((name, list(values))
+                               for name, values in self._bricks.items()),
+            }
+        data['overhead'] = self.get_overhead()
+        with open(path, 'w') as json_file:
+            json.dump(data, json_file)
@@ -20,6 +20,7 @@
 """
 from glusto.core import Glusto as g
 from pprint import pformat
+from glustolibs.gluster.xml_records import parse_xml_records, PROFILE_INFO
 try:
     import xml.etree.cElementTree as etree
 except ImportError:
@@ -129,6 +130,26 @@ def check_profile_options(options):
     return True
 
 
+def _profile_stats_to_dict(stats):
+    """Converts the cumulativeStats/intervalStats dict of a brick to the
+    format returned by get_profile_info. i.e blocks and fops keyed by
+    'block<n>' and 'fop<n>'.
+    """
+    stats_dict = {}
+    for key in ('duration', 'totalRead', 'totalWrite'):
+        if key in stats:
+            stats_dict[key] = stats[key]
+    if 'blockStats' in stats:
+        stats_dict['blockStats'] = dict(
+            ('block' + str(counter), block)
+            for counter, block in enumerate(stats['blockStats'], 1))
+    if 'fopStats' in stats:
+        stats_dict['fopStats'] = dict(
+            ('fop' + str(counter), fop)
+            for counter, fop in enumerate(stats['fopStats']))
+    return stats_dict
+
+
 def get_profile_info(mnode, volname, options=''):
     """Fetches the volume profile information as displayed in the volume
         profile info.
@@ -161,84 +182,76 @@ def get_profile_info(mnode, volname, options=''):
         g.log.error("Profile not running on volume.")
         return None
 
-    # Iterating through the XML and creating dict
-    root = etree.XML(out)
-    volprofileinfo = {}
-    volume = root.find("volProfile")
-    brick_counter = 0
-    for elem in volume.getchildren():
-        if elem.tag == "volname":
-            volname = elem.text
-            volprofileinfo[volname] = {}
-        elif elem.tag == "brick":
-            brick_counter += 1
-            volprofileinfo[volname][elem.tag+str(brick_counter)] = {}
-            brick_dict = volprofileinfo[volname][elem.tag+str(brick_counter)]
-            for brick_tag in elem.getchildren():
-                if 'cumulativeStats' == brick_tag.tag:
-                    brick_dict["cumulativeStats"] = {}
-                    for el in brick_tag.getchildren():
-                        if el.tag == 'duration':
-                            brick_dict["cumulativeStats"][el.tag] = el.text
-                        elif el.tag == 'totalWrite' or el.tag == 'totalRead':
-                            brick_dict["cumulativeStats"][el.tag] = el.text
-                        elif el.tag == 'blockStats':
-                            brick_dict["cumulativeStats"][el.tag] = {}
-                            block_dict = brick_dict["cumulativeStats"][el.tag]
-                            counter = 0
-                            for block in el.getchildren():
-                                counter += 1
-                                block_dict[block.tag+str(counter)] = {}
-                                elm_dict = block_dict[block.tag+str(counter)]
-                                for block_elm in block.getchildren():
-                                    elm_dict[block_elm.tag] = block_elm.text
-                        elif el.tag == 'fopStats':
-                            brick_dict["cumulativeStats"][el.tag] = {}
-                            fop_dict = brick_dict["cumulativeStats"][el.tag]
-                            fop_count = 0
-                            for fops in el.getchildren():
-                                fop_dict['fop'+str(fop_count)] = {}
-                                fop_param = fop_dict['fop'+str(fop_count)]
-                                for fop in fops.getchildren():
-                                    fop_param[fop.tag] = fop.text
-                                fop_count += 1
-                elif 'intervalStats' == brick_tag.tag:
-                    brick_dict["intervalStats"] = {}
-                    for el in brick_tag.getchildren():
-                        if el.tag == 'duration':
-                            brick_dict["intervalStats"][el.tag] = el.text
-                        elif el.tag == 'totalWrite' or el.tag == 'totalRead':
-                            brick_dict["intervalStats"][el.tag] = el.text
-                        elif el.tag == 'blockStats':
-                            brick_dict["intervalStats"][el.tag] = {}
-                            block_dict = brick_dict["intervalStats"][el.tag]
-                            counter = 0
-                            for block in el.getchildren():
-                                counter += 1
-                                block_dict[block.tag+str(counter)] = {}
-                                elm_dict = block_dict[block.tag+str(counter)]
-                                for block_elm in block.getchildren():
-                                    elm_dict[block_elm.tag] = block_elm.text
-                        elif el.tag == 'fopStats':
-                            brick_dict["intervalStats"][el.tag] = {}
-                            fop_dict = brick_dict["intervalStats"][el.tag]
-                            fop_count = 0
-                            for fops in el.getchildren():
-                                fop_dict['fop'+str(fop_count)] = {}
-                                fop_param = fop_dict['fop'+str(fop_count)]
-                                for fop in fops.getchildren():
-                                    fop_param[fop.tag] = fop.text
-                                fop_count += 1
-                else:
-                    brick_dict[brick_tag.tag] = brick_tag.text
-        else:
-            volprofileinfo[elem.tag] = elem.text
+    try:
+        profile_info = parse_xml_records(out, "volProfile", PROFILE_INFO,
+                                         as_dict=True)
+    except etree.ParseError:
+        g.log.error("Failed to parse the volume profile info xml output.")
+        return None
+    if not profile_info:
+        g.log.error("Volume profile info not found in the xml output.")
+        return None
+
+    volprofileinfo = profile_info[0]
+    bricks = volprofileinfo.pop('brick')
+    volname = volprofileinfo.pop('volname', volname)
+    volprofileinfo[volname] = {}
+    for brick_counter, brick in enumerate(bricks, 1):
+        for stats in ('cumulativeStats', 'intervalStats'):
+            if stats in brick:
+                brick[stats] = _profile_stats_to_dict(brick[stats])
+        volprofileinfo[volname]['brick' + str(brick_counter)] = brick
 
     g.log.debug("Volume profile info output: %s"
                 % pformat(volprofileinfo, indent=10))
     return volprofileinfo
 
 
+def get_profile_info_record(mnode, volname, options=''):
+    """Fetches the volume profile information as typed record.
+        Counters and durations are ints and latencies are floats.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): Volume for which profile info has to be retrived.
+
+    Kwargs:
+        options (str): Options can be
+        [peek|incremental [peek]|cumulative|clear].
+
+    Returns:
+        NoneType: If there are errors.
+        ProfileInfo: record with the ProfileBrick records under 'brick'.
+            Each brick has cumulativeStats and/or intervalStats with
+            the lists of block and fop stats under 'blockStats' and
+            'fopStats'.
+
+    Example:
+        >>> info = get_profile_info_record(mnode, "testvol", "incremental")
+        >>> dict((fop.name, fop.hits)
+        ...      for fop in info.brick[0].intervalStats.fopStats)
+        {'WRITE': 1024, 'LOOKUP': 12}
+    """
+    if not check_profile_options(options):
+        return None
+
+    cmd = "gluster volume profile %s info %s --xml" % (volname, options)
+    ret, out, _ = g.run(mnode, cmd, log_level='DEBUG')
+    if ret:
+        g.log.error("Profile not running on volume.")
+        return None
+
+    try:
+        profile_info = parse_xml_records(out, "volProfile", PROFILE_INFO)
+    except etree.ParseError:
+        g.log.error("Failed to parse the volume profile info xml output.")
+        return None
+    if not profile_info:
+        g.log.error("Volume profile info not found in the xml output.")
+        return None
+    return profile_info[0]
+
+
 def profile_info_clear(mnode, volname):
     """Run profile info clear on the specified volume.
 
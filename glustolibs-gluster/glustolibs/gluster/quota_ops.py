@@ -25,6 +25,8 @@ except ImportError:
 
 from glusto.core import Glusto as g
 from glustolibs.gluster.volume_ops import get_volume_options
+from glustolibs.gluster.xml_records import (parse_xml_records, QUOTA_LIMIT,
+                                            QUOTA_OBJECTS_LIMIT)
 
 
 def quota_enable(mnode, volname):
@@ -213,30 +215,23 @@ def quota_fetch_list(mnode, volname, path=None):
         return None
 
     try:
-        root = etree.XML(out)
+        limits = parse_xml_records(out, "volQuota/limit", QUOTA_LIMIT)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster quota list xml output.")
         return None
 
     quotalist = {}
-    for path in root.findall("volQuota/limit"):
-        for elem in path.getchildren():
-            if elem.tag == "path":
-                path = elem.text
-                quotalist[path] = {}
-            elif elem.text == 'N/A':
-                quotalist[path][elem.tag] = elem.text
-            elif elem.tag in ("hard_limit", "soft_limit_value",
-                              "used_space", "avail_space"):
-                quotalist[path][elem.tag] = int(elem.text)
-            elif elem.tag == "soft_limit_percent":
-                quotalist[path][elem.tag] = int(elem.text[:-1])
-            elif elem.tag in ("sl_exceeded", "hl_exceeded"):
-                quotalist[path][elem.tag] = bool(elem.text == 'Yes')
-            else:
-                g.log.error("Failed to parse the gluster quota"
-                            "list xml output.")
-                return None
+    for limit in limits:
+        if limit.extra:
+            g.log.error("Failed to parse the gluster quota"
+                        "list xml output.")
+            return None
+        quotalist[limit.path] = {}
+        for field in limit._fields:
+            value = getattr(limit, field)
+            if field != 'path':
+                quotalist[limit.path][field] = (
+                    'N/A' if value is None else value)
     return quotalist
 
 
@@ -308,22 +303,60 @@ def quota_fetch_list_objects(mnode, volname, path=None):
         return None
 
     try:
-        root = etree.XML(out)
+        limits = parse_xml_records(out, "volQuota/limit",
+                                   QUOTA_OBJECTS_LIMIT, as_dict=True)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster quota list xml output.")
         return None
 
     quotalist = {}
-    for path in root.findall("volQuota/limit"):
-        for elem in path.getchildren():
-            if elem.tag == "path":
-                path = elem.text
-                quotalist[path] = {}
-            else:
-                quotalist[path][elem.tag] = elem.text
+    for limit in limits:
+        quotalist[limit.pop('path')] = limit
     return quotalist
 
 
+def quota_fetch_list_records(mnode, volname, path=None, objects=False):
+    """Gets the quota limits (or object limits) as typed records.
+
+    Args:
+        mnode (str): Node on which command has to be executed.
+        volname (str): volume name
+
+    Kwargs:
+        path (str): Quota path
+        objects (bool): get the limits set by limit-objects.
+
+    Returns:
+        NoneType: None if command execution fails, parse errors.
+        dict: quota path -> QuotaLimit (or QuotaObjectsLimit) record.
+            Values not known ('N/A') are None.
+
+    Examples:
+        >>> limits = quota_fetch_list_records('abc.com', "testvol")
+        >>> limits['/'].used_space < limits['/'].hard_limit
+        True
+    """
+    if not path:
+        path = ''
+
+    subcmd, schema = 'list', QUOTA_LIMIT
+    if objects:
+        subcmd, schema = 'list-objects', QUOTA_OBJECTS_LIMIT
+    cmd = "gluster volume quota %s %s %s --xml" % (volname, subcmd, path)
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'quota %s' on node %s. "
+                    "Hence failed to get the quota list.", subcmd, mnode)
+        return None
+
+    try:
+        limits = parse_xml_records(out, "volQuota/limit", schema)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster quota list xml output.")
+        return None
+    return dict((limit.path, limit) for limit in limits)
+
+
 def quota_set_alert_time(mnode, volname, time):
     """Sets quota alert time
 
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+#  Copyright (C) 2019 Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+    Description: Module for monitoring the progress of rebalance and
+    remove-brick data migration.
+"""
+
+import time
+from glusto.core import Glusto as g
+from glustolibs.gluster.brick_libs import get_all_bricks
+from glustolibs.gluster.rebalance_ops import (get_rebalance_status_record,
+                                              get_remove_brick_status_record)
+from glustolibs.gluster.xml_records import DefragStatus
+
+# Counters of the rebalance status recorded for every node
+REBALANCE_COUNTERS = ('files', 'size', 'lookups', 'failures', 'skipped',
+                      'runtime')
+
+_DONE_STATUSES = (DefragStatus.COMPLETE, DefragStatus.FAILED,
+                  DefragStatus.STOPPED, DefragStatus.LAYOUT_FIX_COMPLETE,
+                  DefragStatus.LAYOUT_FIX_FAILED,
+                  DefragStatus.LAYOUT_FIX_STOPPED)
+
+
+def get_bricks_usage(bricks):
+    """Gets the used space and inodes of the file systems of the bricks.
+
+    Args:
+        bricks (list): bricks in <host>:<path> format.
+
+    Returns:
+        dict: brick -> {'used_bytes': int, 'used_inodes': int}. Bricks
+            whose usage could not be fetched are not in the dict.
+    """
+    paths_by_host = {}
+    for brick in bricks:
+        host, path = brick.split(':', 1)
+        paths_by_host.setdefault(host, []).append(path)
+
+    usage = {}
+    for host, paths in paths_by_host.items():
+        cmd = ("stat -f -c '%%n %%b %%f %%S %%c %%d' %s" % ' '.join(paths))
+        ret, out, _ = g.run(host, cmd, log_level='DEBUG')
+        if ret != 0:
+            g.log.error("Failed to get the usage of the bricks on %s", host)
+        for line in out.splitlines():
+            fields = line.rsplit(None, 5)
+            if len(fields) != 6:
+                continue
+            path, blocks, free, bsize, inodes, free_inodes = fields
+            usage["%s:%s" % (host, path)] = {
+                'used_bytes': (int(blocks) - int(free)) * int(bsize),
+                'used_inodes': int(inodes) - int(free_inodes),
+            }
+    return usage
+
+
+class RebalanceMonitor(object):
+    """Records the per node counters of rebalance (or remove-brick) status
+    as a time series and derives the migration throughput, the estimated
+    time left, and stalled and straggling nodes from them.
+
+    The time left of a node is estimated, like glusterd does, from the
+    number of inodes on its bricks and the rate at which rebalance looks
+    them up. For remove-brick it is estimated from the data left on the
+    bricks being removed and the migration rate.
+
+    Example:
+        monitor = RebalanceMonitor(mnode, volname)
+        ret = monitor.wait(timeout=1800)
+        monitor.get_throughput()
+        >>>{'aggregate': {'files_per_sec': 151.2, 'mb_per_sec': 22.4, ...},
+            'server1': {...}, ...}
+    """
+    def __init__(self, mnode, volname, bricks_list=None, stall_timeout=300,
+                 straggler_ratio=0.5, estimate_eta=True):
+        """
+        Args:
+            mnode (str): Node on which the status commands are executed.
+            volname (str): volume name
+
+        Kwargs:
+            bricks_list (list): bricks being removed. The remove-brick
+                migration is monitored when given, else the rebalance.
+            stall_timeout (int): seconds after which a node in progress
+                whose counters did not change is reported as stalled.
+                Defaults to 300.
+            straggler_ratio (float): a node in progress is reported as a
+                straggler when its rate is below straggler_ratio times the
+                median rate of the nodes. Defaults to 0.5.
+            estimate_eta (bool): False to not fetch the usage of the bricks
+                the time left is estimated from (get_eta then returns None
+                for the nodes in progress). Defaults to True.
+        """
+        self.mnode = mnode
+        self.volname = volname
+        self.bricks_list = bricks_list
+        self.stall_timeout = stall_timeout
+        self.straggler_ratio = straggler_ratio
+        self.estimate_eta = estimate_eta
+        # node -> list of samples (dicts with 'time', 'status' and the
+        # REBALANCE_COUNTERS)
+        self.series = {}
+        self.aggregate = []
+        # node -> inodes (rebalance) or bytes (remove-brick) to process
+        self._remaining = None
+
+    def _node_name(self, name):
+        return self.mnode if name in ('localhost', '127.0.0.1') else name
+
+    def _get_node_bricks(self):
+        bricks = self.bricks_list
+        if bricks is None:
+            bricks = get_all_bricks(self.mnode, self.volname) or []
+        node_bricks = {}
+        for brick in bricks:
+            node_bricks.setdefault(brick.split(':', 1)[0], []).append(brick)
+        return node_bricks
+
+    def _get_remaining(self):
+        """Returns node -> amount left to process, in bytes of the bricks
+        being removed for remove-brick, in inodes for rebalance.
+        """
+        node_bricks = self._get_node_bricks()
+        usage = get_bricks_usage([brick for bricks in node_bricks.values()
+                                  for brick in bricks])
+        key = 'used_bytes' if self.bricks_list else 'used_inodes'
+        remaining = {}
+        for node, bricks in node_bricks.items():
+            if all(brick in usage for brick in bricks):
+                remaining[node] = sum(usage[brick][key] for brick in bricks)
+        return remaining
+
+    def sample(self):
+        """Fetches the status and appends the counters of every node.
+
+        Returns:
+            RebalanceStatus: the status record, None on failure.
+        """
+        if self.bricks_list:
+            status = get_remove_brick_status_record(self.mnode, self.volname,
+                                                    self.bricks_list)
+        else:
+            status = get_rebalance_status_record(self.mnode, self.volname)
+        if status is None:
+            return None
+
+        now = time.time()
+        for node in status.node:
+            entry = {'time': now, 'status': node.status}
+            for counter in REBALANCE_COUNTERS:
+                entry[counter] = getattr(node, counter) or 0
+            self.series.setdefault(self._node_name(node.nodeName),
+                                   []).append(entry)
+        if status.aggregate is not None:
+            entry = {'time': now, 'status': status.aggregate.status}
+            for counter in REBALANCE_COUNTERS:
+                entry[counter] = getattr(status.aggregate, counter) or 0
+            self.aggregate.append(entry)
+
+        # Inodes to crawl (rebalance) are fetched once, the data left on
+        # the removed bricks is fetched with every sample.
+        if self.estimate_eta and (self.bricks_list or
+                                  self._remaining is None):
+            self._remaining = self._get_remaining()
+        return status
+
+    def is_complete(self):
+        """Returns True if the migration is completed on all the nodes."""
+        if not self.series:
+            return False
+        return all(samples[-1]['status'] in (DefragStatus.COMPLETE,
+                                             DefragStatus.LAYOUT_FIX_COMPLETE)
+                   for samples in self.series.values())
+
+    def is_done(self):
+        """Returns True if the migration is no more running on any node
+        (completed, failed or stopped).
+        """
+        if not self.series:
+            return False
+        return all(samples[-1]['status'] in _DONE_STATUSES
+                   for samples in self.series.values())
+
+    def is_failed(self):
+        """Returns True if the migration failed on any node."""
+        return any(samples[-1]['status'] in (DefragStatus.FAILED,
+                                             DefragStatus.LAYOUT_FIX_FAILED)
+                   for samples in self.series.values())
+
+    @staticmethod
+    def _rates(samples):
+        last = samples[-1]
+        runtime = last['runtime']
+        rates = {
+            'files_per_sec': last['files'] / runtime if runtime else 0.0,
+            'mb_per_sec': (last['size'] / 1048576.0 / runtime
+                           if runtime else 0.0),
+            'lookups_per_sec': last['lookups'] / runtime if runtime else 0.0,
+            'recent_files_per_sec': 0.0,
+            'recent_mb_per_sec': 0.0,
+        }
+        if len(samples) > 1:
+            prev = samples[-2]
+            elapsed = last['time'] - prev['time']
+            if elapsed > 0:
+                rates['recent_files_per_sec'] = (
+                    (last['files'] - prev['files']) / elapsed)
+                rates['recent_mb_per_sec'] = (
+                    (last['size'] - prev['size']) / 1048576.0 / elapsed)
+        return rates
+
+    def get_throughput(self):
+        """Returns the migration rates of every node and of the volume.
+
+        Returns:
+            dict: node (and 'aggregate') -> dict with 'files_per_sec',
+                'mb_per_sec' and 'lookups_per_sec' averaged over the run
+                time, and 'recent_files_per_sec' and 'recent_mb_per_sec'
+                between the last two samples.
+        """
+        throughput = {}
+        for node, samples in self.series.items():
+            throughput[node] = self._rates(samples)
+        if self.aggregate:
+            throughput['aggregate'] = self._rates(self.aggregate)
+            # The aggregate runtime is the longest one, so its rate is the
+            # sum of the node rates, not the average
+            for key in ('files_per_sec', 'mb_per_sec', 'lookups_per_sec'):
+                throughput['aggregate'][key] = sum(
+                    throughput[node][key] for node in self.series)
+        return throughput
+
+    def get_eta(self):
+        """Estimates the seconds left for every node in progress.
+
+        Returns:
+            dict: node -> seconds left (0 for nodes done, None if it can't
+                be estimated yet), and 'aggregate' -> seconds left for the
+                slowest node.
+        """
+        remaining = self._remaining or {}
+        eta = {}
+        for node, samples in self.series.items():
+            last = samples[-1]
+            if last['status'] in _DONE_STATUSES:
+                eta[node] = 0
+                continue
+            eta[node] = None
+            rates = self._rates(samples)
+            if node not in remaining:
+                continue
+            if self.bricks_list:
+                rate = (rates['recent_mb_per_sec'] or
+                        rates['mb_per_sec']) * 1048576.0
+                left = remaining[node]
+            else:
+                rate = rates['lookups_per_sec']
+                left = max(0, remaining[node] - last['lookups'])
+            if rate > 0:
+                eta[node] = left / rate
+        known = [value for value in eta.values() if value is not None]
+        eta['aggregate'] = (max(known) if known and
+                            len(known) == len(self.series) else None)
+        return eta
+
+    def get_stalled_nodes(self):
+        """Returns the nodes in progress whose counters have not changed
+        for stall_timeout seconds.
+        """
+        stalled = []
+        for node, samples in self.series.items():
+            last = samples[-1]
+            if last['status'] in _DONE_STATUSES:
+                continue
+            since = last['time']
+            for sample in reversed(samples):
+                if any(sample[counter] != last[counter]
+                       for counter in ('files', 'size', 'lookups')):
+                    break
+                since = sample['time']
+            if last['time'] - since >= self.stall_timeout:
+                stalled.append(node)
+        return sorted(stalled)
+
+    def get_stragglers(self):
+        """Returns the nodes in progress whose crawl rate (lookups/s) is
+        below straggler_ratio times the median rate of all the nodes.
+        """
+        if len(self.series) < 2:
+            return []
+        rates = dict((node, self._rates(samples)['lookups_per_sec'])
+                     for node, samples in self.series.items())
+        ordered = sorted(rates.values())
+        median = ordered[len(ordered) // 2]
+        return sorted(node for node, samples in self.series.items()
+                      if samples[-1]['status'] not in _DONE_STATUSES and
+                      rates[node] < self.straggler_ratio * median)
+
+    def wait(self, timeout=300, interval=10, fail_on_stall=False):
+        """Samples the status till the migration completes.
+
+        Kwargs:
+            timeout (int): seconds to wait for completion.
+                Defaults to 300.
+            interval (int): seconds between samples. Defaults to 10.
+            fail_on_stall (bool): True to give up as soon as a node is
+                stalled. Defaults to False.
+
+        Returns:
+            bool: True if the migration completed on all the nodes,
+                False otherwise.
+        """
+        end = time.time() + timeout
+        reported = set()
+        while True:
+            if self.sample() is None:
+                return False
+            if self.is_failed():
+                g.log.error("Data migration failed on one or more nodes of "
+                            "volume %s", self.volname)
+                return False
+            if self.is_complete():
+                g.log.info("Data migration of volume %s is completed, "
+                           "throughput: %s", self.volname,
+                           self.get_throughput().get('aggregate'))
+                return True
+            if self.is_done():
+                g.log.error("Data migration of volume %s was stopped on "
+                            "one or more nodes", self.volname)
+                return False
+
+            stalled = self.get_stalled_nodes()
+            for node in self.get_stragglers():
+                if node not in reported:
+                    g.log.warning("Node %s is lagging behind in the data "
+                                  "migration of volume %s", node,
+                                  self.volname)
+                    reported.add(node)
+            if stalled:
+                g.log.warning("Data migration of volume %s is stalled on "
+                              "%s", self.volname, stalled)
+                if fail_on_stall:
+                    return False
+            g.log.info("Data migration of volume %s in progress, eta: %s",
+                       self.volname, self.get_eta().get('aggregate'))
+
+            if time.time() + interval > end:
+                break
+            time.sleep(interval)
+        g.log.error("Data migration of volume %s has not completed. Wait "
+                    "timeout.", self.volname)
+        return False
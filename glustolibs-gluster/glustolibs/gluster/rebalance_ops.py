@@ -21,6 +21,8 @@
 
 import time
 from glusto.core import Glusto as g
+from glustolibs.gluster.xml_records import (parse_xml_records,
+                                            REBALANCE_STATUS)
 
 try:
     import xml.etree.cElementTree as etree
@@ -28,6 +30,32 @@ except ImportError:
     import xml.etree.ElementTree as etree
 
 
+def parse_rebalance_status_xml(out, path, as_dict=True):
+    """Parses the rebalance status like xml output of rebalance,
+    remove-brick and detach tier commands.
+
+    Args:
+        out (str): xml output of the command.
+        path (str): path of the status element. e.g 'volRebalance'
+
+    Kwargs:
+        as_dict (bool): return dict of strings instead of RebalanceStatus
+            record.
+
+    Returns:
+        dict|RebalanceStatus: status of the rebalance.
+
+    Raises:
+        etree.ParseError: if the xml output can not be parsed.
+    """
+    status_list = parse_xml_records(out, path, REBALANCE_STATUS, as_dict)
+    if status_list:
+        return status_list[0]
+    if as_dict:
+        return {'node': []}
+    return REBALANCE_STATUS.record_type(node=[])
+
+
 def rebalance_start(mnode, volname, fix_layout=False, force=False):
     """Starts rebalance on the given volume.
 
@@ -172,29 +200,46 @@ def get_rebalance_status(mnode, volname):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_rebalance_status_xml(out, "volRebalance")
     except etree.ParseError:
         g.log.error("Failed to parse the gluster rebalance status "
                     "xml output.")
         return None
 
-    rebal_status = {}
-    rebal_status["node"] = []
-    for info in root.findall("volRebalance"):
-        for element in info.getchildren():
-            if element.tag == "node":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                rebal_status[element.tag].append(status_info)
-            elif element.tag == "aggregate":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                rebal_status[element.tag] = status_info
-            else:
-                rebal_status[element.tag] = element.text
-    return rebal_status
+
+def get_rebalance_status_record(mnode, volname):
+    """Gets the rebalance status of the volume as typed record.
+        Counters are ints, runtime is float and status is one of
+        xml_records.DefragStatus.
+
+    Args:
+        mnode (str): Node on which command has to be executed.
+        volname (str): volume name
+
+    Returns:
+        NoneType: None if command execution fails, parse errors.
+        RebalanceStatus: record with the RebalanceNode records of every
+            node under 'node' and the aggregate under 'aggregate'.
+
+    Examples:
+        >>> status = get_rebalance_status_record('abc.com', 'testvol')
+        >>> sum(node.files for node in status.node)
+        1024
+    """
+    cmd = "gluster volume rebalance %s status --xml" % volname
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'rebalance status' on node %s. "
+                    "Hence failed to get the rebalance status.", mnode)
+        return None
+
+    try:
+        return parse_rebalance_status_xml(out, "volRebalance",
+                                          as_dict=False)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster rebalance status "
+                    "xml output.")
+        return None
 
 
 def rebalance_stop_and_get_status(mnode, volname):
@@ -239,29 +284,11 @@ def rebalance_stop_and_get_status(mnode, volname):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_rebalance_status_xml(out, "volRebalance")
     except etree.ParseError:
         g.log.error("Failed to parse gluster rebalance stop xml output.")
         return None
 
-    rebal_status = {}
-    rebal_status["node"] = []
-    for info in root.findall("volRebalance"):
-        for element in info.getchildren():
-            if element.tag == "node":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                rebal_status[element.tag].append(status_info)
-            elif element.tag == "aggregate":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                rebal_status[element.tag] = status_info
-            else:
-                rebal_status[element.tag] = element.text
-    return rebal_status
-
 
 def wait_for_fix_layout_to_complete(mnode, volname, timeout=300):
     """Waits for the fix-layout to complete
@@ -303,7 +330,9 @@ def wait_for_fix_layout_to_complete(mnode, volname, timeout=300):
 
 
 def wait_for_rebalance_to_complete(mnode, volname, timeout=300):
-    """Waits for the rebalance to complete
+    """Waits for the rebalance to complete, i.e. for the aggregate status
+    to be 'completed'. The throughput and the stalled nodes are logged
+    while waiting (see rebalance_libs.RebalanceMonitor).
 
     Args:
         mnode (str): Node on which command has to be executed.
@@ -319,22 +348,36 @@ def wait_for_rebalance_to_complete(mnode, volname, timeout=300):
     Examples:
         >>> wait_for_rebalance_to_complete("abc.com", "testvol")
     """
+    from glustolibs.gluster.rebalance_libs import RebalanceMonitor
 
+    # The monitor only records the status for the progress logs, without
+    # the brick usage lookups of the time left estimation.
+    monitor = RebalanceMonitor(mnode, volname, estimate_eta=False)
+    reported = set()
     count = 0
     while count < timeout:
-        status_info = get_rebalance_status(mnode, volname)
-        if status_info is None:
+        status_info = monitor.sample()
+        if status_info is None or status_info.aggregate is None:
             return False
 
-        status = status_info['aggregate']['statusStr']
+        status = status_info.aggregate.statusStr
         if status == 'completed':
-            g.log.info("Rebalance is successfully completed")
+            g.log.info("Rebalance is successfully completed, throughput: "
+                       "%s", monitor.get_throughput().get('aggregate'))
             return True
         if status == 'failed':
             g.log.error(" Rebalance failed on one or more nodes."
                         "Check rebalance status for more details")
             return False
 
+        for node in monitor.get_stalled_nodes():
+            if node not in reported:
+                g.log.warning("Rebalance of volume %s is stalled on %s",
+                              volname, node)
+                reported.add(node)
+        g.log.info("Rebalance of volume %s in progress, throughput: %s",
+                   volname, monitor.get_throughput().get('aggregate'))
+
         time.sleep(10)
         count = count + 10
     g.log.error("Rebalance operation has not completed. Wait timeout.")
@@ -378,26 +421,39 @@ def get_remove_brick_status(mnode, volname, bricks_list):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_rebalance_status_xml(out, "volRemoveBrick")
     except etree.ParseError:
         g.log.error("Failed to parse the remove-brick status"
                     "xml output on volume %s", volname)
         return None
 
-    remove_brick_status = {}
-    remove_brick_status["node"] = []
-    for info in root.findall("volRemoveBrick"):
-        for element in info.getchildren():
-            if element.tag == "node":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                remove_brick_status[element.tag].append(status_info)
-            elif element.tag == "aggregate":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                remove_brick_status[element.tag] = status_info
-            else:
-                remove_brick_status[element.tag] = element.text
-    return remove_brick_status
+
+def get_remove_brick_status_record(mnode, volname, bricks_list):
+    """Gets the remove-brick status as typed record.
+        Same as get_rebalance_status_record, but for remove-brick.
+
+    Args:
+        mnode (str): Node on which command has to be executed.
+        volname (str): volume name
+        bricks_list (list): List of bricks participating in
+        remove-brick operation
+
+    Returns:
+        NoneType: None if command execution fails, parse errors.
+        RebalanceStatus: record on success.
+    """
+    cmd = ("gluster volume remove-brick %s %s status --xml" %
+           (volname, ' '.join(bricks_list)))
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'remove-brick status' on node %s",
+                    mnode)
+        return None
+
+    try:
+        return parse_rebalance_status_xml(out, "volRemoveBrick",
+                                          as_dict=False)
+    except etree.ParseError:
+        g.log.error("Failed to parse the remove-brick status"
+                    "xml output on volume %s", volname)
+        return None
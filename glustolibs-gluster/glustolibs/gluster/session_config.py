@@ -0,0 +1,523 @@
+#  Copyright (C) 2018 Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+"""
+    Description: Session wide resolution of the glusto config used by
+        GlusterBaseClass, along with a persistent hostname to IP cache.
+
+    The config is resolved once per test session (and again only if the
+    config itself changes) so that setUpClass of every test class only has
+    to bind the class specific values.
+"""
+
+import copy
+import datetime
+import hashlib
+import json
+import os
+import random
+import socket
+import tempfile
+import time
+from glusto.core import Glusto as g
+from glustolibs.gluster.exceptions import ConfigError
+
+
+# Attributes of SessionConfig which are handed out as deep copies, since
+# tests modify them and they were resolved afresh for every test class.
+_COPIED_ATTRS = ('smb_users_info', 'vips', 'default_volume_type_config',
+                 'volume_options', 'smb_share_options',
+                 'nfs_ganesha_export_options', 'server_gluster_logs_dirs',
+                 'server_gluster_logs_files', 'client_gluster_logs_dirs',
+                 'client_gluster_logs_files')
+
+# Top level config keys which the resolved config is derived from.
+_CONFIG_KEYS = ('servers', 'clients', 'slaves', 'servers_info',
+                'clients_info', 'slaves_info', 'gluster')
+
+_session_config = None
+
+# In memory view of the hostname cache, keyed by config hash.
+_hostname_cache = {}
+
+# Seconds for which a resolved hostname is trusted, unless overridden by
+# 'hostname_cache_ttl' in the gluster section of the config.
+_HOSTNAME_CACHE_TTL = 24 * 60 * 60
+
+
+def get_config_hash():
+    """Returns the hash of the part of g.config the session config is
+    resolved from.
+
+    Returns:
+        str: hex digest of the config.
+    """
+    config_subset = {}
+    for key in _CONFIG_KEYS:
+        config_subset[key] = g.config.get(key)
+    dump = json.dumps(config_subset, sort_keys=True, default=str)
+    return hashlib.sha1(dump.encode('utf-8')).hexdigest()
+
+
+def _get_hostname_cache_file(config_hash):
+    """Returns the path of the on-disk hostname cache for the config hash.
+
+    The cache dir and the seconds for which entries are valid can be set in
+    the config with:
+        gluster:
+            hostname_cache_dir: /var/tmp/glustolibs
+            hostname_cache_ttl: 86400
+    """
+    cache_dir = None
+    if g.config.get('gluster'):
+        cache_dir = g.config['gluster'].get('hostname_cache_dir')
+    if not cache_dir:
+        cache_dir = os.path.join(tempfile.gettempdir(), 'glustolibs')
+    return os.path.join(cache_dir, 'hostname_cache_%s.json' % config_hash)
+
+
+def _get_hostname_cache_ttl():
+    """Returns the seconds for which a cached hostname entry is valid."""
+    ttl = None
+    if g.config.get('gluster'):
+        ttl = g.config['gluster'].get('hostname_cache_ttl')
+    if ttl is None:
+        return _HOSTNAME_CACHE_TTL
+    return int(ttl)
+
+
+def _load_hostname_cache(config_hash):
+    """Loads the hostname cache of the config hash from disk once.
+
+    Entries are [ip, resolved_at] pairs, the expired ones (and the ones in
+    an unknown format) are dropped while loading.
+    """
+    if config_hash in _hostname_cache:
+        return _hostname_cache[config_hash]
+
+    cache = {}
+    cache_file = _get_hostname_cache_file(config_hash)
+    try:
+        with open(cache_file) as cache_fh:
+            cache = json.load(cache_fh)
+    except (IOError, OSError, ValueError):
+        pass
+    if not isinstance(cache, dict):
+        cache = {}
+
+    oldest = time.time() - _get_hostname_cache_ttl()
+    for node, entry in list(cache.items()):
+        if (not isinstance(entry, list) or len(entry) != 2 or
+                not isinstance(entry[1], (int, float)) or
+                entry[1] < oldest):
+            del cache[node]
+    _hostname_cache[config_hash] = cache
+    return cache
+
+
+def _save_hostname_cache(config_hash):
+    """Writes the hostname cache of the config hash to disk."""
+    cache_file = _get_hostname_cache_file(config_hash)
+    tmp_file = "%s.%d" % (cache_file, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        with open(tmp_file, 'w') as cache_fh:
+            json.dump(_hostname_cache[config_hash], cache_fh)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError) as err:
+        g.log.debug("Unable to save hostname cache %s: %s", cache_file, err)
+
+
+def clear_hostname_cache():
+    """Drops the in-memory and the on-disk hostname cache of the current
+    config.
+    """
+    config_hash = get_config_hash()
+    _hostname_cache.pop(config_hash, None)
+    try:
+        os.remove(_get_hostname_cache_file(config_hash))
+    except OSError:
+        pass
+
+
+def get_ip_from_hostname(nodes):
+    """Returns list of IP's for the list of nodes in order.
+
+    Resolved names are cached on disk keyed by the config hash, so DNS is
+    looked up only once per node across test sessions with the same config
+    till the cached entry expires (see _get_hostname_cache_file).
+
+    Args:
+        nodes (str|list): A node hostname|List of nodes hostnames
+
+    Returns:
+        list: List of IP's corresponding to the hostnames of nodes. IP is
+            None for the hostnames which couldn't be resolved.
+    """
+    if isinstance(nodes, str):
+        nodes = [nodes]
+
+    config_hash = get_config_hash()
+    cache = _load_hostname_cache(config_hash)
+    updated = False
+    nodes_ips = []
+    for node in nodes:
+        ip = None
+        if node in cache:
+            ip = cache[node][0]
+        else:
+            try:
+                ip = socket.gethostbyname(node)
+                cache[node] = [ip, time.time()]
+                updated = True
+            except socket.gaierror as e:
+                g.log.error("Failed to get the IP of Host: %s : %s", node,
+                            e.strerror)
+        nodes_ips.append(ip)
+
+    if updated:
+        _save_hostname_cache(config_hash)
+    return nodes_ips
+
+
+class SessionConfig(object):
+    """Values of the glusto config as resolved for GlusterBaseClass.
+
+    The object is frozen once resolved. Values which tests are known to
+    modify (volume, mounts and log configs, volume options etc.) are
+    handed out as deep copies.
+    """
+    def __init__(self, config_hash):
+        self.config_hash = config_hash
+        gluster_config = g.config.get('gluster') or {}
+
+        # Get all servers
+        if 'servers' in g.config and g.config['servers']:
+            self.all_servers = g.config['servers']
+        else:
+            raise ConfigError("'servers' not defined in the global config")
+
+        # Get all slaves
+        self.slaves = None
+        self.slaves_ip = []
+        if 'slaves' in g.config and g.config['slaves']:
+            self.slaves = g.config['slaves']
+            self.slaves_ip = get_ip_from_hostname(self.slaves)
+
+        # Get all clients
+        if 'clients' in g.config and g.config['clients']:
+            self.all_clients = g.config['clients']
+        else:
+            raise ConfigError("'clients' not defined in the global config")
+
+        # Get all servers info
+        if 'servers_info' in g.config and g.config['servers_info']:
+            self.all_servers_info = g.config['servers_info']
+        else:
+            raise ConfigError("'servers_info' not defined in the global "
+                              "config")
+
+        # Get all slaves info
+        self.all_slaves_info = None
+        if 'slaves_info' in g.config and g.config['slaves_info']:
+            self.all_slaves_info = g.config['slaves_info']
+
+        # All clients_info
+        if 'clients_info' in g.config and g.config['clients_info']:
+            self.all_clients_info = g.config['clients_info']
+        else:
+            raise ConfigError("'clients_info' not defined in the global "
+                              "config")
+
+        # Server IP's
+        self.servers_ips = get_ip_from_hostname(self.all_servers)
+
+        # SMB Cluster info
+        try:
+            self._smb_users_info = (
+                gluster_config['cluster_config']['smb']['users_info'])
+        except (KeyError, TypeError):
+            self._smb_users_info = {}
+            self._smb_users_info['root'] = {}
+            self._smb_users_info['root']['password'] = 'foobar'
+            self._smb_users_info['root']['acl'] = 'rwx'
+
+        # NFS-Ganesha Cluster info
+        try:
+            nfs_ganesha_config = (
+                gluster_config['cluster_config']['nfs_ganesha'])
+            self.enable_nfs_ganesha = bool(nfs_ganesha_config['enable'])
+            self.num_of_nfs_ganesha_nodes = (
+                nfs_ganesha_config['num_of_nfs_ganesha_nodes'])
+            self._vips = nfs_ganesha_config['vips']
+        except (KeyError, TypeError):
+            self.enable_nfs_ganesha = False
+            self.num_of_nfs_ganesha_nodes = None
+            self._vips = []
+
+        # Defining default volume_types configuration.
+        self._default_volume_type_config = {
+            'replicated': {
+                'type': 'replicated',
+                'replica_count': 3,
+                'transport': 'tcp'
+                },
+            'dispersed': {
+                'type': 'dispersed',
+                'disperse_count': 6,
+                'redundancy_count': 2,
+                'transport': 'tcp'
+                },
+            'distributed': {
+                'type': 'distributed',
+                'dist_count': 4,
+                'transport': 'tcp'
+                },
+            'distributed-replicated': {
+                'type': 'distributed-replicated',
+                'dist_count': 2,
+                'replica_count': 3,
+                'transport': 'tcp'
+                },
+            'distributed-dispersed': {
+                'type': 'distributed-dispersed',
+                'dist_count': 2,
+                'disperse_count': 6,
+                'redundancy_count': 2,
+                'transport': 'tcp'
+                }
+            }
+
+        # Check if default volume_type configuration is provided in
+        # config yml
+        self._volume_types_from_config = (
+            gluster_config.get('volume_types') or {})
+        if self._volume_types_from_config:
+            default_volume_type_from_config = self._volume_types_from_config
+
+            for volume_type in default_volume_type_from_config.keys():
+                if default_volume_type_from_config[volume_type]:
+                    if volume_type in self._default_volume_type_config:
+                        self._default_volume_type_config[volume_type] = (
+                            default_volume_type_from_config[volume_type])
+
+        # Create Volume with force option
+        self.volume_create_force = False
+        if gluster_config.get('volume_create_force'):
+            self.volume_create_force = gluster_config['volume_create_force']
+
+        # Default volume options which is applicable for all the volumes
+        self._volume_options = gluster_config.get('volume_options') or {}
+
+        # If the volume is exported as SMB Share, then set the following
+        # volume options on the share.
+        self._smb_share_options = (
+            gluster_config.get('smb_share_options') or {})
+
+        # If the volume is exported as NFS-Ganesha export,
+        # then set the following volume options on the export.
+        self._nfs_ganesha_export_options = (
+            gluster_config.get('nfs_ganesha_export_options') or {})
+
+        # Gluster Logs info
+        self._server_gluster_logs_dirs = ["/var/log/glusterfs",
+                                          "/var/log/samba"]
+        self._server_gluster_logs_files = ["/var/log/ganesha.log",
+                                           "/var/log/ganesha-gfapi.log"]
+        server_gluster_logs_info = (
+            gluster_config.get('server_gluster_logs_info') or {})
+        if server_gluster_logs_info.get('dirs'):
+            self._server_gluster_logs_dirs = server_gluster_logs_info['dirs']
+        if server_gluster_logs_info.get('files'):
+            self._server_gluster_logs_files = (
+                server_gluster_logs_info['files'])
+
+        self._client_gluster_logs_dirs = ["/var/log/glusterfs"]
+        self._client_gluster_logs_files = []
+        client_gluster_logs_info = (
+            gluster_config.get('client_gluster_logs_info') or {})
+        if client_gluster_logs_info.get('dirs'):
+            self._client_gluster_logs_dirs = client_gluster_logs_info['dirs']
+        if client_gluster_logs_info.get('files'):
+            self._client_gluster_logs_files = (
+                client_gluster_logs_info['files'])
+
+        # Whether to write marker messages into the gluster logs in addition
+        # to recording the log offsets, and where to save the log slices of
+        # failed tests.
+        self.inject_log_messages = bool(
+            gluster_config.get('inject_msg_in_gluster_logs'))
+        self.failed_test_logs_dir = gluster_config.get('failed_test_logs_dir')
+        self.failed_test_logs_severities = gluster_config.get(
+            'failed_test_logs_severities')
+
+        # Have a unique string to recognize the test run for logging in
+        # gluster logs
+        if 'glustotest_run_id' not in g.config:
+            g.config['glustotest_run_id'] = (
+                datetime.datetime.now().strftime('%H_%M_%d_%m_%Y'))
+        self.glustotest_run_id = g.config['glustotest_run_id']
+
+        # Volume configs from the config file indexed by volume type
+        self._volumes_by_type = {}
+        for volume in gluster_config.get('volumes') or []:
+            self._volumes_by_type.setdefault(volume['voltype']['type'],
+                                             volume)
+        self._mounts = gluster_config.get('mounts') or []
+
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("SessionConfig is frozen, unable to set "
+                                 "'%s'" % name)
+        object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        # Only called for the attributes not found the regular way.
+        if name in _COPIED_ATTRS:
+            return copy.deepcopy(object.__getattribute__(self, '_' + name))
+        raise AttributeError("'SessionConfig' object has no attribute "
+                             "'%s'" % name)
+
+    def get_volume_config(self, volume_type):
+        """Returns the volume config for the volume type.
+
+        Args:
+            volume_type (str): type of the volume.
+
+        Returns:
+            dict: copy of the volume config with 'name', 'voltype',
+                'servers' and 'options' set.
+
+        Raises:
+            ConfigError: if no config is available for the volume type.
+        """
+        volume = {}
+        if volume_type in self._volumes_by_type:
+            volume = copy.deepcopy(self._volumes_by_type[volume_type])
+            if 'name' not in volume:
+                volume['name'] = 'testvol_%s' % volume_type
+
+            if 'servers' not in volume:
+                volume['servers'] = self.all_servers
+        else:
+            try:
+                if self._volume_types_from_config.get(volume_type):
+                    volume['voltype'] = copy.deepcopy(
+                        self._volume_types_from_config[volume_type])
+                else:
+                    volume['voltype'] = copy.deepcopy(
+                        self._default_volume_type_config[volume_type])
+            except KeyError:
+                raise ConfigError("Unable to get configs of volume "
+                                  "type: %s", volume_type)
+            volume['name'] = 'testvol_%s' % volume_type
+            volume['servers'] = self.all_servers
+
+        # Set volume options
+        if 'options' not in volume:
+            volume['options'] = self.volume_options
+        return volume
+
+    def get_mounts_dict_list(self, mount_type, volname, mnode):
+        """Returns the list of mount dicts for the mount type and volume.
+
+        Args:
+            mount_type (str): mount protocol.
+            volname (str): name of the volume to be mounted.
+            mnode (str): server from which the volume is mounted when the
+                mount config doesn't have one.
+
+        Returns:
+            list: list of mount dicts which can be passed to
+                create_mount_objs.
+        """
+        mounts_dict_list = []
+        default_mountpoint = os.path.join("/mnt",
+                                          '_'.join([volname, mount_type]))
+        for mount in self._mounts:
+            if mount['protocol'] != mount_type:
+                continue
+            temp_mount = {}
+            temp_mount['protocol'] = mount_type
+            if 'volname' in mount and mount['volname']:
+                if mount['volname'] == volname:
+                    temp_mount = copy.deepcopy(mount)
+                else:
+                    continue
+            else:
+                temp_mount['volname'] = volname
+            if 'server' not in mount or (not mount['server']):
+                temp_mount['server'] = mnode
+            else:
+                temp_mount['server'] = mount['server']
+            if 'mountpoint' not in mount or (not mount['mountpoint']):
+                temp_mount['mountpoint'] = default_mountpoint
+            else:
+                temp_mount['mountpoint'] = mount['mountpoint']
+            if 'client' not in mount or (not mount['client']):
+                temp_mount['client'] = (
+                    self.all_clients_info[
+                        random.choice(list(self.all_clients_info.keys()))])
+            else:
+                temp_mount['client'] = mount['client']
+            if 'options' in mount and mount['options']:
+                temp_mount['options'] = mount['options']
+            else:
+                temp_mount['options'] = ''
+            mounts_dict_list.append(temp_mount)
+
+        if not mounts_dict_list:
+            for client in self.all_clients_info.keys():
+                mount = {
+                    'protocol': mount_type,
+                    'server': mnode,
+                    'volname': volname,
+                    'client': self.all_clients_info[client],
+                    'mountpoint': default_mountpoint,
+                    'options': ''
+                    }
+                mounts_dict_list.append(mount)
+
+        if mount_type == 'cifs' or mount_type == 'smb':
+            for mount in mounts_dict_list:
+                if 'smbuser' not in mount:
+                    mount['smbuser'] = random.choice(
+                        list(self._smb_users_info.keys()))
+                    mount['smbpasswd'] = (
+                        self._smb_users_info[mount['smbuser']]['password'])
+        return mounts_dict_list
+
+
+def get_session_config():
+    """Returns the config resolved for the test session. The config is
+    resolved again only when g.config has changed.
+
+    Returns:
+        SessionConfig: resolved session config.
+
+    Raises:
+        ConfigError: if the mandatory keys are missing in the config.
+    """
+    global _session_config
+    config_hash = get_config_hash()
+    if _session_config is None or _session_config.config_hash != config_hash:
+        g.log.debug("Resolving session config for config hash %s",
+                    config_hash)
+        _session_config = SessionConfig(config_hash)
+    return _session_config
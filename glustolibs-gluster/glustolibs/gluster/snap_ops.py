@@ -19,8 +19,18 @@
     Description: Library for gluster snapshot operations.
 """
 
+import copy
+import random
+import re
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 from glusto.core import Glusto as g
+from glustolibs.gluster.peer_ops import is_transient_glusterd_error
 from glustolibs.gluster.volume_ops import volume_start, volume_stop
+from glustolibs.gluster.xml_records import (parse_xml_records, to_str,
+                                            SNAP_STATUS, SNAP_INFO,
+                                            SNAP_VOLUME_INFO, SNAP_CONFIG)
 
 try:
     import xml.etree.cElementTree as etree
@@ -28,6 +38,220 @@ except ImportError:
     import xml.etree.ElementTree as etree
 
 
+class SnapCatalog(object):
+    """Catalog of the snapshot info, indexed by snapshot name, volume and
+    uuid. It is filled by the snapshot info lookups and kept up to date by
+    the snapshot operations of this module, so that lookups of a snapshot
+    or of the snapshots of a volume do not need to list all the snapshots.
+    The operations whose effect glusterd decides (snapshot status, auto
+    delete on create) drop the affected info instead of updating it.
+
+    Snapshots created or deleted without this module (snapshot scheduler,
+    auto-delete, raw cli), and glusterd restarts, are not known to the
+    catalog. The lookups therefore ask glusterd unless called with
+    use_cache=True, and only refill the catalog.
+    """
+    def __init__(self):
+        # snapname -> snapshot info dict, as returned by get_snap_info
+        self.by_name = {}
+        # uuid -> snapname
+        self.by_uuid = {}
+        # volname -> list of snapnames, in the order of creation. Snapshots
+        # activated or deactivated by this module stay listed here after
+        # their info is dropped, till it is fetched again.
+        self.by_volume = {}
+        # volname -> originVolume dict, for volumes all of whose snapshots
+        # are known. Shared by the info of all the snapshots of the volume.
+        self.origin_volumes = {}
+
+    def add(self, snap_info):
+        """Adds (or replaces) the info of a snapshot."""
+        snapname = snap_info['name']
+        origin = snap_info.get('snapVolume', {}).get('originVolume', {})
+        volname = origin.get('name')
+        self.by_name[snapname] = snap_info
+        self.by_uuid[snap_info.get('uuid')] = snapname
+        snapnames = self.by_volume.setdefault(volname, [])
+        if snapname not in snapnames:
+            snapnames.append(snapname)
+        if volname in self.origin_volumes:
+            snap_info['snapVolume']['originVolume'] = (
+                self.origin_volumes[volname])
+
+    def load(self, snap_info_list):
+        """Replaces the catalog with the info of all the snapshots."""
+        self.__init__()
+        for snap_info in snap_info_list:
+            self.add(copy.deepcopy(snap_info))
+        for snapname in self.by_name:
+            self._share_origin_volume(self.by_name[snapname])
+
+    def load_volume(self, volname, snap_vol_info):
+        """Replaces the snapshots of the volume with the snapshots in the
+        output of get_snap_info_by_volname.
+        """
+        for snapname in list(self.by_volume.get(volname, [])):
+            self.remove(snapname)
+        self.by_volume[volname] = []
+        self.origin_volumes[volname] = copy.deepcopy(
+            snap_vol_info.get('originVolume', {'name': volname}))
+        for snap_info in snap_vol_info.get('snapshots', []):
+            self.add(copy.deepcopy(snap_info))
+
+    def _share_origin_volume(self, snap_info):
+        origin = snap_info.get('snapVolume', {}).get('originVolume')
+        if origin is None or origin.get('name') is None:
+            return
+        snap_info['snapVolume']['originVolume'] = (
+            self.origin_volumes.setdefault(origin['name'], origin))
+
+    def remove(self, snapname):
+        """Removes the snapshot from the catalog.
+
+        Returns:
+            str: name of the volume of the snapshot. None if not known.
+        """
+        snap_info = self.by_name.pop(snapname, None)
+        if snap_info is not None:
+            self.by_uuid.pop(snap_info.get('uuid'), None)
+        for volname, snapnames in self.by_volume.items():
+            if snapname in snapnames:
+                snapnames.remove(snapname)
+                return volname
+        return None
+
+    def get(self, snapname):
+        """Returns a copy of the info of the snapshot, None if not known."""
+        snap_info = self.by_name.get(snapname)
+        if snap_info is None:
+            return None
+        return copy.deepcopy(snap_info)
+
+    def get_by_uuid(self, uuid):
+        """Returns a copy of the info of the snapshot with the uuid."""
+        return self.get(self.by_uuid.get(uuid))
+
+    def get_volume(self, volname):
+        """Returns the info of the snapshots of the volume in the format of
+        get_snap_info_by_volname. None if the snapshots of the volume are
+        not all known.
+        """
+        if volname not in self.origin_volumes:
+            return None
+        snapnames = self.by_volume.get(volname, [])
+        if any(snapname not in self.by_name for snapname in snapnames):
+            return None
+        return {
+            'originVolume': copy.deepcopy(self.origin_volumes[volname]),
+            'count': str(len(snapnames)),
+            'snapshots': [self.get(snapname) for snapname in snapnames]
+        }
+
+    def _update_snap_count(self, volname, delta):
+        origin = self.origin_volumes.get(volname)
+        if origin is None:
+            return
+        try:
+            origin['snapCount'] = str(int(origin['snapCount']) + delta)
+            origin['snapRemaining'] = str(int(origin['snapRemaining']) -
+                                          delta)
+        except (KeyError, TypeError, ValueError):
+            self.origin_volumes.pop(volname)
+
+    def snapshot_created(self, volname):
+        """Records a snapshot created on the volume. Older snapshots of the
+        volume may have been auto-deleted to make room for it, so the
+        snapshots of the volume are dropped and looked up again.
+        """
+        for snapname in list(self.by_volume.get(volname, [])):
+            self.remove(snapname)
+        self.by_volume.pop(volname, None)
+        self.origin_volumes.pop(volname, None)
+
+    def snapshot_deleted(self, snapname):
+        """Records a deleted (or restored) snapshot."""
+        volname = self.remove(snapname)
+        if volname is not None:
+            self._update_snap_count(volname, -1)
+        else:
+            # Snapshot of a volume not in the catalog, which may still be
+            # counted in the origin volume of the loaded volumes.
+            self.origin_volumes.clear()
+
+    def volume_snapshots_deleted(self, volname):
+        """Records the deletion of all the snapshots of the volume."""
+        snapnames = list(self.by_volume.get(volname, []))
+        for snapname in snapnames:
+            self.remove(snapname)
+        if volname in self.origin_volumes:
+            self._update_snap_count(volname, -len(snapnames))
+
+    def snapshot_status_changed(self, snapname):
+        """Records an activated (or deactivated) snapshot. Its info is
+        dropped, so that the status is looked up from glusterd again.
+        """
+        snap_info = self.by_name.pop(snapname, None)
+        if snap_info is not None:
+            self.by_uuid.pop(snap_info.get('uuid'), None)
+
+
+_snap_catalogs = {}
+# Serializes the catalog updates of concurrent snapshot operations
+_snap_catalog_lock = threading.Lock()
+
+
+def get_snap_catalog(mnode):
+    """Returns the snapshot catalog of the cluster of mnode.
+
+    Args:
+        mnode (str): Node on which snapshot commands are executed.
+
+    Returns:
+        SnapCatalog: catalog of the snapshots looked up through mnode.
+    """
+    if mnode not in _snap_catalogs:
+        _snap_catalogs[mnode] = SnapCatalog()
+    return _snap_catalogs[mnode]
+
+
+def invalidate_snap_catalog(mnode=None):
+    """Drops the snapshot catalog of mnode (of all the nodes if None).
+    To be used after snapshots are created or deleted without this module,
+    and after glusterd restarts.
+
+    Kwargs:
+        mnode (str): Node whose catalog is to be dropped.
+    """
+    if mnode is None:
+        _snap_catalogs.clear()
+    else:
+        _snap_catalogs.pop(mnode, None)
+
+
+def _get_snap_catalog_for_update(mnode):
+    """Returns the catalog of mnode to record a snapshot operation done
+    through mnode. Catalogs of other nodes, which may be of the same
+    cluster, are dropped.
+    """
+    for node in list(_snap_catalogs):
+        if node != mnode:
+            _snap_catalogs.pop(node)
+    return get_snap_catalog(mnode)
+
+
+def _record_snap_op(mnode, update, *args):
+    """Applies a snapshot operation done through mnode to its catalog.
+
+    Args:
+        mnode (str): Node on which the operation was executed.
+        update (str): name of the SnapCatalog method recording the
+            operation.
+        *args: arguments of the SnapCatalog method.
+    """
+    with _snap_catalog_lock:
+        getattr(_get_snap_catalog_for_update(mnode), update)(*args)
+
+
 def snap_create(mnode, volname, snapname, timestamp=False,
                 description='', force=False):
     """Creates snapshot for the given volume.
@@ -75,7 +299,10 @@ def snap_create(mnode, volname, snapname, timestamp=False,
 
     cmd = ("gluster snapshot create %s %s %s %s %s"
            % (snapname, volname, tstamp, description, frce))
-    return g.run(mnode, cmd)
+    ret, out, err = g.run(mnode, cmd)
+    if ret == 0:
+        _record_snap_op(mnode, 'snapshot_created', volname)
+    return ret, out, err
 
 
 def snap_clone(mnode, snapname, clonename):
@@ -129,7 +356,11 @@ def snap_restore(mnode, snapname):
     """
 
     cmd = "gluster snapshot restore %s --mode=script" % snapname
-    return g.run(mnode, cmd)
+    ret, out, err = g.run(mnode, cmd)
+    if ret == 0:
+        # Restored snapshot is removed
+        _record_snap_op(mnode, 'snapshot_deleted', snapname)
+    return ret, out, err
 
 
 def snap_restore_complete(mnode, volname, snapname):
@@ -238,34 +469,13 @@ def get_snap_status(mnode):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_xml_records(out, "snapStatus/snapshots/snapshot",
+                                 SNAP_STATUS, as_dict=True)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster snapshot "
                     "status xml output.")
         return None
 
-    snap_status_list = []
-    for snap in root.findall("snapStatus/snapshots/snapshot"):
-        snap_status = {}
-        for element in snap.getchildren():
-            if element.tag == "volume":
-                status = {}
-                status["brick"] = []
-                for elmt in element.getchildren():
-                    if elmt.tag == "brick":
-                        brick_info = {}
-                        for el in elmt.getchildren():
-                            brick_info[el.tag] = el.text
-                        status["brick"].append(brick_info)
-                    else:
-                        status[elmt.tag] = elmt.text
-
-                snap_status[element.tag] = status
-            else:
-                snap_status[element.tag] = element.text
-        snap_status_list.append(snap_status)
-    return snap_status_list
-
 
 def get_snap_status_by_snapname(mnode, snapname):
     """Parse the output of 'gluster snapshot status' command
@@ -290,16 +500,27 @@ def get_snap_status_by_snapname(mnode, snapname):
         '56a39a92-c339-47cc-a8b2-9e54bb2a6324'}
     """
 
-    snap_status_list = get_snap_status(mnode)
-    if not snap_status_list:
-        g.log.error("Failed to parse snap status in "
-                    "get_snap_status_by_snapname()")
+    cmd = "gluster snapshot status %s --xml" % snapname
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'snapshot status' for snap %s on "
+                    "node %s.", snapname, mnode)
+        return None
+
+    try:
+        snap_status_list = (
+            parse_xml_records(out, "snapStatus/snapshots/snapshot",
+                              SNAP_STATUS, as_dict=True) or
+            parse_xml_records(out, "snapStatus/snapshot", SNAP_STATUS,
+                              as_dict=True))
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster snapshot "
+                    "status xml output.")
         return None
 
     for snap_status in snap_status_list:
-        if "name" in snap_status:
-            if snap_status["name"] == snapname:
-                return snap_status
+        if snap_status.get("name") == snapname:
+            return snap_status
     g.log.error("The snap %s not found" % (snapname))
     return None
 
@@ -339,34 +560,13 @@ def get_snap_status_by_volname(mnode, volname):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_xml_records(out, "snapStatus/snapshots/snapshot",
+                                 SNAP_STATUS, as_dict=True)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster snapshot "
                     "status xml output.")
         return None
 
-    snap_status_list = []
-    for snap in root.findall("snapStatus/snapshots/snapshot"):
-        snap_status = {}
-        for element in snap.getchildren():
-            if element.tag == "volume":
-                status = {}
-                status["brick"] = []
-                for elmt in element.getchildren():
-                    if elmt.tag == "brick":
-                        brick_info = {}
-                        for el in elmt.getchildren():
-                            brick_info[el.tag] = el.text
-                        status["brick"].append(brick_info)
-                    else:
-                        status[elmt.tag] = elmt.text
-
-                snap_status[element.tag] = status
-            else:
-                snap_status[element.tag] = element.text
-        snap_status_list.append(snap_status)
-    return snap_status_list
-
 
 def snap_info(mnode, snapname="", volname=""):
     """Runs 'gluster snapshot info' on specific node
@@ -436,33 +636,18 @@ def get_snap_info(mnode):
         return None
 
     try:
-        root = etree.XML(out)
+        snap_info_list = parse_xml_records(out, "snapInfo/snapshots/snapshot",
+                                           SNAP_INFO, as_dict=True)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster snapshot "
                     "info xml output.")
         return None
 
-    snap_info_list = []
-    for snap in root.findall("snapInfo/snapshots/snapshot"):
-        snap_info = {}
-        for element in snap.getchildren():
-            if element.tag == "snapVolume":
-                info = {}
-                for elmt in element.getchildren():
-                    if elmt.tag == "originVolume":
-                        info["originVolume"] = {}
-                        for el in elmt.getchildren():
-                            info[elmt.tag][el.tag] = el.text
-                    else:
-                        info[elmt.tag] = elmt.text
-                snap_info[element.tag] = info
-            else:
-                snap_info[element.tag] = element.text
-        snap_info_list.append(snap_info)
+    get_snap_catalog(mnode).load(snap_info_list)
     return snap_info_list
 
 
-def get_snap_info_by_snapname(mnode, snapname):
+def get_snap_info_by_snapname(mnode, snapname, use_cache=False):
     """Parse the output of 'gluster snapshot info' command
         for the given snapshot.
 
@@ -470,6 +655,10 @@ def get_snap_info_by_snapname(mnode, snapname):
         mnode (str): Node on which command has to be executed.
         snapname (str): snapshot name
 
+    Kwargs:
+        use_cache (bool): True to serve the info from the snapshot catalog
+            when the snapshot is known to it. Defaults to False.
+
     Returns:
         NoneType: None if command execution fails, parse errors.
         dict: on success.
@@ -482,21 +671,36 @@ def get_snap_info_by_snapname(mnode, snapname):
         'df1882d3f86d48738e69f298096f3810'}
     """
 
-    snap_info_list = get_snap_info(mnode)
-    if not snap_info_list:
-        g.log.error("Failed to parse snap info in "
-                    "get_snap_info_by_snapname()")
+    catalog = get_snap_catalog(mnode)
+    if use_cache:
+        snap_info = catalog.get(snapname)
+        if snap_info is not None:
+            return snap_info
+
+    cmd = "gluster snapshot info %s --xml" % snapname
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'snapshot info' for snap %s on "
+                    "node %s.", snapname, mnode)
+        return None
+
+    try:
+        snap_info_list = parse_xml_records(out, "snapInfo/snapshots/snapshot",
+                                           SNAP_INFO, as_dict=True)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster snapshot "
+                    "info xml output.")
         return None
 
     for snap_info in snap_info_list:
-        if "name" in snap_info:
-            if snap_info["name"] == snapname:
-                return snap_info
+        if snap_info.get("name") == snapname:
+            catalog.add(copy.deepcopy(snap_info))
+            return snap_info
     g.log.error("The snap %s not found" % (snapname))
     return None
 
 
-def get_snap_info_by_volname(mnode, volname):
+def get_snap_info_by_volname(mnode, volname, use_cache=False):
     """Parse the output of 'gluster snapshot info' command
         for the given volume.
 
@@ -504,6 +708,11 @@ def get_snap_info_by_volname(mnode, volname):
         mnode (str): Node on which command has to be executed.
         volname (str): snapshot name
 
+    Kwargs:
+        use_cache (bool): True to serve the info from the snapshot catalog
+            when all the snapshots of the volume are known to it.
+            Defaults to False.
+
     Returns:
         NoneType: None if command execution fails, parse errors.
         list: list of dicts on success.
@@ -520,6 +729,12 @@ def get_snap_info_by_volname(mnode, volname):
         '2016-04-07 12:03:11', 'name': 'next_snap1'}]}
     """
 
+    catalog = get_snap_catalog(mnode)
+    if use_cache:
+        snap_vol_info = catalog.get_volume(volname)
+        if snap_vol_info is not None:
+            return snap_vol_info
+
     cmd = "gluster snapshot info volume %s --xml" % volname
     ret, out, _ = g.run(mnode, cmd)
     if ret != 0:
@@ -528,45 +743,91 @@ def get_snap_info_by_volname(mnode, volname):
         return None
 
     try:
-        root = etree.XML(out)
+        snap_vol_info = parse_xml_records(out, "snapInfo", SNAP_VOLUME_INFO,
+                                          as_dict=True)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster snapshot "
                     "info xml output.")
         return None
 
-    snap_vol_info = {}
-
-    for snap in root.findall("snapInfo"):
-        for element in snap.getchildren():
-            if element.tag == "originVolume":
-                info = {}
-                for elmt in element.getchildren():
-                    info[elmt.tag] = elmt.text
-                snap_vol_info[element.tag] = info
-            else:
-                snap_vol_info[element.tag] = element.text
-
-    snap_info_list = []
-    for snap in root.findall("snapInfo/snapshots/snapshot"):
-        snap_info = {}
-        for element in snap.getchildren():
-            if element.tag == "snapVolume":
-                info = {}
-                for elmt in element.getchildren():
-                    if elmt.tag == "originVolume":
-                        info["originVolume"] = {}
-                        for el in elmt.getchildren():
-                            info[elmt.tag][el.tag] = el.text
-                    else:
-                        info[elmt.tag] = elmt.text
-                snap_info[element.tag] = info
-            else:
-                snap_info[element.tag] = element.text
-        snap_info_list.append(snap_info)
-    snap_vol_info["snapshots"] = snap_info_list
+    if not snap_vol_info:
+        return {'snapshots': []}
+    snap_vol_info = snap_vol_info[0]
+    snap_vol_info.setdefault('snapshots', [])
+    catalog.load_volume(volname, snap_vol_info)
     return snap_vol_info
 
 
+def get_snap_status_records(mnode, volname=None):
+    """Gets the status of the snapshots as typed records.
+
+    Args:
+        mnode (str): Node on which command has to be executed.
+
+    Kwargs:
+        volname (str): get the status of the snapshots of this volume
+            only. Defaults to all the snapshots.
+
+    Returns:
+        NoneType: None if command execution fails, parse errors.
+        list: list of SnapStatus records on success. Brick pids are ints
+            (None when not running) and lvUsage is float.
+    """
+    cmd = "gluster snapshot status --xml"
+    if volname is not None:
+        cmd = "gluster snapshot status volume %s --xml" % volname
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'snapshot status' on node %s. "
+                    "Hence failed to get the snapshot status.", mnode)
+        return None
+
+    try:
+        return parse_xml_records(out, "snapStatus/snapshots/snapshot",
+                                 SNAP_STATUS)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster snapshot "
+                    "status xml output.")
+        return None
+
+
+def get_snap_info_records(mnode, volname=None):
+    """Gets the info of the snapshots as typed records.
+
+    Args:
+        mnode (str): Node on which command has to be executed.
+
+    Kwargs:
+        volname (str): get the info of the snapshots of this volume
+            only. Defaults to all the snapshots.
+
+    Returns:
+        NoneType: None if command execution fails, parse errors.
+        list: list of SnapInfo records on success.
+
+    Examples:
+        >>> [(snap.name, snap.snapVolume.status)
+        ...  for snap in get_snap_info_records('abc.com', 'testvol')]
+        [('snap1', 'Stopped'), ('snap2', 'Started')]
+    """
+    cmd = "gluster snapshot info --xml"
+    if volname is not None:
+        cmd = "gluster snapshot info volume %s --xml" % volname
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'snapshot info' on node %s. "
+                    "Hence failed to get the snapshot info.", mnode)
+        return None
+
+    try:
+        return parse_xml_records(out, "snapInfo/snapshots/snapshot",
+                                 SNAP_INFO)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster snapshot "
+                    "info xml output.")
+        return None
+
+
 def snap_list(mnode):
     """Lists the snapshots
 
@@ -615,18 +876,12 @@ def get_snap_list(mnode):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_xml_records(out, "snapList/snapshot", to_str)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster snapshot "
                     "list xml output.")
         return None
 
-    snap_list = []
-    for snap in root.findall("snapList/snapshot"):
-        snap_list.append(snap.text)
-
-    return snap_list
-
 
 def snap_config(mnode, volname=None):
     """Runs 'gluster snapshot config' on specific node
@@ -690,32 +945,22 @@ def get_snap_config(mnode, volname=None):
         return None
 
     try:
-        root = etree.XML(out)
+        snap_config = parse_xml_records(out, "snapConfig", SNAP_CONFIG,
+                                        as_dict=True)
     except etree.ParseError:
         g.log.error("Failed to parse the gluster snapshot "
                     "config xml output.")
         return None
 
-    snap_config = {}
-    for config in root.findall("snapConfig/systemConfig"):
-        sys_config = {}
-        for element in config.getchildren():
-            sys_config[element.tag] = element.text
-    snap_config["systemConfig"] = sys_config
-
-    volume_config = []
-    for config in root.findall("snapConfig/volumeConfig/volume"):
-        vol_config = {}
-        for element in config.getchildren():
-            vol_config[element.tag] = element.text
-
-        if volname is not None:
-            if volname == vol_config["name"]:
-                volume_config.append(vol_config)
-        else:
-            volume_config.append(vol_config)
+    if not snap_config:
+        g.log.error("Snapshot config not found in the xml output.")
+        return None
+    snap_config = snap_config[0]
 
-    snap_config["volumeConfig"] = volume_config
+    if volname is not None:
+        snap_config["volumeConfig"] = [
+            vol_config for vol_config in snap_config.get("volumeConfig", [])
+            if vol_config.get("name") == volname]
     return snap_config
 
 
@@ -751,7 +996,10 @@ def set_snap_config(mnode, option, volname=None):
 
     cmd = ("gluster snapshot config %s %s %s --mode=script"
            % (volname, option.keys()[0], option.values()[0]))
-    return g.run(mnode, cmd)
+    ret, out, err = g.run(mnode, cmd)
+    # Snapshots may get auto-deleted with the new config
+    invalidate_snap_catalog()
+    return ret, out, err
 
 
 def snap_delete(mnode, snapname):
@@ -778,7 +1026,10 @@ def snap_delete(mnode, snapname):
     """
 
     cmd = "gluster snapshot delete %s --mode=script" % snapname
-    return g.run(mnode, cmd)
+    ret, out, err = g.run(mnode, cmd)
+    if ret == 0:
+        _record_snap_op(mnode, 'snapshot_deleted', snapname)
+    return ret, out, err
 
 
 def snap_delete_by_volumename(mnode, volname):
@@ -805,7 +1056,10 @@ def snap_delete_by_volumename(mnode, volname):
     """
 
     cmd = "gluster snapshot delete volume %s --mode=script" % volname
-    return g.run(mnode, cmd)
+    ret, out, err = g.run(mnode, cmd)
+    if ret == 0:
+        _record_snap_op(mnode, 'volume_snapshots_deleted', volname)
+    return ret, out, err
 
 
 def snap_delete_all(mnode):
@@ -830,7 +1084,9 @@ def snap_delete_all(mnode):
 
     """
     cmd = "gluster snapshot delete all --mode=script"
-    return g.run(mnode, cmd)
+    ret, out, err = g.run(mnode, cmd)
+    invalidate_snap_catalog()
+    return ret, out, err
 
 
 def snap_activate(mnode, snapname, force=False):
@@ -866,7 +1122,10 @@ def snap_activate(mnode, snapname, force=False):
         frce = 'force'
 
     cmd = "gluster snapshot activate %s %s --mode=script" % (snapname, frce)
-    return g.run(mnode, cmd)
+    ret, out, err = g.run(mnode, cmd)
+    if ret == 0:
+        _record_snap_op(mnode, 'snapshot_status_changed', snapname)
+    return ret, out, err
 
 
 def snap_deactivate(mnode, snapname):
@@ -893,4 +1152,255 @@ def snap_deactivate(mnode, snapname):
     """
 
     cmd = "gluster snapshot deactivate %s --mode=script" % snapname
-    return g.run(mnode, cmd)
+    ret, out, err = g.run(mnode, cmd)
+    if ret == 0:
+        _record_snap_op(mnode, 'snapshot_status_changed', snapname)
+    return ret, out, err
+
+
+_SNAP_OPS = {
+    'create': snap_create,
+    'clone': snap_clone,
+    'activate': snap_activate,
+    'deactivate': snap_deactivate,
+    'delete': snap_delete,
+}
+
+
+def run_snap_ops(mnode, ops, window=4, retries=5, backoff=1,
+                 max_backoff=30):
+    """Runs snapshot operations concurrently, keeping at most 'window'
+    operations in flight. Operations rejected because glusterd is busy with
+    another transaction (or holds the lock of the volume) are retried after
+    an exponential backoff with jitter.
+
+    Args:
+        mnode (str): Node on which the snapshot commands are executed.
+        ops (list): list of (op, kwargs) tuples, where op is one of
+            'create', 'clone', 'activate', 'deactivate' and 'delete', and
+            kwargs are the arguments of the respective snap_<op> function
+            other than mnode.
+
+    Kwargs:
+        window (int): maximum number of operations in flight.
+            Defaults to 4.
+        retries (int): maximum number of retries of an operation on
+            transient glusterd errors. Defaults to 5.
+        backoff (int|float): delay in seconds before the first retry, doubled
+            on every further retry. Defaults to 1.
+        max_backoff (int|float): maximum delay in seconds between retries.
+            Defaults to 30.
+
+    Returns:
+        list: list of result dicts, in the order of ops. None if an op is
+            not known.
+
+    Example:
+        run_snap_ops("abc.com", [('create', {'volname': 'testvol',
+                                              'snapname': 'snap1'}),
+                                 ('activate', {'snapname': 'snap1'})])
+        >>>[{'op': 'create', 'snapname': 'snap1', 'volname': 'testvol',
+             'ret': 0, 'out': '...', 'err': '', 'attempts': 1,
+             'latency': 1.93, 'elapsed': 1.93}, ...]
+
+        'latency' is the duration in seconds of the last attempt and
+        'elapsed' the duration including the retries and backoffs.
+    """
+    for op, _ in ops:
+        if op not in _SNAP_OPS:
+            g.log.error("Unknown snapshot operation '%s'.", op)
+            return None
+
+    def _run_op(op_kwargs):
+        op, kwargs = op_kwargs
+        result = {'op': op, 'snapname': kwargs.get('snapname'),
+                  'volname': kwargs.get('volname'), 'attempts': 0}
+        delay = backoff
+        start = time.time()
+        while True:
+            attempt_start = time.time()
+            ret, out, err = _SNAP_OPS[op](mnode, **kwargs)
+            result['attempts'] += 1
+            result['latency'] = time.time() - attempt_start
+            if (ret == 0 or result['attempts'] > retries or
+                    not is_transient_glusterd_error(out + err)):
+                break
+            time.sleep(min(delay, max_backoff) * random.uniform(0.5, 1.5))
+            delay *= 2
+        result['elapsed'] = time.time() - start
+        result.update({'ret': ret, 'out': out, 'err': err})
+        if op == 'create' and ret == 0 and kwargs.get('timestamp'):
+            match = re.search(r'Snap (\S+) created successfully', out)
+            if match:
+                result['snapname'] = match.group(1)
+        if ret != 0:
+            g.log.error("Snapshot %s of '%s' failed after %d attempts: %s",
+                        op, result['snapname'], result['attempts'],
+                        err or out)
+        return result
+
+    if not ops:
+        return []
+    pool = ThreadPool(max(1, min(window, len(ops))))
+    try:
+        return pool.map(_run_op, ops)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def bulk_snap_create(mnode, volnames, count, snapname_prefix='snap',
+                     **kwargs):
+    """Creates 'count' snapshots of each of the given volumes concurrently.
+    Snapshots are created round robin over the volumes, so that the
+    operations in flight are mostly on different volumes.
+
+    Args:
+        mnode (str): Node on which the snapshot commands are executed.
+        volnames (str|list): A volume|List of volumes to be snapshotted.
+        count (int): number of snapshots to be created per volume.
+
+    Kwargs:
+        snapname_prefix (str): snapshots are named
+            <snapname_prefix>_<volname>_<index>. Defaults to 'snap'.
+        **kwargs: 'timestamp', 'description' and 'force' are passed to
+            snap_create, the other arguments to run_snap_ops.
+
+    Returns:
+        list: list of result dicts as returned by run_snap_ops.
+
+    Example:
+        bulk_snap_create("abc.com", ['testvol1', 'testvol2'], 50,
+                         window=8)
+    """
+    if isinstance(volnames, str):
+        volnames = [volnames]
+
+    create_kwargs = {}
+    for key in ('timestamp', 'description', 'force'):
+        if key in kwargs:
+            create_kwargs[key] = kwargs.pop(key)
+
+    ops = []
+    for index in range(count):
+        for volname in volnames:
+            op_kwargs = {'volname': volname,
+                         'snapname': "%s_%s_%d" % (snapname_prefix, volname,
+                                                   index)}
+            op_kwargs.update(create_kwargs)
+            ops.append(('create', op_kwargs))
+    return run_snap_ops(mnode, ops, **kwargs)
+
+
+def bulk_snap_activate(mnode, snapnames, force=False, **kwargs):
+    """Activates the given snapshots concurrently.
+
+    Args:
+        mnode (str): Node on which the snapshot commands are executed.
+        snapnames (str|list): A snapshot|List of snapshots to be activated.
+
+    Kwargs:
+        force (bool): True to activate with the force option.
+            Defaults to False.
+        **kwargs: arguments of run_snap_ops.
+
+    Returns:
+        list: list of result dicts as returned by run_snap_ops.
+    """
+    if isinstance(snapnames, str):
+        snapnames = [snapnames]
+    ops = [('activate', {'snapname': snapname, 'force': force})
+           for snapname in snapnames]
+    return run_snap_ops(mnode, ops, **kwargs)
+
+
+def bulk_snap_deactivate(mnode, snapnames, **kwargs):
+    """Deactivates the given snapshots concurrently.
+
+    Args:
+        mnode (str): Node on which the snapshot commands are executed.
+        snapnames (str|list): A snapshot|List of snapshots to be
+            deactivated.
+
+    Kwargs:
+        **kwargs: arguments of run_snap_ops.
+
+    Returns:
+        list: list of result dicts as returned by run_snap_ops.
+    """
+    if isinstance(snapnames, str):
+        snapnames = [snapnames]
+    ops = [('deactivate', {'snapname': snapname}) for snapname in snapnames]
+    return run_snap_ops(mnode, ops, **kwargs)
+
+
+def bulk_snap_delete(mnode, snapnames, **kwargs):
+    """Deletes the given snapshots concurrently.
+
+    Args:
+        mnode (str): Node on which the snapshot commands are executed.
+        snapnames (str|list): A snapshot|List of snapshots to be deleted.
+
+    Kwargs:
+        **kwargs: arguments of run_snap_ops.
+
+    Returns:
+        list: list of result dicts as returned by run_snap_ops.
+    """
+    if isinstance(snapnames, str):
+        snapnames = [snapnames]
+    ops = [('delete', {'snapname': snapname}) for snapname in snapnames]
+    return run_snap_ops(mnode, ops, **kwargs)
+
+
+def get_snap_ops_latency_stats(results, op=None):
+    """Summarizes the latencies of snapshot operations run by run_snap_ops.
+
+    Args:
+        results (list): result dicts as returned by run_snap_ops.
+
+    Kwargs:
+        op (str): summarize only the operations of this type
+            ('create', 'delete' etc.). Defaults to all of them.
+
+    Returns:
+        dict: summary of the latencies in seconds of the successful
+            operations, None if results is None.
+
+    Example:
+        get_snap_ops_latency_stats(results, 'create')
+        >>>{'count': 100, 'failed': 0, 'retried': 12, 'retries': 17,
+            'min': 0.82, 'max': 4.1, 'mean': 1.7, 'p50': 1.5, 'p90': 2.9,
+            'p99': 4.0}
+    """
+    if results is None:
+        return None
+    if op is not None:
+        results = [result for result in results if result['op'] == op]
+
+    latencies = sorted(result['latency'] for result in results
+                       if result['ret'] == 0)
+    stats = {
+        'count': len(latencies),
+        'failed': len(results) - len(latencies),
+        'retried': len([result for result in results
+                        if result['attempts'] > 1]),
+        'retries': sum(result['attempts'] - 1 for result in results),
+    }
+    if not latencies:
+        return stats
+
+    def _percentile(pct):
+        # nearest rank
+        rank = max(0, int(-(-pct * len(latencies) // 100)) - 1)
+        return latencies[rank]
+
+    stats.update({
+        'min': latencies[0],
+        'max': latencies[-1],
+        'mean': sum(latencies) / float(len(latencies)),
+        'p50': _percentile(50),
+        'p90': _percentile(90),
+        'p99': _percentile(99),
+    })
+    return stats
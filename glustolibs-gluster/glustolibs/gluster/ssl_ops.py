@@ -22,6 +22,7 @@
 
 from StringIO import StringIO
 from glusto.core import Glusto as g
+from glustolibs.gluster.peer_ops import invalidate_peer_connectivity_cache
 
 
 def create_ssl_machine(servers, clients):
@@ -47,6 +48,7 @@ def create_ssl_machine(servers, clients):
     ca_file_server = StringIO()
 
     # Stop glusterd on all servers
+    invalidate_peer_connectivity_cache()
     ret = g.run_parallel(servers, "systemctl stop glusterd")
     if not ret:
         g.log.error("Failed to stop glusterd on all servers")
@@ -177,6 +179,7 @@ def cleanup_ssl_setup(servers, clients):
     _rc = True
 
     # Stop glusterd on all servers
+    invalidate_peer_connectivity_cache()
     ret = g.run_parallel(servers, "systemctl stop glusterd")
     if not ret:
         _rc = False
@@ -25,6 +25,7 @@ from glusto.core import Glusto as g
 from glustolibs.gluster.peer_ops import peer_probe_servers
 from glustolibs.gluster.gluster_init import start_glusterd
 from glustolibs.gluster.lib_utils import list_files
+from glustolibs.gluster.rebalance_ops import parse_rebalance_status_xml
 
 try:
     import xml.etree.cElementTree as etree
@@ -220,23 +221,37 @@ def get_tier_status(mnode, volname):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_rebalance_status_xml(out, "volRebalance")
     except etree.ParseError:
         g.log.error("Failed to parse the gluster tier status xml output.")
         return None
 
-    tier_status = {}
-    tier_status["node"] = []
-    for info in root.findall("volRebalance"):
-        for element in info.getchildren():
-            if element.tag == "node":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                tier_status[element.tag].append(status_info)
-            else:
-                tier_status[element.tag] = element.text
-    return tier_status
+
+def get_tier_status_record(mnode, volname):
+    """Gets the tier status as typed record.
+
+    Args:
+        mnode (str): Node on which command has to be executed.
+        volname (str): volume name
+
+    Returns:
+        NoneType: None if command execution fails, parse errors.
+        RebalanceStatus: record with the RebalanceNode records of every
+            node (with promotedFiles and demotedFiles) under 'node'.
+    """
+    cmd = "gluster volume tier %s status --xml" % volname
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'tier status' on node %s. "
+                    "Hence failed to get tier status.", mnode)
+        return None
+
+    try:
+        return parse_rebalance_status_xml(out, "volRebalance",
+                                          as_dict=False)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster tier status xml output.")
+        return None
 
 
 def tier_detach_start(mnode, volname):
@@ -406,28 +421,36 @@ def get_detach_tier_status(mnode, volname):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_rebalance_status_xml(out, "volDetachTier")
     except etree.ParseError:
         g.log.error("Failed to parse the detach tier status xml output.")
         return None
 
-    tier_status = {}
-    tier_status["node"] = []
-    for info in root.findall("volDetachTier"):
-        for element in info.getchildren():
-            if element.tag == "node":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                tier_status[element.tag].append(status_info)
-            elif element.tag == "aggregate":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                tier_status[element.tag] = status_info
-            else:
-                tier_status[element.tag] = element.text
-    return tier_status
+
+def get_detach_tier_status_record(mnode, volname):
+    """Gets the detach tier status as typed record.
+
+    Args:
+        mnode (str): Node on which command has to be executed.
+        volname (str): volume name
+
+    Returns:
+        NoneType: None if command execution fails, parse errors.
+        RebalanceStatus: record on success.
+    """
+    cmd = "gluster volume tier %s detach status --xml" % volname
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to execute 'detach tier status' on node %s. "
+                    "Hence failed to get detach tier status.", mnode)
+        return None
+
+    try:
+        return parse_rebalance_status_xml(out, "volDetachTier",
+                                          as_dict=False)
+    except etree.ParseError:
+        g.log.error("Failed to parse the detach tier status xml output.")
+        return None
 
 
 def tier_detach_start_and_get_taskid(mnode, volname):
@@ -501,30 +524,12 @@ def tier_detach_stop_and_get_status(mnode, volname):
         return None
 
     try:
-        root = etree.XML(out)
+        return parse_rebalance_status_xml(out, "volDetachTier")
     except etree.ParseError:
         g.log.error("Failed to parse the gluster detach tier stop"
                     " xml output.")
         return None
 
-    tier_status = {}
-    tier_status["node"] = []
-    for info in root.findall("volDetachTier"):
-        for element in info.getchildren():
-            if element.tag == "node":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                tier_status[element.tag].append(status_info)
-            elif element.tag == "aggregate":
-                status_info = {}
-                for elmt in element.getchildren():
-                    status_info[elmt.tag] = elmt.text
-                tier_status[element.tag] = status_info
-            else:
-                tier_status[element.tag] = element.text
-    return tier_status
-
 
 def wait_for_detach_tier_to_complete(mnode, volname, timeout=300):
     """Waits for the detach tier to complete
@@ -29,7 +29,8 @@ from glustolibs.gluster.volume_ops import (volume_create, volume_start,
                                            volume_stop, volume_delete,
                                            volume_info, volume_status,
                                            get_volume_options,
-                                           get_volume_list)
+                                           get_volume_list,
+                                           get_volume_info_records)
 from glustolibs.gluster.tiering_ops import (add_extra_servers_to_cluster,
                                             tier_attach,
                                             is_tier_process_running)
@@ -1025,6 +1026,50 @@ def get_hot_tier_replica_count(mnode, volname):
         return hot_tier_replica_count
 
 
+def get_arbiter_bricks(mnode, volname):
+    """Get the arbiter brick of every replica set of the volume
+
+    Args:
+        mnode (str): Node on which commands are executed.
+        volname (str): Name of the volume.
+
+    Returns:
+        list: the arbiter bricks ('<node>:<brick path>'), one per replica
+            set, in the order of get_subvols. Empty if the volume has no
+            arbiter.
+        NoneType: None on failure.
+
+    Example:
+        get_arbiter_bricks("abc.com", "testvol")
+        >>>['server3:/bricks/brick0/testvol_brick2',
+            'server3:/bricks/brick1/testvol_brick5']
+    """
+    volinfo = get_volume_info_records(mnode, volname)
+    if volinfo is None or volname not in volinfo:
+        g.log.error("Unable to get the volume info of %s", volname)
+        return None
+
+    volume = volinfo[volname]
+    if not volume.arbiterCount:
+        return []
+
+    subvols = get_subvols(mnode, volname)['volume_subvols']
+    if not subvols:
+        g.log.error("Unable to get the subvols of volume %s", volname)
+        return None
+
+    flagged = set(brick.name for brick in volume.bricks.brick or []
+                  if brick.isArbiter)
+    arbiter_bricks = []
+    for bricks in subvols:
+        arbiters = [brick for brick in bricks if brick in flagged]
+        # Versions not flagging the arbiter bricks have it last in every
+        # replica set
+        arbiter_bricks.append(arbiters[0] if arbiters else bricks[-1])
+
+    return arbiter_bricks
+
+
 def get_disperse_count(mnode, volname):
     """Get the disperse count of the volume
 
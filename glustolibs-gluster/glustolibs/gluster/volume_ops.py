@@ -20,6 +20,8 @@ import re
 import copy
 from glusto.core import Glusto as g
 from pprint import pformat
+from glustolibs.gluster.xml_records import (parse_xml_records, to_str,
+                                            VOLUME_INFO, VOLUME_STATUS)
 try:
     import xml.etree.cElementTree as etree
 except ImportError:
@@ -509,6 +511,45 @@ def get_volume_status(mnode, volname='all', service='', options=''):
     return vol_status
 
 
+def get_volume_status_records(mnode, volname='all', service='', options=''):
+    """Gets the status of all or specified volume(s)/brick as typed records.
+        Unlike get_volume_status, the nodes are not regrouped by host.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+
+    Kwargs:
+        volname (str): volume name. Defaults to 'all'
+        service (str): name of the service to get status.
+            service can be, [nfs|shd|<BRICK>|quotad]]
+        options (str): options can be,
+            [detail|clients|mem|inode|fd|callpool|tasks].
+
+    Returns:
+        NoneType: on failure
+        list: list of VolumeStatus records. Each record has the list of
+            VolumeStatusNode records (bricks and services) under 'node'
+            and tasks under 'tasks'.
+
+    Example:
+        >>> for vol in get_volume_status_records("abc.com", "testvol"):
+        ...     offline = [node.path for node in vol.node if not node.status]
+    """
+    cmd = "gluster vol status %s %s %s --xml" % (volname, service, options)
+    ret, out, _ = g.run(mnode, cmd, log_level='DEBUG')
+    if ret != 0:
+        g.log.error("Failed to execute gluster volume status command")
+        return None
+
+    try:
+        return parse_xml_records(out, "volStatus/volumes/volume",
+                                 VOLUME_STATUS)
+    except etree.ParseError:
+        g.log.error("Failed to parse the XML output of volume status for "
+                    "volume %s", volname)
+        return None
+
+
 def get_volume_options(mnode, volname, option='all'):
     """gets the option values for the given volume.
 
@@ -550,8 +591,267 @@ def get_volume_options(mnode, volname, option='all'):
     return volume_option
 
 
+# Values accepted by glusterd for boolean options
+_TRUE_OPTION_VALUES = ('1', 'on', 'yes', 'true', 'enable')
+_FALSE_OPTION_VALUES = ('0', 'off', 'no', 'false', 'disable')
+
+# Directory with the option group files used by 'volume set <vol> group'
+GLUSTERD_GROUPS_DIR = "/var/lib/glusterd/groups"
+
+
+def _strip_option_value(value):
+    """Strips the '(DEFAULT)' marker of the values in volume get output."""
+    value = str(value).strip()
+    if value.endswith('(DEFAULT)'):
+        value = value[:-len('(DEFAULT)')].strip()
+    return value
+
+
+def normalize_volume_option_value(value):
+    """Normalizes the value of a boolean volume option for comparison.
+    Boolean values (on/yes/true/enable/1 and their negations) are mapped to
+    'on'/'off'. Only to be used for options which are known to be boolean,
+    as 1/0 are also valid values of the numeric options.
+
+    Args:
+        value (str|int|bool): option value.
+
+    Returns:
+        str: normalized value.
+
+    Example:
+        normalize_volume_option_value("enable")
+        >>>'on'
+    """
+    if isinstance(value, bool):
+        return 'on' if value else 'off'
+    value = _strip_option_value(value)
+    if value.lower() in _TRUE_OPTION_VALUES:
+        return 'on'
+    if value.lower() in _FALSE_OPTION_VALUES:
+        return 'off'
+    return value
+
+
+def _is_boolean_volume_option_value(value):
+    """Returns True if the value (as shown by volume get) is the value of a
+    boolean option. 1/0 are not taken as boolean, as numeric options have
+    them too.
+    """
+    value = _strip_option_value(value).lower()
+    return (value not in ('1', '0') and
+            (value in _TRUE_OPTION_VALUES or value in _FALSE_OPTION_VALUES))
+
+
+def _volume_option_value_matches(current_value, value):
+    """Compares the current value of an option with the given value, as
+    booleans if the current value is boolean, as is otherwise.
+    """
+    if _is_boolean_volume_option_value(current_value):
+        return (normalize_volume_option_value(current_value) ==
+                normalize_volume_option_value(value))
+    if isinstance(value, bool):
+        return False
+    return _strip_option_value(current_value) == _strip_option_value(value)
+
+
+def _resolve_volume_option_key(option, current_options):
+    """Returns the key of the option in the volume get output, which has
+    the full option names. Gluster also accepts the unique suffix of a name
+    (e.g. 'readdir-ahead' for 'performance.readdir-ahead'). None if not
+    found.
+    """
+    if option in current_options:
+        return option
+    keys = [key for key in current_options
+            if key.endswith('.' + option)]
+    if len(keys) == 1:
+        return keys[0]
+    return None
+
+
+def diff_volume_options(current_options, options):
+    """Computes the options which are to be set to get the given option
+    values.
+
+    Args:
+        current_options (dict): options of the volume as returned by
+            get_volume_options(mnode, volname, 'all').
+        options (dict): required option values.
+
+    Returns:
+        dict: options whose current value is different from the required
+            one, or which are not in current_options (user.* options,
+            options of newer versions), with the required values. Values
+            are compared as booleans only for the options whose current
+            value is boolean.
+
+    Example:
+        diff_volume_options({'performance.readdir-ahead': 'on',
+                             'nfs.disable': 'off'},
+                            {'readdir-ahead': 'enable', 'nfs.disable': 'on'})
+        >>>{'nfs.disable': 'on'}
+    """
+    delta = {}
+    for option, value in options.items():
+        key = _resolve_volume_option_key(option, current_options)
+        if (key is not None and
+                _volume_option_value_matches(current_options[key], value)):
+            continue
+        delta[key or option] = value
+    return delta
+
+
+def get_volume_option_group(mnode, group):
+    """Gets the options of a volume option group (as set by
+    'gluster volume set <volname> group <group>').
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        group (str): name of the option group.
+
+    Returns:
+        dict: options of the group, None on failure.
+
+    Example:
+        get_volume_option_group(mnode, "metadata-cache")
+    """
+    cmd = "cat %s/%s" % (GLUSTERD_GROUPS_DIR, group)
+    ret, out, _ = g.run(mnode, cmd)
+    if ret != 0:
+        g.log.error("Failed to read the option group %s", group)
+        return None
+
+    group_options = {}
+    for line in out.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        option, _, value = line.partition('=')
+        group_options[option.strip()] = value.strip()
+    return group_options
+
+
+def _set_volume_options_delta(mnode, volname, delta, current_options):
+    """Sets the options of delta, in a single 'volume set' transaction
+    when the cli allows it, else one option at a time.
+
+    Returns:
+        dict: option -> (old value, new value) of the options set. None if
+            any of the options could not be set.
+    """
+    changed = {}
+    options = sorted(delta)
+    if len(options) > 1 and volname != 'all':
+        # Global options ('all') are set one per transaction.
+        cmd = ("gluster volume set %s %s --mode=script"
+               % (volname, ' '.join("%s %s" % (option, delta[option])
+                                    for option in options)))
+        ret, _, _ = g.run(mnode, cmd)
+        if ret == 0:
+            options = []
+            for option in delta:
+                changed[option] = (current_options.get(option), delta[option])
+        else:
+            g.log.info("Failed to set the options of volume %s in a single "
+                       "transaction, setting them one at a time", volname)
+
+    _rc = True
+    for option in options:
+        cmd = ("gluster volume set %s %s %s --mode=script"
+               % (volname, option, delta[option]))
+        ret, _, _ = g.run(mnode, cmd)
+        if ret != 0:
+            g.log.error("Unable to set value %s for option %s",
+                        delta[option], option)
+            _rc = False
+            continue
+        changed[option] = (current_options.get(option), delta[option])
+
+    if not _rc:
+        return None
+    return changed
+
+
+def apply_volume_options(mnode, volname, options, current_options=None):
+    """Sets the given volume options, skipping the ones which already have
+    the given values. The options of the groups in options['group'] are
+    diffed the same way.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name ('all' for the global options)
+        options (dict): volume options in key value format
+
+    Kwargs:
+        current_options (dict): options of the volume as returned by
+            get_volume_options(mnode, volname, 'all'). Fetched if None.
+
+    Returns:
+        dict: option -> (old value, new value) of the options which were
+            changed. old value is None if it is not known. None on failure.
+
+    Example:
+        options = {"user.cifs": "enable", "user.smb": "enable"}
+        apply_volume_options("abc.com", "testvol", options)
+        >>>{'user.cifs': (None, 'enable'), 'user.smb': (None, 'enable')}
+    """
+    volume_options = copy.deepcopy(options)
+
+    if current_options is None:
+        current_options = get_volume_options(mnode, volname, 'all')
+        if current_options is None:
+            g.log.warning("Unable to get the options of volume %s, setting "
+                          "all the given options", volname)
+            current_options = {}
+
+    # Options of the groups are applied first, so that the options given
+    # explicitly override them.
+    _rc = True
+    group_set = False
+    required_options = {}
+    group_options = volume_options.pop('group', [])
+    if isinstance(group_options, str):
+        group_options = [group_options]
+    for group_option in group_options:
+        group = get_volume_option_group(mnode, group_option)
+        if group is not None:
+            for option, value in group.items():
+                key = _resolve_volume_option_key(option, current_options)
+                required_options[key or option] = value
+            continue
+        cmd = ("gluster volume set %s group %s --mode=script" %
+               (volname, group_option))
+        ret, _, _ = g.run(mnode, cmd)
+        if ret != 0:
+            g.log.error("Unable to set group option: %s", group_option)
+            _rc = False
+        group_set = True
+    if group_set:
+        # Options set by the group are to be diffed with their new values
+        current_options = get_volume_options(mnode, volname, 'all') or {}
+
+    for option, value in volume_options.items():
+        key = _resolve_volume_option_key(option, current_options)
+        required_options[key or option] = value
+    delta = diff_volume_options(current_options, required_options)
+
+    if not delta:
+        g.log.info("Options of volume %s are already set", volname)
+        return {} if _rc else None
+
+    changed = _set_volume_options_delta(mnode, volname, delta,
+                                        current_options)
+    if changed is None or not _rc:
+        return None
+    g.log.info("Changed options of volume %s: %s", volname, changed)
+    return changed
+
+
 def set_volume_options(mnode, volname, options):
-    """Sets the option values for the given volume.
+    """Sets the option values for the given volume. All the options are
+    set, whatever their current values, use apply_volume_options to skip
+    the ones which already have the given values.
 
     Args:
         mnode (str): Node on which cmd has to be executed.
@@ -594,6 +894,69 @@ def set_volume_options(mnode, volname, options):
     return _rc
 
 
+def reset_volume_options_to_baseline(mnode, volname, baseline):
+    """Brings the options of the volume back to a baseline, setting only
+    the options which have changed since the baseline was taken. Options
+    whose baseline value is not settable ('(null)', empty) are reset.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+        volname (str): volume name
+        baseline (dict): options of the volume as returned by
+            get_volume_options(mnode, volname, 'all') earlier.
+
+    Returns:
+        dict: option -> (old value, new value) of the options which were
+            changed. new value is None for the options which were reset.
+            None on failure.
+
+    Example:
+        baseline = get_volume_options(mnode, "testvol")
+        ...
+        reset_volume_options_to_baseline(mnode, "testvol", baseline)
+    """
+    current_options = get_volume_options(mnode, volname, 'all')
+    if current_options is None:
+        g.log.error("Unable to get the options of volume %s", volname)
+        return None
+
+    delta = diff_volume_options(current_options, baseline)
+    to_reset = [option for option in delta
+                if _strip_option_value(delta[option]) in ('', '(null)')]
+
+    _rc = True
+    changed = {}
+    for option in to_reset:
+        del delta[option]
+        if option not in current_options:
+            continue
+        cmd = ("gluster volume reset %s %s --mode=script"
+               % (volname, option))
+        ret, _, _ = g.run(mnode, cmd)
+        if ret != 0:
+            g.log.error("Unable to reset option %s of volume %s",
+                        option, volname)
+            _rc = False
+            continue
+        changed[option] = (current_options[option], None)
+
+    if delta:
+        for option in delta:
+            delta[option] = _strip_option_value(delta[option])
+        delta_changed = _set_volume_options_delta(mnode, volname, delta,
+                                                  current_options)
+        if delta_changed is None:
+            _rc = False
+        else:
+            changed.update(delta_changed)
+
+    if not _rc:
+        return None
+    g.log.info("Reset options of volume %s to baseline: %s", volname,
+               changed)
+    return changed
+
+
 def volume_info(mnode, volname='all'):
     """Executes gluster volume info cli command
 
@@ -672,48 +1035,16 @@ def get_volume_info(mnode, volname='all', xfail=False):
                 .format(volname, out, err)
             )
         return None
-    root = etree.XML(out)
+    try:
+        volumes = parse_xml_records(out, "volInfo/volumes/volume",
+                                    VOLUME_INFO, as_dict=True)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster volume info xml output.")
+        return None
+
     volinfo = {}
-    for volume in root.findall("volInfo/volumes/volume"):
-        for elem in volume.getchildren():
-            if elem.tag == "name":
-                volname = elem.text
-                volinfo[volname] = {}
-            elif elem.tag == "bricks":
-                volinfo[volname]["bricks"] = {}
-                tag_list = [x.tag for x in elem.getchildren() if x]
-                if 'brick' in tag_list:
-                    volinfo[volname]["bricks"]["brick"] = []
-                for el in elem.getchildren():
-                    if el.tag == 'brick':
-                        brick_info_dict = {}
-                        for elmt in el.getchildren():
-                            brick_info_dict[elmt.tag] = elmt.text
-                        (volinfo[volname]["bricks"]["brick"].
-                         append(brick_info_dict))
-
-                    if el.tag == "hotBricks" or el.tag == "coldBricks":
-                        volinfo[volname]["bricks"][el.tag] = {}
-                        volinfo[volname]["bricks"][el.tag]["brick"] = []
-                        for elmt in el.getchildren():
-                            if elmt.tag == 'brick':
-                                brick_info_dict = {}
-                                for el_brk in elmt.getchildren():
-                                    brick_info_dict[el_brk.tag] = el_brk.text
-                                (volinfo[volname]["bricks"][el.tag]["brick"].
-                                 append(brick_info_dict))
-                            else:
-                                volinfo[volname]["bricks"][el.tag][elmt.tag] = elmt.text  # noqa: E501
-            elif elem.tag == "options":
-                volinfo[volname]["options"] = {}
-                for option in elem.findall("option"):
-                    for el in option.getchildren():
-                        if el.tag == "name":
-                            opt = el.text
-                        if el.tag == "value":
-                            volinfo[volname]["options"][opt] = el.text
-            else:
-                volinfo[volname][elem.tag] = elem.text
+    for volume in volumes:
+        volinfo[volume.pop('name')] = volume
 
     g.log.debug("Volume info output: %s"
                 % pformat(volinfo, indent=10))
@@ -721,6 +1052,42 @@ def get_volume_info(mnode, volname='all', xfail=False):
     return volinfo
 
 
+def get_volume_info_records(mnode, volname='all'):
+    """Fetches the volume information as typed records.
+        Counts are ints, 'isArbiter' of bricks is bool and options are dict.
+
+    Args:
+        mnode (str): Node on which cmd has to be executed.
+
+    Kwargs:
+        volname (str): volume name. Defaults to 'all'
+
+    Returns:
+        NoneType: If there are errors
+        dict: volume name -> VolumeInfo record
+
+    Example:
+        >>> volinfo = get_volume_info_records("abc.com", "testvol")
+        >>> volinfo['testvol'].replicaCount
+        3
+        >>> [brick.name for brick in volinfo['testvol'].bricks.brick]
+        ['abc.com:/bricks/brick0/testvol_brick0', ...]
+    """
+    cmd = "gluster volume info %s --xml" % volname
+    ret, out, err = g.run(mnode, cmd, log_level='DEBUG')
+    if ret != 0:
+        g.log.error("Failed to get the volume info of %s: %s", volname, err)
+        return None
+
+    try:
+        volumes = parse_xml_records(out, "volInfo/volumes/volume",
+                                    VOLUME_INFO)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster volume info xml output.")
+        return None
+    return dict((volume.name, volume) for volume in volumes)
+
+
 def volume_sync(mnode, hostname, volname="all"):
     """syncs the volume to the specified host
 
@@ -797,11 +1164,8 @@ def get_volume_list(mnode):
         g.log.error("volume list returned error")
         return None
 
-    root = etree.XML(out)
-    vol_list = []
-    for volume in root.findall("volList"):
-        for elem in volume.getchildren():
-            if elem.tag == "volume":
-                vol_list.append(elem.text)
-
-    return vol_list
+    try:
+        return parse_xml_records(out, "volList/volume", to_str)
+    except etree.ParseError:
+        g.log.error("Failed to parse the gluster volume list xml output.")
+        return None
@@ -0,0 +1,543 @@
+#  Copyright (C) 2018 Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+"""
+    Description: Declarative schemas for the xml output of gluster cli
+        commands and the engine which parses the xml output into typed
+        records.
+
+    A schema maps the child elements of an xml element to either a text
+    converter (leaf elements) or to another element spec (Schema, ListOf,
+    MapOf). Every Schema defines a record type with __slots__, whose
+    attributes are the tags of the schema (with '-' replaced by '_').
+
+    The same walk over the xml can also build plain dicts of strings (the
+    shape the *_ops modules have always returned), which is what the dict
+    returning functions use as their adapter.
+
+    Example:
+        >>> for vol in parse_xml_records(out, 'volInfo/volumes/volume',
+        ...                              VOLUME_INFO):
+        ...     print(vol.name, vol.replicaCount, vol.statusStr)
+"""
+
+try:
+    import xml.etree.cElementTree as etree
+except ImportError:
+    import xml.etree.ElementTree as etree
+
+
+class StringReader(object):
+    """Read-only file like view over a string. Lets iterparse consume the
+    output of a command in chunks without making a copy of it.
+    """
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._data) - self._offset
+        chunk = self._data[self._offset:self._offset + size]
+        self._offset += len(chunk)
+        return chunk
+
+
+# Text converters for leaf elements. All of them return None for the
+# values gluster uses when the value is not known. e.g '-', 'N/A'
+
+def to_str(text):
+    """Returns the text of the element as is."""
+    return text
+
+
+def to_int(text):
+    """Converts the text of the element to int."""
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(text):
+    """Converts the text of the element to float."""
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_bool(text):
+    """Converts 1/0, Yes/No, on/off, enable/disable, true/false to bool."""
+    if text is None:
+        return None
+    value = text.strip().lower()
+    if value in ('1', 'yes', 'on', 'enable', 'true'):
+        return True
+    if value in ('0', 'no', 'off', 'disable', 'false'):
+        return False
+    return None
+
+
+def to_percent(text):
+    """Converts percentage like '80%' to int."""
+    if text is None:
+        return None
+    return to_int(text.strip().rstrip('%'))
+
+
+# Enums of the integer codes used in the xml output.
+
+class VolumeStatus(object):
+    """Values of 'status' in volume info."""
+    CREATED = 0
+    STARTED = 1
+    STOPPED = 2
+
+
+class VolumeType(object):
+    """Values of 'type' in volume info."""
+    DISTRIBUTE = 0
+    STRIPE = 1
+    REPLICATE = 2
+    STRIPE_REPLICATE = 3
+    DISPERSE = 4
+    TIER = 5
+
+
+class DefragStatus(object):
+    """Values of 'status' in rebalance, remove-brick and detach tier
+    status.
+    """
+    NOT_STARTED = 0
+    STARTED = 1
+    STOPPED = 2
+    COMPLETE = 3
+    FAILED = 4
+    LAYOUT_FIX_STARTED = 5
+    LAYOUT_FIX_STOPPED = 6
+    LAYOUT_FIX_COMPLETE = 7
+    LAYOUT_FIX_FAILED = 8
+
+
+class PeerState(object):
+    """Values of 'state' in peer status."""
+    PEER_IN_CLUSTER = 3
+    PEER_REJECTED = 6
+
+
+class Record(object):
+    """Base of the record types defined by Schema. Tags of the element
+    not in the schema are kept as strings in 'extra'.
+    """
+    __slots__ = ('extra',)
+    _fields = ()
+
+    def __init__(self, **values):
+        self.extra = {}
+        for field in self._fields:
+            setattr(self, field, values.get(field))
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                all(getattr(self, f) == getattr(other, f)
+                    for f in self._fields + ('extra',)))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s(%s)" % (
+            type(self).__name__,
+            ', '.join("%s=%r" % (f, getattr(self, f)) for f in self._fields))
+
+
+class Schema(object):
+    """Element spec which maps the child elements of an element to the
+    attributes of a record.
+
+    Args:
+        name (str): name of the record type.
+        fields (dict): tag of the child element -> text converter or
+            element spec (Schema, ListOf, MapOf).
+
+    Kwargs:
+        repeated (dict): tag of child elements which repeat directly under
+            the element -> element spec or text converter. Collected as a
+            list under the tag. e.g 'node' under 'volRebalance'
+        always (tuple): tags of 'repeated' which are present (as empty
+            list) even when there are no such child elements.
+    """
+    def __init__(self, name, fields, repeated=None, always=()):
+        self.fields = dict(fields)
+        self.repeated = dict(repeated or {})
+        self.always = tuple(always)
+        self._attrs = dict((tag, tag.replace('-', '_'))
+                           for tag in list(self.fields) + list(self.repeated))
+        attrs = tuple(sorted(self._attrs.values()))
+        self.record_type = type(name, (Record,),
+                                {'__slots__': attrs, '_fields': attrs})
+
+    def build(self, elem, as_dict=False):
+        """Builds the record (or dict of strings) from the element."""
+        values = {}
+        for tag in self.always:
+            values[tag] = []
+        extra = {}
+        for child in elem:
+            tag = child.tag
+            if tag in self.repeated:
+                values.setdefault(tag, []).append(
+                    _build(self.repeated[tag], child, as_dict))
+            elif tag in self.fields:
+                values[tag] = _build(self.fields[tag], child, as_dict)
+            elif as_dict:
+                values[tag] = child.text
+            else:
+                extra[tag] = child.text
+
+        if as_dict:
+            return values
+        record = self.record_type(
+            **dict((self._attrs[tag], value)
+                   for tag, value in values.items()))
+        record.extra = extra
+        return record
+
+
+class ListOf(object):
+    """Element spec of a wrapper element holding repeated items.
+    e.g <hostnames><hostname>..</hostname>..</hostnames>
+
+    Args:
+        item_tag (str): tag of the items.
+        spec: element spec or text converter of the items.
+    """
+    def __init__(self, item_tag, spec):
+        self.item_tag = item_tag
+        self.spec = spec
+
+    def build(self, elem, as_dict=False):
+        return [_build(self.spec, item, as_dict)
+                for item in elem if item.tag == self.item_tag]
+
+
+class MapOf(object):
+    """Element spec of a wrapper element holding name, value pairs.
+    e.g <options><option><name>..</name><value>..</value></option></options>
+
+    Args:
+        item_tag (str): tag of the items.
+        key_tag (str): tag of the key in the item.
+        value_tag (str): tag of the value in the item.
+    """
+    def __init__(self, item_tag, key_tag, value_tag):
+        self.item_tag = item_tag
+        self.key_tag = key_tag
+        self.value_tag = value_tag
+
+    def build(self, elem, as_dict=False):
+        mapping = {}
+        for item in elem:
+            if item.tag == self.item_tag:
+                mapping[item.findtext(self.key_tag)] = (
+                    item.findtext(self.value_tag))
+        return mapping
+
+
+def _build(spec, elem, as_dict):
+    if hasattr(spec, 'build'):
+        return spec.build(elem, as_dict)
+    if as_dict:
+        return elem.text
+    return spec(elem.text)
+
+
+def iter_xml_records(xml_output, path, spec, as_dict=False):
+    """Lazily parses the xml output and yields a record for each element
+    at the path. Elements are freed once their record is built.
+
+    Args:
+        xml_output (str): xml output of a gluster cli command.
+        path (str): path of the elements relative to the root element.
+            e.g 'volInfo/volumes/volume'
+        spec: element spec (or text converter) of the elements.
+
+    Kwargs:
+        as_dict (bool): build dicts of strings instead of records.
+
+    Yields:
+        record (or dict) of every element at the path.
+
+    Raises:
+        etree.ParseError: if the xml output can not be parsed.
+    """
+    path = path.split('/')
+    tags, elems = [], []
+    for event, elem in etree.iterparse(StringReader(xml_output),
+                                       events=('start', 'end')):
+        if event == 'start':
+            tags.append(elem.tag)
+            elems.append(elem)
+            continue
+
+        if tags[1:] == path:
+            yield _build(spec, elem, as_dict)
+            elem.clear()
+            if len(elems) > 1:
+                elems[-2].remove(elem)
+        tags.pop()
+        elems.pop()
+
+
+def parse_xml_records(xml_output, path, spec, as_dict=False):
+    """Same as iter_xml_records, but returns the list of records."""
+    return list(iter_xml_records(xml_output, path, spec, as_dict))
+
+
+def record_to_dict(record):
+    """Converts the record (and the records in it) back to dict, with the
+    typed values. Tags not in the schema are included as strings.
+    """
+    if isinstance(record, list):
+        return [record_to_dict(item) for item in record]
+    if isinstance(record, dict):
+        return dict((key, record_to_dict(value))
+                    for key, value in record.items())
+    if not isinstance(record, Record):
+        return record
+    values = dict(record.extra)
+    for field in record._fields:
+        values[field] = record_to_dict(getattr(record, field))
+    return values
+
+
+# Schemas of the gluster cli xml outputs.
+
+_BRICK = Schema('Brick', {
+    'name': to_str,
+    'hostUuid': to_str,
+    'isArbiter': to_bool,
+})
+
+_TIER_BRICKS = Schema('TierBricks', {
+    'hotBrickType': to_str,
+    'coldBrickType': to_str,
+    'hotbrickCount': to_int,
+    'hotreplicaCount': to_int,
+    'coldbrickCount': to_int,
+    'coldreplicaCount': to_int,
+    'colddisperseCount': to_int,
+    'coldarbiterCount': to_int,
+    'numberOfBricks': to_int,
+}, repeated={'brick': _BRICK}, always=('brick',))
+
+VOLUME_INFO = Schema('VolumeInfo', {
+    'name': to_str,
+    'id': to_str,
+    'status': to_int,
+    'statusStr': to_str,
+    'snapshotCount': to_int,
+    'brickCount': to_int,
+    'distCount': to_int,
+    'stripeCount': to_int,
+    'replicaCount': to_int,
+    'arbiterCount': to_int,
+    'disperseCount': to_int,
+    'redundancyCount': to_int,
+    'type': to_int,
+    'typeStr': to_str,
+    'transport': to_int,
+    'optCount': to_int,
+    'bricks': Schema('VolumeBricks', {
+        'hotBricks': _TIER_BRICKS,
+        'coldBricks': _TIER_BRICKS,
+    }, repeated={'brick': _BRICK}),
+    'options': MapOf('option', 'name', 'value'),
+})
+
+_TASK = Schema('Task', {
+    'type': to_str,
+    'id': to_str,
+    'status': to_int,
+    'statusStr': to_str,
+})
+
+VOLUME_STATUS = Schema('VolumeStatus', {
+    'volName': to_str,
+    'nodeCount': to_int,
+    'tasks': Schema('Tasks', {}, repeated={'task': _TASK}, always=('task',)),
+}, repeated={'node': Schema('VolumeStatusNode', {
+    'hostname': to_str,
+    'path': to_str,
+    'peerid': to_str,
+    'status': to_bool,
+    'port': to_int,
+    'ports': Schema('Ports', {'tcp': to_int, 'rdma': to_int}),
+    'pid': to_int,
+})}, always=('node',))
+
+PEER = Schema('Peer', {
+    'uuid': to_str,
+    'hostname': to_str,
+    'hostnames': ListOf('hostname', to_str),
+    'connected': to_bool,
+    'state': to_int,
+    'stateStr': to_str,
+})
+
+_DEFRAG_FIELDS = {
+    'files': to_int,
+    'size': to_int,
+    'lookups': to_int,
+    'failures': to_int,
+    'skipped': to_int,
+    'status': to_int,
+    'statusStr': to_str,
+    'runtime': to_float,
+}
+
+_DEFRAG_NODE_FIELDS = dict(_DEFRAG_FIELDS)
+_DEFRAG_NODE_FIELDS.update({
+    'nodeName': to_str,
+    'id': to_str,
+    'promotedFiles': to_int,
+    'demotedFiles': to_int,
+})
+
+REBALANCE_STATUS = Schema('RebalanceStatus', {
+    'task-id': to_str,
+    'op': to_int,
+    'nodeCount': to_int,
+    'aggregate': Schema('RebalanceAggregate', _DEFRAG_FIELDS),
+}, repeated={'node': Schema('RebalanceNode', _DEFRAG_NODE_FIELDS)},
+    always=('node',))
+
+SNAP_STATUS = Schema('SnapStatus', {
+    'name': to_str,
+    'uuid': to_str,
+    'volCount': to_int,
+    'volume': Schema('SnapStatusVolume', {
+        'brickCount': to_int,
+    }, repeated={'brick': Schema('SnapBrick', {
+        'path': to_str,
+        'volumeGroup': to_str,
+        'snapshotBrickPath': to_str,
+        'pid': to_int,
+        'lvUsage': to_float,
+        'lvSize': to_str,
+    })}, always=('brick',)),
+})
+
+_SNAP_ORIGIN_VOLUME = Schema('SnapOriginVolume', {
+    'name': to_str,
+    'snapCount': to_int,
+    'snapRemaining': to_int,
+})
+
+SNAP_INFO = Schema('SnapInfo', {
+    'name': to_str,
+    'uuid': to_str,
+    'description': to_str,
+    'createTime': to_str,
+    'volCount': to_int,
+    'snapVolume': Schema('SnapVolume', {
+        'name': to_str,
+        'status': to_str,
+        'originVolume': _SNAP_ORIGIN_VOLUME,
+    }),
+})
+
+SNAP_VOLUME_INFO = Schema('SnapVolumeInfo', {
+    'count': to_int,
+    'originVolume': _SNAP_ORIGIN_VOLUME,
+    'snapshots': ListOf('snapshot', SNAP_INFO),
+})
+
+SNAP_CONFIG = Schema('SnapConfig', {
+    'systemConfig': Schema('SnapSystemConfig', {
+        'hardLimit': to_int,
+        'softLimit': to_percent,
+        'autoDelete': to_bool,
+        'activateOnCreate': to_bool,
+    }),
+    'volumeConfig': ListOf('volume', Schema('SnapVolumeConfig', {
+        'name': to_str,
+        'hardLimit': to_int,
+        'effectiveHardLimit': to_int,
+        'softLimit': to_int,
+    })),
+})
+
+QUOTA_LIMIT = Schema('QuotaLimit', {
+    'path': to_str,
+    'hard_limit': to_int,
+    'soft_limit_percent': to_percent,
+    'soft_limit_value': to_int,
+    'used_space': to_int,
+    'avail_space': to_int,
+    'sl_exceeded': to_bool,
+    'hl_exceeded': to_bool,
+})
+
+QUOTA_OBJECTS_LIMIT = Schema('QuotaObjectsLimit', {
+    'path': to_str,
+    'hard_limit': to_int,
+    'soft_limit_percent': to_percent,
+    'soft_limit_value': to_int,
+    'file_count': to_int,
+    'dir_count': to_int,
+    'available': to_int,
+    'sl_exceeded': to_bool,
+    'hl_exceeded': to_bool,
+})
+
+_PROFILE_STATS = Schema('ProfileStats', {
+    'interval': to_int,
+    'duration': to_int,
+    'totalRead': to_int,
+    'totalWrite': to_int,
+    'blockStats': ListOf('block', Schema('ProfileBlockStats', {
+        'size': to_int,
+        'reads': to_int,
+        'writes': to_int,
+    })),
+    'fopStats': ListOf('fop', Schema('ProfileFopStats', {
+        'name': to_str,
+        'hits': to_int,
+        'avgLatency': to_float,
+        'minLatency': to_float,
+        'maxLatency': to_float,
+    })),
+})
+
+PROFILE_INFO = Schema('ProfileInfo', {
+    'volname': to_str,
+    'profileOp': to_int,
+    'brickCount': to_int,
+}, repeated={'brick': Schema('ProfileBrick', {
+    'brickName': to_str,
+    'cumulativeStats': _PROFILE_STATS,
+    'intervalStats': _PROFILE_STATS,
+})}, always=('brick',))
+
+HEAL_INFO_BRICK = Schema('HealInfoBrick', {
+    'name': to_str,
+    'status': to_str,
+    'numberOfEntries': to_int,
+})
@@ -44,6 +44,7 @@ setup(
         'Topic :: Software Development :: Testing'
     ],
     install_requires=['glusto'],
+    extras_require={'profile': ['numpy']},
     dependency_links=['http://github.com/loadtheaccumulator/glusto/tarball/master#egg=glusto'],
     namespace_packages = ['glustolibs']
 )
@@ -17,11 +17,32 @@
 """
     Description: Helper library for io modules.
 """
+import gzip
+import heapq
 import os
 import subprocess
+import tempfile
+import threading
 from glusto.core import Glusto as g
 from glustolibs.gluster.mount_ops import GlusterMount
+from itertools import count
 from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+TREE_SCAN_SCRIPT = "/usr/share/glustolibs/io/scripts/tree_scan.py"
+
+# Fields of the records of the namespace dumps of tree_scan.py
+NAMESPACE_FIELDS = ('type', 'mode', 'uid', 'gid', 'size')
+
+# Dir of the manifests of the incremental tree digests, on the clients
+TREE_DIGEST_MANIFEST_DIR = "/var/tmp/glustolibs/tree_digests"
+
+# Unique suffixes of the remote dumps of concurrent scans
+_tree_scan_ids = count()
+
+# Nodes to which tree_scan.py has been uploaded in this session
+_tree_scan_nodes = set()
+_tree_scan_nodes_lock = threading.Lock()
 
 
 def collect_mounts_arequal(mounts):
@@ -715,28 +736,702 @@ def compare_dir_structure_mount_with_brick(mnthost, mntloc, brick_list, type):
         True if directory structure are same
         False if structure is not same
     """
+    field = {0: 'uid', 1: 'gid', 2: 'mode'}[type]
+    diffs = compare_namespaces((mnthost, mntloc), brick_list, fields=(field,),
+                               types='d', max_diffs=10)
+    if diffs is None:
+        return False
+    for brick, brick_diffs in diffs.items():
+        for relpath, mnt_meta, brick_meta in brick_diffs:
+            g.log.error("Directory %s differs on the mount (%s) and the "
+                        "brick %s (%s)", relpath.decode('utf-8', 'replace'),
+                        mnt_meta, brick,
+                        brick_meta)
+    return not any(diffs.values())
+
+
+def _upload_tree_scan_script(nodes):
+    """Uploads tree_scan.py to the nodes which don't have it yet in this
+    session, all the nodes concurrently.
+
+    Returns:
+        bool: True if all the nodes have the script, False otherwise.
+    """
+    with _tree_scan_nodes_lock:
+        missing = [node for node in nodes if node not in _tree_scan_nodes]
+    if not missing:
+        return True
 
-    statformat = ''
-    if type == 0:
-        statformat = '%U'
-    if type == 1:
-        statformat = '%G'
-    if type == 2:
-        statformat = '%A'
-
-    command = ("find %s -mindepth 1 -type d | xargs -r stat -c '%s'"
-               % (mntloc, statformat))
-    rcode, rout, _ = g.run(mnthost, command)
-    all_dir_mnt_perm = rout.strip().split('\n')
-
-    for brick in brick_list:
-        brick_node, brick_path = brick.split(":")
-        command = ("find %s -mindepth 1 -type d | grep -ve \".glusterfs\" | "
-                   "xargs -r stat -c '%s'" % (brick_path, statformat))
-        rcode, rout, _ = g.run(brick_node, command)
-        all_brick_dir_perm = rout.strip().split('\n')
-        retval = cmp(all_dir_mnt_perm, all_brick_dir_perm)
-        if retval != 0:
+    upload_dir = os.path.dirname(TREE_SCAN_SCRIPT)
+    results = g.run_parallel(missing, "mkdir -p %s" % upload_dir)
+
+    def _upload(node):
+        ret, _, err = results[node]
+        if ret != 0:
+            g.log.error("Failed to create %s on %s: %s", upload_dir, node,
+                        err)
             return False
+        try:
+            g.upload(node, TREE_SCAN_SCRIPT, TREE_SCAN_SCRIPT)
+        except Exception as err:
+            g.log.error("Failed to upload %s to %s: %s", TREE_SCAN_SCRIPT,
+                        node, err)
+            return False
+        return True
+
+    pool = ThreadPool(len(missing))
+    try:
+        uploaded = pool.map(_upload, missing)
+    finally:
+        pool.close()
+        pool.join()
+    with _tree_scan_nodes_lock:
+        _tree_scan_nodes.update(node for node, ret in zip(missing, uploaded)
+                                if ret)
+    return all(uploaded)
+
+
+def run_tree_scans(scans, dest_dir=None, partial=False):
+    """Runs tree_scan.py sub commands on the nodes concurrently and
+    downloads the dumps they write, concurrently. The script is uploaded
+    to a node only once per session.
+
+    Args:
+        scans (list): list of (node, args) or (node, args, files) tuples,
+            args being the arguments of tree_scan.py other than the output
+            file, e.g. ('server1', 'namespace --brick /bricks/brick0/vol').
+            files (list) are paths uploaded to the node and passed to the
+            sub command with --files-from.
+
+    Kwargs:
+        dest_dir (str): local dir to save the dumps. Defaults to the
+            temporary dir.
+        partial (bool): True to return the dumps of the scans which
+            succeeded even if others failed. Defaults to False.
+
+    Returns:
+        list: local paths of the dumps, in the order of scans. With
+            partial, None for the scans which failed. None if any scan
+            failed (the dumps downloaded are then deleted), or if the
+            script could not be uploaded.
+    """
+    nodes = list(set(scan[0] for scan in scans))
+    if not _upload_tree_scan_script(nodes):
+        g.log.error("Failed to upload %s to %s", TREE_SCAN_SCRIPT, nodes)
+        return None
+    if dest_dir is None:
+        dest_dir = tempfile.gettempdir()
+
+    procs = []
+    for scan in scans:
+        node, args = scan[0], scan[1]
+        remote_prefix = "/tmp/tree_scan_%d_%d" % (os.getpid(),
+                                                  next(_tree_scan_ids))
+        cleanup = [remote_prefix + ".gz"]
+        if len(scan) > 2:
+            files_from = _upload_files_list(node, scan[2],
+                                            remote_prefix + ".files")
+            if files_from is None:
+                procs.append((node, cleanup, None))
+                continue
+            cleanup.append(files_from)
+            args = "%s --files-from %s" % (args, files_from)
+        cmd = ("python %s %s -o %s" %
+               (TREE_SCAN_SCRIPT, args, cleanup[0]))
+        procs.append((node, cleanup, g.run_async(node, cmd)))
+
+    def _download(index):
+        node, cleanup, proc = procs[index]
+        if proc is None:
+            return None
+        ret, _, err = proc.async_communicate()
+        local_dump = None
+        if ret != 0:
+            g.log.error("tree_scan.py %s failed on %s: %s",
+                        scans[index][1], node, err)
+        else:
+            local_dump = os.path.join(dest_dir, "%s_%s" % (
+                node, os.path.basename(cleanup[0])))
+            try:
+                g.download(node, cleanup[0], local_dump)
+            except Exception as err:
+                g.log.error("Failed to download %s from %s: %s",
+                            cleanup[0], node, err)
+                local_dump = None
+        g.run(node, "rm -f %s" % ' '.join(cleanup), log_level='DEBUG')
+        return local_dump
+
+    if not procs:
+        return []
+    pool = ThreadPool(len(procs))
+    try:
+        dumps = pool.map(_download, range(len(procs)))
+    finally:
+        pool.close()
+        pool.join()
+    if None in dumps and not partial:
+        for dump in dumps:
+            if dump is not None:
+                os.remove(dump)
+        return None
+    return dumps
+
+
+def _upload_files_list(node, files, remote_path):
+    # Paths are NUL delimited, as they may have any other character
+    fd, local_path = tempfile.mkstemp(prefix='tree_scan_files_')
+    try:
+        with os.fdopen(fd, 'wb') as files_list:
+            for path in files:
+                if not isinstance(path, bytes):
+                    path = path.encode('utf-8')
+                files_list.write(path + b'\0')
+        g.upload(node, local_path, remote_path)
+    except Exception as err:
+        g.log.error("Failed to upload the list of files to %s: %s",
+                    node, err)
+        return None
+    finally:
+        os.remove(local_path)
+    return remote_path
+
+
+def iter_tree_scan_dump(path, fields=2):
+    """Reads a dump of tree_scan.py without loading it in memory.
+
+    Args:
+        path (str): local path of the dump.
+
+    Kwargs:
+        fields (int): number of NUL terminated fields per record.
+            Defaults to 2 (path and metadata).
+
+    Yields:
+        tuple: the fields (bytes) of every record.
+    """
+    dump = gzip.open(path, 'rb')
+    try:
+        pending = b''
+        record = []
+        while True:
+            chunk = dump.read(1 << 16)
+            if not chunk:
+                break
+            parts = (pending + chunk).split(b'\0')
+            pending = parts.pop()
+            for part in parts:
+                record.append(part)
+                if len(record) == fields:
+                    yield tuple(record)
+                    record = []
+    finally:
+        dump.close()
 
-    return True
+
+def _namespace_key(relpath):
+    # Order of the records of tree_scan.py: component wise, root first
+    return [] if relpath == b'.' else relpath.split(b'/')
+
+
+def iter_merged_tree_scan_dumps(dumps):
+    """Merges dumps of the same tree_scan.py sub command taken from several
+    trees (e.g the bricks of a volume), grouping the records by path, so
+    that they can be compared in one pass with only one record of every
+    dump in memory.
+
+    Args:
+        dumps (list): local paths of the dumps.
+
+    Yields:
+        tuple: (relpath, list of the metadata (bytes) of the path in every
+            dump, None for the dumps without the path)
+    """
+    def _keyed(index, dump):
+        for relpath, meta in iter_tree_scan_dump(dump):
+            yield _namespace_key(relpath), index, relpath, meta
+
+    group_key, group_relpath, group = None, None, None
+    for key, index, relpath, meta in heapq.merge(
+            *[_keyed(index, dump) for index, dump in enumerate(dumps)]):
+        if key != group_key:
+            if group is not None:
+                yield group_relpath, group
+            group_key, group_relpath = key, relpath
+            group = [None] * len(dumps)
+        group[index] = meta
+    if group is not None:
+        yield group_relpath, group
+
+
+def iter_namespace_dump(path):
+    """Reads a namespace dump of tree_scan.py.
+
+    Args:
+        path (str): local path of the dump.
+
+    Yields:
+        tuple: (relpath, metadata) with relpath (bytes) relative to the
+            scanned dir and metadata a tuple of NAMESPACE_FIELDS values
+            (strings), or ('D', digest) for the per directory digests.
+    """
+    for relpath, meta in iter_tree_scan_dump(path):
+        yield relpath, tuple(meta.decode('ascii').split(' '))
+
+
+def diff_namespace_dumps(left, right, fields=NAMESPACE_FIELDS):
+    """Merge compares two ordered namespace record streams.
+
+    Args:
+        left (iterable): (relpath, metadata) records, as yielded by
+            iter_namespace_dump.
+        right (iterable): same as left.
+
+    Kwargs:
+        fields (tuple): NAMESPACE_FIELDS compared. Digest records are
+            compared as a whole.
+
+    Yields:
+        tuple: (relpath, left metadata, right metadata) of the entries
+            which differ, metadata being None for the side missing the
+            entry.
+    """
+    indexes = [NAMESPACE_FIELDS.index(field) for field in fields]
+
+    def _project(meta):
+        if meta[0] == 'D':
+            return meta
+        return tuple(meta[index] for index in indexes)
+
+    left, right = iter(left), iter(right)
+    left_rec, right_rec = next(left, None), next(right, None)
+    while left_rec is not None or right_rec is not None:
+        if right_rec is None or (left_rec is not None and
+                                 _namespace_key(left_rec[0]) <
+                                 _namespace_key(right_rec[0])):
+            yield left_rec[0], left_rec[1], None
+            left_rec = next(left, None)
+        elif left_rec is None or (_namespace_key(right_rec[0]) <
+                                  _namespace_key(left_rec[0])):
+            yield right_rec[0], None, right_rec[1]
+            right_rec = next(right, None)
+        else:
+            if _project(left_rec[1]) != _project(right_rec[1]):
+                yield left_rec[0], left_rec[1], right_rec[1]
+            left_rec, right_rec = next(left, None), next(right, None)
+
+
+def _get_namespace_scan_args(path, brick, types, per_dir_digest):
+    # .trashcan is skipped on mounts too, as it is on bricks
+    args = "namespace"
+    if brick:
+        args += " --brick"
+    else:
+        args += " --skip-root-internal"
+    if types:
+        args += " -t %s" % types
+    if per_dir_digest:
+        args += " --per-dir-digest"
+    return "%s %s" % (args, path)
+
+
+def compare_namespaces(reference, others, fields=NAMESPACE_FIELDS,
+                       types=None, per_dir_digest=False, max_diffs=100):
+    """Compares the namespace of a directory tree with other trees (a
+    mount with its bricks, or replica bricks). Every node dumps its tree
+    into a compressed ordered stream, the dumps are downloaded
+    concurrently and merge compared, so the memory used does not grow
+    with the number of entries.
+
+    Args:
+        reference (tuple|str): (node, path) or '<node>:<path>' of the
+            reference tree. A mount when it is not a brick of others.
+        others (list): (node, path) tuples or '<node>:<path>' bricks to
+            compare with the reference.
+
+    Kwargs:
+        fields (tuple): NAMESPACE_FIELDS to compare. Sizes of directories
+            are never compared.
+        types (str): comma separated entry types to compare (d, f, l, o).
+            All when None.
+        per_dir_digest (bool): True to compare a digest of every directory
+            instead of every entry; differences are then reported per
+            directory.
+        max_diffs (int): maximum number of differences reported per tree.
+            Defaults to 100.
+
+    Returns:
+        dict: other tree ('<node>:<path>') -> list of (relpath, reference
+            metadata, other metadata) differences. None on failure.
+
+    Notes:
+        Bricks (given as '<node>:<path>') are scanned without .glusterfs,
+        .trashcan and the DHT linkto files, the other trees without
+        .trashcan. A distribute brick holds only
+        a part of the files, so files are to be compared with
+        compare_mount_namespace_with_bricks.
+    """
+    trees = []
+    for tree in [reference] + list(others):
+        if isinstance(tree, tuple):
+            trees.append((tree[0], tree[1], False))
+        else:
+            node, path = tree.split(':', 1)
+            trees.append((node, path, True))
+
+    dumps = run_tree_scans([(node, _get_namespace_scan_args(
+        path, brick, types, per_dir_digest)) for node, path, brick in trees])
+    if dumps is None:
+        return None
+
+    result = {}
+    try:
+        for (node, path, _), dump in zip(trees[1:], dumps[1:]):
+            diffs = []
+            for diff in diff_namespace_dumps(
+                    iter_namespace_dump(dumps[0]),
+                    iter_namespace_dump(dump), fields):
+                diffs.append(diff)
+                if len(diffs) >= max_diffs:
+                    break
+            result["%s:%s" % (node, path)] = diffs
+    finally:
+        for dump in dumps:
+            os.remove(dump)
+    return result
+
+
+def compare_mount_namespace_with_bricks(mnthost, mntloc, brick_list,
+                                        fields=NAMESPACE_FIELDS,
+                                        max_diffs=100):
+    """Compares the namespace seen on a mount with the bricks: every
+    directory must be on every brick, and every other entry on at least
+    one brick (and only entries of the mount on the bricks).
+
+    Args:
+        mnthost (str): hostname or ip of mnt system
+        mntloc (str) : mount location of gluster file system
+        brick_list (list) : list of all brick ip's with brick path
+
+    Kwargs:
+        fields (tuple): NAMESPACE_FIELDS to compare. 'size' should not be
+            compared for dispersed volumes.
+        max_diffs (int): maximum number of differences reported per brick
+            for the directories and in all for the files.
+            Defaults to 100.
+
+    Returns:
+        dict: {'dirs': brick -> list of (relpath, mount metadata, brick
+            metadata) differences of the directories, 'files': list of
+            (relpath, mount metadata, brick metadata) differences of the
+            other entries against the union of the bricks}. No differences
+            means the namespaces match. None on failure.
+    """
+    trees = [(mnthost, mntloc, False)]
+    trees.extend(tuple(brick.split(':', 1)) + (True,)
+                 for brick in brick_list)
+    dumps = run_tree_scans([(node, _get_namespace_scan_args(
+        path, brick, None, False)) for node, path, brick in trees])
+    if dumps is None:
+        return None
+
+    def _entries(dump, dirs):
+        for relpath, meta in iter_namespace_dump(dump):
+            if (meta[0] == 'd') == dirs:
+                yield relpath, meta
+
+    def _union(streams):
+        # Replicas hold the same entries, the first of equal paths is kept
+        last = None
+        for key, relpath, meta in heapq.merge(*[
+                ((_namespace_key(relpath), relpath, meta)
+                 for relpath, meta in stream) for stream in streams]):
+            if key != last:
+                last = key
+                yield relpath, meta
+
+    result = {'dirs': {}, 'files': []}
+    try:
+        for brick, dump in zip(brick_list, dumps[1:]):
+            diffs = []
+            for diff in diff_namespace_dumps(_entries(dumps[0], True),
+                                             _entries(dump, True), fields):
+                diffs.append(diff)
+                if len(diffs) >= max_diffs:
+                    break
+            result['dirs'][brick] = diffs
+
+        for diff in diff_namespace_dumps(
+                _entries(dumps[0], False),
+                _union([_entries(dump, False) for dump in dumps[1:]]),
+                fields):
+            result['files'].append(diff)
+            if len(result['files']) >= max_diffs:
+                break
+    finally:
+        for dump in dumps:
+            os.remove(dump)
+    return result
+
+
+def collect_checksums(node_files, algorithm='sha256', jobs=None):
+    """Computes the checksums of lists of files on their nodes. The lists
+    are uploaded to the nodes and the files hashed with a pool of workers
+    per node, all the nodes concurrently.
+
+    Args:
+        node_files (dict): node -> list of absolute paths of files.
+
+    Kwargs:
+        algorithm (str): hash algorithm, as named by hashlib (md5, sha1,
+            sha256, ...). Defaults to sha256.
+        jobs (int): number of files hashed in parallel on every node.
+            Defaults to the number of cpus of the node.
+
+    Returns:
+        dict: node -> {path: hex digest}. None on failure, including when a
+            file could not be read.
+
+    Example:
+        collect_checksums({'abc.com': [file1, file2]}, 'md5')
+    """
+    args = "checksum -a %s" % algorithm
+    if jobs:
+        args += " -j %d" % jobs
+    nodes = list(node_files)
+    dumps = run_tree_scans([(node, args, node_files[node])
+                            for node in nodes])
+    if dumps is None:
+        g.log.error("Failed to compute %s checksums on %s", algorithm,
+                    nodes)
+        return None
+
+    checksums = {}
+    for node, dump in zip(nodes, dumps):
+        checksums[node] = dict(
+            (path.decode('utf-8'), digest.decode('ascii'))
+            for path, digest in iter_tree_scan_dump(dump))
+        os.remove(dump)
+    return checksums
+
+
+def iter_merkle_dump(path):
+    """Reads a merkle checksum dump of tree_scan.py.
+
+    Args:
+        path (str): local path of the dump.
+
+    Yields:
+        tuple: (relpath, (type, digest)) with relpath (bytes) relative to
+            the scanned dir ('.' for the dir itself), type one of d, f, l,
+            o and digest the content digest of the files, the link target
+            digest of the symlinks or the Merkle digest of the directories.
+            Dumps taken with a manifest have (type, digest, size,
+            rehashed) instead.
+    """
+    for relpath, meta in iter_tree_scan_dump(path):
+        yield relpath, tuple(meta.decode('ascii').split(' '))
+
+
+def diff_merkle_dumps(left, right):
+    """Compares two merkle checksum dumps, descending only into the
+    directories whose digests differ. Only the directory digests are kept
+    in memory.
+
+    Args:
+        left (str): local path of the dump.
+        right (str): same as left.
+
+    Yields:
+        tuple: (relpath, left (type, digest), right (type, digest)) of the
+            entries which differ, None for the side missing the entry. A
+            directory missing on one side is reported alone, without its
+            entries.
+    """
+    def _dirs(dump):
+        return dict((relpath, meta[1])
+                    for relpath, meta in iter_merkle_dump(dump)
+                    if meta[0] == 'd')
+
+    left_dirs, right_dirs = _dirs(left), _dirs(right)
+    # Directories on both sides with different digests, whose entries
+    # are compared. A difference changes the digests of all the parents.
+    differing = set(relpath for relpath, digest in left_dirs.items()
+                    if relpath in right_dirs and
+                    right_dirs[relpath] != digest)
+    if not differing:
+        return
+
+    for relpath, metas in iter_merged_tree_scan_dumps([left, right]):
+        if relpath == b'.':
+            continue
+        if (os.path.dirname(relpath) or b'.') not in differing:
+            continue
+        metas = [tuple(meta.decode('ascii').split(' ')[:2]) if meta
+                 else None for meta in metas]
+        if None not in metas and (metas[0] == metas[1] or
+                                  metas[0][0] == metas[1][0] == 'd'):
+            continue
+        yield relpath, metas[0], metas[1]
+
+
+def compare_merkle_trees(reference, others, algorithm='sha256', jobs=None,
+                         max_diffs=100):
+    """Compares the content of a directory tree with other trees (mount
+    with mount, or replica bricks). Every node hashes its tree with a pool
+    of workers and dumps the digests of the files and the Merkle digests of
+    the directories, then the dumps are compared descending only into the
+    directories which differ.
+
+    Args:
+        reference (tuple|str): (node, path) or '<node>:<path>' of the
+            reference tree. A mount when it is not a brick of others.
+        others (list): (node, path) tuples or '<node>:<path>' bricks to
+            compare with the reference.
+
+    Kwargs:
+        algorithm (str): hash algorithm, as named by hashlib.
+            Defaults to sha256.
+        jobs (int): number of files hashed in parallel on every node.
+            Defaults to the number of cpus of the node.
+        max_diffs (int): maximum number of differences reported per tree.
+            Defaults to 100.
+
+    Returns:
+        dict: other tree ('<node>:<path>') -> list of (relpath, reference
+            (type, digest), other (type, digest)) differences. Empty lists
+            mean the trees match. None on failure.
+
+    Notes:
+        Bricks (given as '<node>:<path>') are scanned without .glusterfs,
+        .trashcan and the DHT linkto files, and are to be compared with
+        bricks of the same replica set.
+
+    Example:
+        compare_merkle_trees(('client1', '/mnt/glusterfs'),
+                             [('client2', '/mnt/glusterfs')])
+    """
+    trees = []
+    for tree in [reference] + list(others):
+        if isinstance(tree, tuple):
+            trees.append((tree[0], tree[1], False))
+        else:
+            node, path = tree.split(':', 1)
+            trees.append((node, path, True))
+
+    args = "checksum --merkle -a %s" % algorithm
+    if jobs:
+        args += " -j %d" % jobs
+    dumps = run_tree_scans([
+        (node, "%s%s %s" % (args, " --brick" if brick else "", path))
+        for node, path, brick in trees])
+    if dumps is None:
+        return None
+
+    result = {}
+    try:
+        for (node, path, _), dump in zip(trees[1:], dumps[1:]):
+            diffs = []
+            for diff in diff_merkle_dumps(dumps[0], dump):
+                diffs.append(diff)
+                if len(diffs) >= max_diffs:
+                    break
+            result["%s:%s" % (node, path)] = diffs
+    finally:
+        for dump in dumps:
+            os.remove(dump)
+    return result
+
+
+def collect_mounts_tree_digest(mounts, full=False, algorithm='sha256',
+                               jobs=None,
+                               manifest_dir=TREE_DIGEST_MANIFEST_DIR):
+    """Collects an arequal like digest of the tree of all the mounts,
+    incrementally. A manifest of the files (size, mtime, ctime, inode and
+    content digest) is kept on the client of every mount, and only the
+    files whose metadata changed since the previous call are read again;
+    the digests of the others are combined into the Merkle digests of
+    the directories as they are.
+
+    Args:
+        mounts (list): List of all GlusterMount objs.
+
+    Kwargs:
+        full (bool): True to read all the files again, ignoring the
+            manifests, e.g. for a final verification. Defaults to False.
+        algorithm (str): hash algorithm, as named by hashlib.
+            Defaults to sha256.
+        jobs (int): number of files hashed in parallel on every client.
+            Defaults to the number of cpus of the client.
+        manifest_dir (str): dir of the manifests on the clients.
+
+    Returns:
+        tuple(bool, list):
+            On success returns (True, list of the digests of each mount)
+            On failure returns (False, list of the digests of each mount)
+            The digest of a mount is None when it failed, or a dict with
+            the keys:
+            'checksum': Merkle digest of the whole tree, equal for mounts
+                with the same names, types and contents,
+            'dirs', 'files', 'symlinks', 'others': entry counts,
+            'bytes': total size of the files,
+            'rehashed_files', 'rehashed_bytes': number and size of the
+                files read again by this call.
+
+    Example:
+        _, digests = collect_mounts_tree_digest(mounts)
+        # heal ...
+        _, after = collect_mounts_tree_digest(mounts)
+        assert digests[0]['checksum'] == after[0]['checksum']
+    """
+    if isinstance(mounts, GlusterMount):
+        mounts = [mounts]
+
+    scans = []
+    for mount_obj in mounts:
+        manifest = os.path.join(manifest_dir, "%s.%s.gz" % (
+            mount_obj.mountpoint.strip('/').replace('/', '_') or 'root',
+            algorithm))
+        args = "checksum --merkle -a %s --manifest %s" % (algorithm,
+                                                          manifest)
+        if full:
+            args += " --full"
+        if jobs:
+            args += " -j %d" % jobs
+        scans.append((mount_obj.client_system,
+                      "%s %s" % (args, mount_obj.mountpoint)))
+    dumps = run_tree_scans(scans, partial=True)
+    if dumps is None:
+        return (False, [None] * len(mounts))
+
+    _rc = True
+    all_mounts_digests = []
+    for mount_obj, dump in zip(mounts, dumps):
+        if dump is None:
+            g.log.error("Collecting tree digest failed on %s:%s",
+                        mount_obj.client_system, mount_obj.mountpoint)
+            _rc = False
+            all_mounts_digests.append(None)
+            continue
+
+        digest = {'checksum': None, 'dirs': 0, 'files': 0, 'symlinks': 0,
+                  'others': 0, 'bytes': 0, 'rehashed_files': 0,
+                  'rehashed_bytes': 0}
+        counts = {'d': 'dirs', 'f': 'files', 'l': 'symlinks', 'o': 'others'}
+        for relpath, meta in iter_merkle_dump(dump):
+            ftype, checksum, size, rehashed = meta
+            if relpath == b'.':
+                digest['checksum'] = checksum
+                continue
+            digest[counts[ftype]] += 1
+            digest['bytes'] += int(size)
+            if rehashed == '1':
+                digest['rehashed_files'] += 1
+                digest['rehashed_bytes'] += int(size)
+        os.remove(dump)
+        g.log.info("Tree digest of %s:%s: %s, %d of %d files (%d of %d "
+                   "bytes) read", mount_obj.client_system,
+                   mount_obj.mountpoint, digest['checksum'],
+                   digest['rehashed_files'], digest['files'],
+                   digest['rehashed_bytes'], digest['bytes'])
+        all_mounts_digests.append(digest)
+    return (_rc, all_mounts_digests)
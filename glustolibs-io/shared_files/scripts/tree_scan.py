@@ -0,0 +1,1225 @@
+#!/usr/bin/env python
+#  Copyright (C) 2019  Red Hat, Inc. <http://www.redhat.com>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along
+#  with this program; if not, write to the Free Software Foundation, Inc.,
+#  51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+    Description: Scans a directory tree (brick or mount) on the node and
+    writes compact, ordered dumps of it, to be compared by the test runner
+    without transferring full listings.
+
+    The tree is walked depth first with the entries of every directory
+    sorted by name, so the records of all the dumps are in the same order
+    (component wise order of the relative paths) and can be merge compared.
+    Dumps are gzip compressed sequences of NUL terminated fields.
+"""
+
+from __future__ import print_function
+import argparse
+import binascii
+import ctypes
+import ctypes.util
+import errno
+import grp
+import gzip
+import hashlib
+import io
+import multiprocessing
+import os
+import pwd
+import stat
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+# Entries at the root of a brick which are not part of the namespace
+BRICK_INTERNAL_DIRS = (b'.glusterfs', b'.trashcan')
+
+
+def _to_bytes(path):
+    if isinstance(path, bytes):
+        return path
+    return path.encode('utf-8')
+
+
+def is_linkto_file(st):
+    """Returns True if the stat is of a DHT linkto file (sticky bit only,
+    zero sized regular file).
+    """
+    return (stat.S_ISREG(st.st_mode) and
+            stat.S_IMODE(st.st_mode) == stat.S_ISVTX and st.st_size == 0)
+
+
+def _get_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    libc.lgetxattr.restype = ctypes.c_ssize_t
+    libc.lgetxattr.argtypes = (ctypes.c_char_p, ctypes.c_char_p,
+                               ctypes.c_void_p, ctypes.c_size_t)
+    libc.llistxattr.restype = ctypes.c_ssize_t
+    libc.llistxattr.argtypes = (ctypes.c_char_p, ctypes.c_void_p,
+                                ctypes.c_size_t)
+    return libc
+
+
+_LIBC = None
+
+
+def getxattr(path, name):
+    """Returns the value (bytes) of the extended attribute name of path,
+    not following symlinks. None if the attribute is not set.
+    """
+    global _LIBC
+    path, name = _to_bytes(path), _to_bytes(name)
+    if hasattr(os, 'getxattr'):
+        try:
+            return os.getxattr(path, name, follow_symlinks=False)
+        except OSError as err:
+            if err.errno in (errno.ENODATA, errno.ENOTSUP):
+                return None
+            raise
+
+    # Python 2
+    if _LIBC is None:
+        _LIBC = _get_libc()
+    while True:
+        size = _LIBC.lgetxattr(path, name, None, 0)
+        if size >= 0:
+            buf = ctypes.create_string_buffer(size or 1)
+            ret = _LIBC.lgetxattr(path, name, buf, size)
+            if ret >= 0:
+                return buf.raw[:ret]
+        err = ctypes.get_errno()
+        if err == errno.ERANGE:
+            # Value changed between the two calls
+            continue
+        if err in (errno.ENODATA, errno.ENOTSUP):
+            return None
+        raise OSError(err, os.strerror(err), path)
+
+
+def listxattr(path):
+    """Returns the names (bytes) of the extended attributes of path, not
+    following symlinks.
+    """
+    global _LIBC
+    path = _to_bytes(path)
+    if hasattr(os, 'listxattr'):
+        return [_to_bytes(name) for name in
+                os.listxattr(path, follow_symlinks=False)]
+
+    # Python 2
+    if _LIBC is None:
+        _LIBC = _get_libc()
+    while True:
+        size = _LIBC.llistxattr(path, None, 0)
+        if size >= 0:
+            buf = ctypes.create_string_buffer(size or 1)
+            ret = _LIBC.llistxattr(path, buf, size)
+            if ret >= 0:
+                return [name for name in buf.raw[:ret].split(b'\0')
+                        if name]
+        err = ctypes.get_errno()
+        if err == errno.ERANGE:
+            continue
+        raise OSError(err, os.strerror(err), path)
+
+
+def iter_files_from(path):
+    """Yields the NUL delimited paths (bytes) listed in the file path, or
+    read from the standard input if path is '-'.
+    """
+    if path == '-':
+        files = getattr(sys.stdin, 'buffer', sys.stdin)
+        pending = b''
+        for chunk in iter(lambda: files.read(1 << 16), b''):
+            names = (pending + chunk).split(b'\0')
+            pending = names.pop()
+            for name in names:
+                if name:
+                    yield name
+        if pending:
+            yield pending
+        return
+
+    with open(path, 'rb') as files:
+        for name in files.read().split(b'\0'):
+            if name:
+                yield name
+
+
+def file_type(st):
+    """Returns the one letter type of the entry (as 'find -printf %y')."""
+    mode = st.st_mode
+    if stat.S_ISDIR(mode):
+        return 'd'
+    if stat.S_ISREG(mode):
+        return 'f'
+    if stat.S_ISLNK(mode):
+        return 'l'
+    return 'o'
+
+
+def iter_tree(root, excludes=(), skip_linkto=False):
+    """Walks the tree under root depth first, the entries of every
+    directory sorted by name.
+
+    Args:
+        root (bytes): directory to walk.
+
+    Kwargs:
+        excludes (tuple): names of the entries at the root to skip.
+        skip_linkto (bool): True to skip the DHT linkto files.
+
+    Yields:
+        tuple: (relative path (bytes), lstat of the entry)
+    """
+    def _entries(reldir):
+        path = os.path.join(root, reldir) if reldir else root
+        try:
+            names = sorted(os.listdir(path))
+        except OSError as err:
+            sys.stderr.write("Unable to list %r: %s\n" % (path, err))
+            return iter(())
+        if not reldir:
+            names = [name for name in names if name not in excludes]
+        return iter([os.path.join(reldir, name) if reldir else name
+                     for name in names])
+
+    stack = [_entries(b'')]
+    while stack:
+        try:
+            relpath = next(stack[-1])
+        except StopIteration:
+            stack.pop()
+            continue
+        try:
+            st = os.lstat(os.path.join(root, relpath))
+        except OSError:
+            # Removed while walking
+            continue
+        if skip_linkto and is_linkto_file(st):
+            continue
+        yield relpath, st
+        if stat.S_ISDIR(st.st_mode):
+            stack.append(_entries(relpath))
+
+
+def namespace_meta(st):
+    """Returns the 'type mode uid gid size' metadata of an entry. Size of
+    directories is not significant and is reported as 0.
+    """
+    ftype = file_type(st)
+    size = st.st_size if ftype != 'd' else 0
+    return ("%s %o %d %d %d" % (ftype, stat.S_IMODE(st.st_mode), st.st_uid,
+                                st.st_gid, size)).encode('ascii')
+
+
+def namespace(args):
+    """Dumps (relpath, type, mode, uid, gid, size) of the entries of the
+    tree, or a digest of the entries of every directory.
+    """
+    root = _to_bytes(args.dir)
+    excludes = ()
+    if args.brick or args.skip_root_internal:
+        excludes = BRICK_INTERNAL_DIRS
+    types = args.type.split(',') if args.type else None
+
+    out = gzip.open(args.output, 'wb')
+    try:
+        if not args.per_dir_digest:
+            for relpath, st in iter_tree(root, excludes, args.brick):
+                if types and file_type(st) not in types:
+                    continue
+                out.write(relpath + b'\0' + namespace_meta(st) + b'\0')
+            return 0
+
+        # One record per directory, with the digest of the metadata of
+        # its entries of the given types.
+        digests = {b'': hashlib.sha1()}
+        order = [b'']
+        for relpath, st in iter_tree(root, excludes, args.brick):
+            if stat.S_ISDIR(st.st_mode):
+                digests[relpath] = hashlib.sha1()
+                order.append(relpath)
+            if types and file_type(st) not in types:
+                continue
+            digests[os.path.dirname(relpath)].update(
+                os.path.basename(relpath) + b'\0' + namespace_meta(st) +
+                b'\0')
+        for relpath in order:
+            out.write((relpath or b'.') + b'\0' +
+                      b'D ' + digests[relpath].hexdigest().encode('ascii') +
+                      b'\0')
+        return 0
+    finally:
+        out.close()
+
+
+def xattrs(args):
+    """Dumps the extended attributes with the given prefixes of the
+    directory and of the entries of the tree, as 'name=hexvalue' pairs.
+    Entries without any such attribute are not dumped.
+    """
+    root = _to_bytes(args.dir)
+    prefixes = tuple(_to_bytes(prefix) for prefix in args.prefix)
+    types = args.type.split(',') if args.type else None
+    excludes = BRICK_INTERNAL_DIRS if args.brick else ()
+
+    def _entries():
+        yield b'.', os.lstat(root)
+        for entry in iter_tree(root, excludes, args.brick):
+            yield entry
+
+    out = gzip.open(args.output, 'wb')
+    try:
+        for relpath, st in _entries():
+            if types and file_type(st) not in types:
+                continue
+            path = os.path.join(root, relpath) if relpath != b'.' else root
+            pairs = []
+            try:
+                for name in sorted(listxattr(path)):
+                    if not name.startswith(prefixes):
+                        continue
+                    value = getxattr(path, name)
+                    if value is None or (args.nonzero and
+                                         not value.strip(b'\0')):
+                        continue
+                    pairs.append(name + b'=' + binascii.hexlify(value))
+            except OSError as err:
+                # Removed while walking
+                sys.stderr.write("Unable to read %r: %s\n" % (path, err))
+                continue
+            if pairs:
+                out.write(relpath + b'\0' + b' '.join(pairs) + b'\0')
+        return 0
+    finally:
+        out.close()
+
+
+def _format_gfid(value):
+    value = binascii.hexlify(value).decode('ascii')
+    return '-'.join((value[:8], value[8:12], value[12:16], value[16:20],
+                     value[20:]))
+
+
+def gfid_handle(root, gfid):
+    """Returns the path of the .glusterfs handle of the gfid on a brick."""
+    return os.path.join(root, b'.glusterfs', _to_bytes(gfid[:2]),
+                        _to_bytes(gfid[2:4]), _to_bytes(gfid))
+
+
+def gfids(args):
+    """Dumps the 'type gfid nlink linkto handle' of the entries of the
+    brick, handle being 1 if the .glusterfs handle of the gfid exists,
+    0 if not, and gfid '-' for the entries without gfid.
+    """
+    root = _to_bytes(args.brick)
+    subdir = _to_bytes(args.dir.strip('/')) if args.dir else b''
+    tree = os.path.join(root, subdir) if subdir else root
+
+    out = gzip.open(args.output, 'wb')
+    try:
+        for relpath, st in iter_tree(tree, BRICK_INTERNAL_DIRS):
+            path = os.path.join(tree, relpath)
+            try:
+                gfid = getxattr(path, 'trusted.gfid')
+                linkto = (is_linkto_file(st) and
+                          getxattr(path, 'trusted.glusterfs.dht.linkto')
+                          is not None)
+            except OSError:
+                # Removed while walking
+                continue
+            if gfid is None or len(gfid) != 16:
+                gfid, handle = '-', '-'
+            else:
+                gfid = _format_gfid(gfid)
+                handle = ('1' if os.path.lexists(gfid_handle(root, gfid))
+                          else '0')
+            out.write(relpath + b'\0' +
+                      ("%s %s %d %d %s" % (file_type(st), gfid, st.st_nlink,
+                                           linkto, handle)).encode('ascii') +
+                      b'\0')
+        return 0
+    finally:
+        out.close()
+
+
+def handles(args):
+    """Dumps the orphan .glusterfs handles of the brick: the handles of
+    files without any other link ('orphan') and the handles of dirs whose
+    symlink does not resolve ('dangling').
+    """
+    glusterfs = os.path.join(_to_bytes(args.brick), b'.glusterfs')
+    hexdigits = set(bytearray(b'0123456789abcdef'))
+    if not os.path.isdir(glusterfs):
+        sys.stderr.write("%r is not a brick\n" % args.brick)
+        return 1
+
+    def _is_hex_dir(name):
+        return len(name) == 2 and all(c in hexdigits for c in
+                                      bytearray(name))
+
+    out = gzip.open(args.output, 'wb')
+    try:
+        for first in sorted(os.listdir(glusterfs)):
+            if not _is_hex_dir(first):
+                continue
+            for second in sorted(os.listdir(os.path.join(glusterfs, first))):
+                if not _is_hex_dir(second):
+                    continue
+                bucket = os.path.join(glusterfs, first, second)
+                for name in sorted(os.listdir(bucket)):
+                    if len(name) != 36:
+                        continue
+                    path = os.path.join(bucket, name)
+                    try:
+                        st = os.lstat(path)
+                    except OSError:
+                        continue
+                    if stat.S_ISLNK(st.st_mode):
+                        if not os.path.exists(path):
+                            out.write(name + b'\0dangling\0')
+                    elif stat.S_ISREG(st.st_mode) and st.st_nlink == 1:
+                        out.write(name + b'\0orphan\0')
+        return 0
+    finally:
+        out.close()
+
+
+def ec(args):
+    """Dumps the 'type size version ec-size dirty' of the entries of a
+    brick of a disperse volume, size being the size of the fragment on the
+    brick and the trusted.ec.* xattrs in hex ('-' when not set).
+    """
+    root = _to_bytes(args.dir)
+
+    out = gzip.open(args.output, 'wb')
+    try:
+        for relpath, st in iter_tree(root, BRICK_INTERNAL_DIRS):
+            path = os.path.join(root, relpath)
+            values = []
+            try:
+                for name in ('trusted.ec.version', 'trusted.ec.size',
+                             'trusted.ec.dirty'):
+                    value = getxattr(path, name)
+                    values.append(binascii.hexlify(value).decode('ascii')
+                                  if value else '-')
+            except OSError:
+                # Removed while walking
+                continue
+            size = st.st_size if not stat.S_ISDIR(st.st_mode) else 0
+            out.write(relpath + b'\0' +
+                      ("%s %d %s" % (file_type(st), size,
+                                     ' '.join(values))).encode('ascii') +
+                      b'\0')
+        return 0
+    finally:
+        out.close()
+
+
+def linkto(args):
+    """Dumps the 'kind gfid target' of the regular files of a brick, kind
+    being L for the DHT linkto files (target being the DHT subvol in
+    their trusted.glusterfs.dht.linkto), S for the sticky bit empty files
+    without the xattr and D for the data files (target '-').
+    """
+    root = _to_bytes(args.dir)
+
+    out = gzip.open(args.output, 'wb')
+    try:
+        for relpath, st in iter_tree(root, BRICK_INTERNAL_DIRS):
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            path = os.path.join(root, relpath)
+            try:
+                gfid = getxattr(path, 'trusted.gfid')
+                target = None
+                if is_linkto_file(st):
+                    target = getxattr(path, 'trusted.glusterfs.dht.linkto')
+            except OSError:
+                # Removed while walking
+                continue
+            gfid = _format_gfid(gfid) if gfid and len(gfid) == 16 else '-'
+            if not is_linkto_file(st):
+                kind, target = 'D', '-'
+            elif target is None:
+                kind, target = 'S', '-'
+            else:
+                kind = 'L'
+                target = target.rstrip(b'\0').decode('utf-8', 'replace')
+            out.write(relpath + b'\0' +
+                      ("%s %s %s" % (kind, gfid, target)).encode('utf-8') +
+                      b'\0')
+        return 0
+    finally:
+        out.close()
+
+
+def _arbiter_flags(path, st, arbiter, afr_prefix):
+    # Violations of an entry: no gfid on any brick, and data or no AFR
+    # changelog of the regular files on the arbiter brick
+    names = listxattr(path)
+    flags = []
+    if b'trusted.gfid' not in names:
+        flags.append('nogfid')
+    if (arbiter and stat.S_ISREG(st.st_mode) and
+            not is_linkto_file(st)):
+        if st.st_size:
+            flags.append('size=%d' % st.st_size)
+        if not any(name.startswith(afr_prefix) for name in names):
+            flags.append('noafr')
+    return ','.join(flags)
+
+
+def arbiter(args):
+    """Dumps one 'D digest [flags]' record per directory of a replica
+    brick, digest being that of the names and types of its entries, and
+    one 'V flags' record per other entry with a violation, so that the
+    size of the dump does not grow with the number of files. With
+    files_from, dumps the 'E type' of the entries of the directories it
+    lists instead.
+    """
+    root = _to_bytes(args.dir)
+    afr_prefix = _to_bytes(args.afr_prefix)
+
+    out = gzip.open(args.output, 'wb')
+    try:
+        if args.files_from:
+            for reldir in iter_files_from(args.files_from):
+                path = root if reldir == b'.' else os.path.join(root, reldir)
+                try:
+                    names = sorted(os.listdir(path))
+                except OSError as err:
+                    if err.errno not in (errno.ENOENT, errno.ENOTDIR):
+                        raise
+                    continue
+                if reldir == b'.':
+                    names = [name for name in names
+                             if name not in BRICK_INTERNAL_DIRS]
+                for name in names:
+                    relpath = name if reldir == b'.' else os.path.join(
+                        reldir, name)
+                    try:
+                        st = os.lstat(os.path.join(root, relpath))
+                    except OSError:
+                        continue
+                    out.write(relpath + b'\0' + b'E ' +
+                              file_type(st).encode('ascii') + b'\0')
+            return 0
+
+        digests = {b'.': hashlib.sha1()}
+        records = [[b'.', 'D', _arbiter_flags(root, os.lstat(root),
+                                              args.arbiter, afr_prefix)]]
+        for relpath, st in iter_tree(root, BRICK_INTERNAL_DIRS):
+            try:
+                flags = _arbiter_flags(os.path.join(root, relpath), st,
+                                       args.arbiter, afr_prefix)
+            except OSError:
+                # Removed while walking
+                continue
+            ftype = file_type(st)
+            digests[os.path.dirname(relpath) or b'.'].update(
+                os.path.basename(relpath) + b'\0' + ftype.encode('ascii') +
+                b'\0')
+            if ftype == 'd':
+                digests[relpath] = hashlib.sha1()
+                records.append([relpath, 'D', flags])
+            elif flags:
+                records.append([relpath, 'V', flags])
+
+        for relpath, kind, flags in records:
+            meta = kind
+            if kind == 'D':
+                meta += ' ' + digests[relpath].hexdigest()
+            if flags:
+                meta += ' ' + flags
+            out.write(relpath + b'\0' + meta.encode('ascii') + b'\0')
+        return 0
+    finally:
+        out.close()
+
+
+def pathinfo(args):
+    """Dumps the trusted.glusterfs.pathinfo of the regular files under the
+    dir (a glusterfs mount), or of the files listed in files_from
+    (relative to the dir).
+    """
+    root = _to_bytes(args.dir)
+    if args.files_from:
+        relpaths = iter_files_from(args.files_from)
+    else:
+        relpaths = (relpath for relpath, st in iter_tree(root)
+                    if stat.S_ISREG(st.st_mode))
+
+    _rc = 0
+    out = gzip.open(args.output, 'wb')
+    try:
+        for relpath in relpaths:
+            try:
+                value = getxattr(os.path.join(root, relpath),
+                                 'trusted.glusterfs.pathinfo')
+            except OSError as err:
+                sys.stderr.write("Unable to get pathinfo of %r: %s\n" %
+                                 (relpath, err))
+                _rc = 1
+                continue
+            out.write(relpath + b'\0' + (value or b'').rstrip(b'\0') +
+                      b'\0')
+    finally:
+        out.close()
+    return _rc
+
+
+def _bitrot_record(path, do_hash):
+    try:
+        st = os.lstat(path)
+        signature = getxattr(path, 'trusted.bit-rot.signature')
+        bad = getxattr(path, 'trusted.bit-rot.bad-file') is not None
+    except OSError as err:
+        sys.stderr.write("Unable to read %r: %s\n" % (path, err))
+        return None
+    seen = time.time()
+
+    checksum = b''
+    if do_hash:
+        sha256 = hashlib.sha256()
+        try:
+            with open(path, 'rb') as data:
+                for chunk in iter(lambda: data.read(1 << 20), b''):
+                    sha256.update(chunk)
+        except (IOError, OSError) as err:
+            sys.stderr.write("Unable to read %r: %s\n" % (path, err))
+            return None
+        checksum = sha256.hexdigest().encode('ascii')
+
+    return (path, checksum,
+            binascii.hexlify(signature) if signature else b'',
+            b'1' if bad else b'0',
+            ("%.6f" % st.st_mtime).encode('ascii'),
+            ("%.6f" % seen).encode('ascii'))
+
+
+def bitrot(args):
+    """Dumps (path, sha256, signature, bad, mtime, seen) of the regular
+    files under the dir (a brick) or of the files listed in files_from,
+    hashing the files in parallel.
+    """
+    if args.files_from:
+        paths = list(iter_files_from(args.files_from))
+    elif args.dir is None:
+        sys.stderr.write("Either DIR or --files-from is required\n")
+        return 2
+    else:
+        root = _to_bytes(args.dir)
+        paths = [os.path.join(root, relpath) for relpath, st in
+                 iter_tree(root, BRICK_INTERNAL_DIRS, True)
+                 if stat.S_ISREG(st.st_mode)]
+
+    _rc = 0
+    out = gzip.open(args.output, 'wb')
+    pool = ThreadPool(args.jobs)
+    try:
+        for record in pool.imap(
+                lambda path: _bitrot_record(path, not args.no_hash), paths,
+                chunksize=16):
+            if record is None:
+                _rc = 1
+                continue
+            out.write(b'\0'.join(record) + b'\0')
+    finally:
+        pool.close()
+        pool.join()
+        out.close()
+    return _rc
+
+
+# Names of the file types (as 'stat -c %F')
+STAT_FILE_TYPES = ((stat.S_ISDIR, 'directory'),
+                   (stat.S_ISLNK, 'symbolic link'),
+                   (stat.S_ISFIFO, 'fifo'),
+                   (stat.S_ISSOCK, 'socket'),
+                   (stat.S_ISCHR, 'character special file'),
+                   (stat.S_ISBLK, 'block special file'))
+
+
+def stat_format(st):
+    """Returns the '%F:%i:%a:%s:%h:%u:%g:%U:%G' stat of an entry (as
+    'stat -c', without the name).
+    """
+    ftype = 'weird file'
+    if stat.S_ISREG(st.st_mode):
+        ftype = 'regular empty file' if not st.st_size else 'regular file'
+    for is_type, name in STAT_FILE_TYPES:
+        if is_type(st.st_mode):
+            ftype = name
+    try:
+        user = pwd.getpwuid(st.st_uid).pw_name
+    except KeyError:
+        user = 'UNKNOWN'
+    try:
+        group = grp.getgrgid(st.st_gid).gr_name
+    except KeyError:
+        group = 'UNKNOWN'
+    return ("%s:%d:%o:%d:%d:%d:%d:%s:%s" % (
+        ftype, st.st_ino, stat.S_IMODE(st.st_mode), st.st_size,
+        st.st_nlink, st.st_uid, st.st_gid, user, group)).encode('utf-8')
+
+
+def _stat_record(path, do_pathinfo, do_md5):
+    try:
+        st = os.lstat(path)
+    except OSError as err:
+        if err.errno in (errno.ENOENT, errno.ENOTDIR):
+            return (path, b'', b'', b'', b'')
+        sys.stderr.write("Unable to stat %r: %s\n" % (path, err))
+        return None
+
+    try:
+        pairs = [name + b'=' + binascii.hexlify(getxattr(path, name) or b'')
+                 for name in sorted(listxattr(path))]
+        value = b''
+        if do_pathinfo:
+            value = getxattr(path, 'trusted.glusterfs.pathinfo') or b''
+    except OSError as err:
+        sys.stderr.write("Unable to read %r: %s\n" % (path, err))
+        return None
+
+    checksum = b''
+    if do_md5 and stat.S_ISREG(st.st_mode):
+        md5 = hashlib.md5()
+        try:
+            with open(path, 'rb') as data:
+                for chunk in iter(lambda: data.read(1 << 20), b''):
+                    md5.update(chunk)
+        except (IOError, OSError) as err:
+            sys.stderr.write("Unable to read %r: %s\n" % (path, err))
+            return None
+        checksum = md5.hexdigest().encode('ascii')
+
+    return (path, stat_format(st), b' '.join(pairs), value.rstrip(b'\0'),
+            checksum)
+
+
+def file_stats(args):
+    """Dumps (path, stat, xattrs, pathinfo, md5) of the files listed in
+    files_from (absolute paths). Missing files are dumped with an empty
+    stat. Files are read in parallel.
+    """
+    paths = list(iter_files_from(args.files_from))
+
+    _rc = 0
+    out = gzip.open(args.output, 'wb')
+    pool = ThreadPool(args.jobs)
+    try:
+        for record in pool.imap(
+                lambda path: _stat_record(path, args.pathinfo, args.md5),
+                paths, chunksize=16):
+            if record is None:
+                _rc = 1
+                continue
+            out.write(b'\0'.join(record) + b'\0')
+    finally:
+        pool.close()
+        pool.join()
+        out.close()
+    return _rc
+
+
+# Size of the reads of the files hashed
+CHECKSUM_BUFFER_SIZE = 4 << 20
+
+
+def file_digest(path, algorithm, buf):
+    """Returns the hex digest (bytes) of the content of the file, read
+    with large unbuffered reads into buf (a bytearray).
+    """
+    digest = hashlib.new(algorithm)
+    view = memoryview(buf)
+    with io.open(path, 'rb', buffering=0) as data:
+        while True:
+            size = data.readinto(buf)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest().encode('ascii')
+
+
+def entry_digest(path, st, algorithm, buf):
+    """Returns the digest of the content of a regular file, of the target
+    of a symlink, and of nothing for the other entries.
+    """
+    if stat.S_ISREG(st.st_mode):
+        return file_digest(path, algorithm, buf)
+    if stat.S_ISLNK(st.st_mode):
+        return hashlib.new(algorithm, os.readlink(path)).hexdigest().encode(
+            'ascii')
+    return hashlib.new(algorithm).hexdigest().encode('ascii')
+
+
+def manifest_meta(st):
+    """Returns the 'size mtime ctime inode' of a file, a change of which
+    means the file is to be hashed again.
+    """
+    if hasattr(st, 'st_mtime_ns'):
+        times = (st.st_mtime_ns, st.st_ctime_ns)
+    else:
+        times = (repr(st.st_mtime), repr(st.st_ctime))
+    return ("%d %s %s %d" % (st.st_size, times[0], times[1],
+                             st.st_ino)).encode('ascii')
+
+
+def load_manifest(path):
+    """Returns relpath -> (manifest_meta, digest) of the files of a
+    manifest. Empty if there is no usable manifest.
+    """
+    manifest = {}
+    if not os.path.exists(path):
+        return manifest
+    try:
+        with open(path, 'rb') as raw:
+            fields = gzip.GzipFile(fileobj=raw).read().split(b'\0')
+        for index in range(0, len(fields) - 1, 2):
+            meta, digest = fields[index + 1].rsplit(b' ', 1)
+            manifest[fields[index]] = (meta, digest)
+    except (IOError, OSError, EOFError, ValueError) as err:
+        # Truncated or corrupted, all the files are hashed again
+        sys.stderr.write("Ignoring manifest %r: %s\n" % (path, err))
+        return {}
+    return manifest
+
+
+def _write_manifest(path, hashed):
+    """Passes the hashed entries through, writing the manifest of the
+    regular files, which replaces the previous one once complete.
+    """
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    out = gzip.open(path + '.tmp', 'wb')
+    try:
+        for key, st, digest, rehashed in hashed:
+            if digest is not None and stat.S_ISREG(st.st_mode):
+                out.write(key + b'\0' + manifest_meta(st) + b' ' + digest +
+                          b'\0')
+            yield key, st, digest, rehashed
+    finally:
+        out.close()
+    os.rename(path + '.tmp', path)
+
+
+class _Hasher(object):
+    """Hashes entries in the threads of a pool, every thread with its own
+    read buffer. Files whose manifest_meta is unchanged in the manifest
+    are not read again.
+    """
+    def __init__(self, algorithm, manifest=None):
+        self.algorithm = algorithm
+        self.manifest = manifest or {}
+        self.local = threading.local()
+
+    def __call__(self, item):
+        key, path, st = item
+        buf = getattr(self.local, 'buf', None)
+        if buf is None:
+            buf = self.local.buf = bytearray(CHECKSUM_BUFFER_SIZE)
+        try:
+            if st is None:
+                st = os.lstat(path)
+            known = self.manifest.get(key)
+            if (known is not None and stat.S_ISREG(st.st_mode) and
+                    known[0] == manifest_meta(st)):
+                return key, st, known[1], False
+            return (key, st, entry_digest(path, st, self.algorithm, buf),
+                    stat.S_ISREG(st.st_mode))
+        except (IOError, OSError) as err:
+            sys.stderr.write("Unable to hash %r: %s\n" % (path, err))
+            return key, st, None, False
+
+
+def _merkle_records(hashed, algorithm):
+    """Returns the (relpath, type, digest, size, rehashed) records of the
+    tree in the order of the walk, with the digests of the directories
+    computed from their entries, deepest first. None if any entry could
+    not be hashed, as the digests of its parents would not cover it.
+    """
+    records = [(b'.', 'd', None, 0, False)]
+    _rc = True
+    for relpath, st, digest, rehashed in hashed:
+        if digest is None:
+            _rc = False
+            continue
+        ftype = file_type(st)
+        records.append((relpath, ftype, digest,
+                        st.st_size if ftype == 'f' else 0, rehashed))
+    if not _rc:
+        return None
+
+    # Entries of a directory follow it in the walk, so in reverse order
+    # they are all seen before the directory.
+    children = {}
+    for index in range(len(records) - 1, -1, -1):
+        relpath, ftype, digest, size, rehashed = records[index]
+        if ftype == 'd':
+            digest = hashlib.new(algorithm)
+            for name, child_type, child_digest in reversed(
+                    children.pop(relpath, [])):
+                digest.update(name + b'\0' + child_type.encode('ascii') +
+                              b'\0' + child_digest + b'\0')
+            digest = digest.hexdigest().encode('ascii')
+            records[index] = (relpath, ftype, digest, size, rehashed)
+        if relpath != b'.':
+            children.setdefault(os.path.dirname(relpath) or b'.', []).append(
+                (os.path.basename(relpath), ftype, digest))
+    return records
+
+
+def checksum(args):
+    """Dumps (path, digest) of the files listed in files_from, or
+    (relpath, 'type digest') of the regular files of the tree under the
+    dir, hashing the files with a pool of workers. Records are written as
+    they are computed, in the order of the input.
+
+    With merkle, all the entries of the tree are dumped, the directories
+    (the dir itself as '.') with the digest of the names, types and digests
+    of their entries, so that two trees can be compared by descending only
+    into the directories whose digests differ.
+
+    With a manifest, the files whose size, times and inode did not change
+    since the previous run are not read again (unless full), and the
+    records are 'type digest size rehashed' to account for the data read.
+    """
+    try:
+        hashlib.new(args.algorithm)
+    except ValueError:
+        sys.stderr.write("Unsupported algorithm %s\n" % args.algorithm)
+        return 2
+    if args.manifest and (args.files_from or not args.merkle):
+        sys.stderr.write("--manifest requires --merkle and DIR\n")
+        return 2
+    if args.files_from:
+        items = ((path, path, None)
+                 for path in iter_files_from(args.files_from))
+    elif args.dir is None:
+        sys.stderr.write("Either DIR or --files-from is required\n")
+        return 2
+    elif not os.path.isdir(args.dir):
+        sys.stderr.write("%s is not a directory\n" % args.dir)
+        return 1
+    else:
+        root = _to_bytes(args.dir)
+        excludes = BRICK_INTERNAL_DIRS if args.brick else ()
+        items = ((relpath, os.path.join(root, relpath), st)
+                 for relpath, st in iter_tree(root, excludes, args.brick)
+                 if args.merkle or stat.S_ISREG(st.st_mode))
+
+    manifest = None
+    if args.manifest and not args.full:
+        manifest = load_manifest(args.manifest)
+
+    _rc = 0
+    out = gzip.open(args.output, 'wb')
+    pool = ThreadPool(args.jobs or multiprocessing.cpu_count())
+    try:
+        hashed = pool.imap(_Hasher(args.algorithm, manifest), items,
+                           chunksize=4)
+        if args.files_from or not args.merkle:
+            for key, st, digest, _ in hashed:
+                if digest is None:
+                    _rc = 1
+                    continue
+                if not args.files_from:
+                    digest = b'f ' + digest
+                out.write(key + b'\0' + digest + b'\0')
+            return _rc
+
+        if args.manifest:
+            hashed = _write_manifest(args.manifest, hashed)
+        records = _merkle_records(hashed, args.algorithm)
+        if records is None:
+            return 1
+        for relpath, ftype, digest, size, rehashed in records:
+            meta = ftype.encode('ascii') + b' ' + digest
+            if args.manifest:
+                meta += (" %d %d" % (size, rehashed)).encode('ascii')
+            out.write(relpath + b'\0' + meta + b'\0')
+        return _rc
+    finally:
+        pool.close()
+        pool.join()
+        out.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog='tree_scan.py',
+        description=("Program for scanning brick or mount directory "
+                     "trees."))
+
+    subparsers = parser.add_subparsers(title='Available sub commands',
+                                       help='sub-command help')
+
+    namespace_parser = subparsers.add_parser(
+        'namespace',
+        help=("Dump the type, mode, uid, gid and size of the entries "
+              "under 'dir' to 'output', in a gzip compressed NUL "
+              "delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    namespace_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    namespace_parser.add_argument(
+        '-t', '--type', help=("Comma separated entry types to dump: "
+                              "d(ir), f(ile), l(ink), o(ther)"),
+        dest='type', default=None)
+    namespace_parser.add_argument(
+        '--brick', help=("'dir' is a brick: skip .glusterfs, .trashcan and "
+                         "the DHT linkto files"),
+        dest='brick', action='store_true')
+    namespace_parser.add_argument(
+        '--skip-root-internal',
+        help=("Skip .glusterfs and .trashcan at the root of 'dir', as with "
+              "--brick, to compare a mount with its bricks"),
+        dest='skip_root_internal', action='store_true')
+    namespace_parser.add_argument(
+        '--per-dir-digest', help=("Dump a digest of the entries of every "
+                                  "directory instead of the entries"),
+        dest='per_dir_digest', action='store_true')
+    namespace_parser.add_argument(
+        'dir', metavar='DIR', type=str,
+        help="Directory to scan")
+    namespace_parser.set_defaults(func=namespace)
+
+    xattrs_parser = subparsers.add_parser(
+        'xattrs',
+        help=("Dump the extended attributes with the given prefixes of "
+              "'dir' and the entries under it to 'output', in a gzip "
+              "compressed NUL delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    xattrs_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    xattrs_parser.add_argument(
+        '-p', '--prefix', help=("Prefix of the names of the attributes to "
+                                "dump. Can be given more than once"),
+        dest='prefix', action='append', default=None, required=True)
+    xattrs_parser.add_argument(
+        '-t', '--type', help=("Comma separated entry types to dump: "
+                              "d(ir), f(ile), l(ink), o(ther)"),
+        dest='type', default=None)
+    xattrs_parser.add_argument(
+        '--nonzero', help="Skip the attributes whose value is all zeros",
+        dest='nonzero', action='store_true')
+    xattrs_parser.add_argument(
+        '--brick', help=("'dir' is a brick: skip .glusterfs, .trashcan and "
+                         "the DHT linkto files"),
+        dest='brick', action='store_true')
+    xattrs_parser.add_argument(
+        'dir', metavar='DIR', type=str,
+        help="Directory to scan")
+    xattrs_parser.set_defaults(func=xattrs)
+
+    gfids_parser = subparsers.add_parser(
+        'gfids',
+        help=("Dump the type, gfid, link count, DHT linkto flag and the "
+              "existence of the .glusterfs handle of the entries of "
+              "'brick' to 'output', in a gzip compressed NUL delimited "
+              "stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    gfids_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    gfids_parser.add_argument(
+        '-d', '--dir', help="Dir of the brick to scan, relative to 'brick'",
+        dest='dir', default=None)
+    gfids_parser.add_argument(
+        'brick', metavar='BRICK', type=str,
+        help="Brick path")
+    gfids_parser.set_defaults(func=gfids)
+
+    handles_parser = subparsers.add_parser(
+        'handles',
+        help=("Dump the orphan and dangling .glusterfs handles of 'brick' "
+              "to 'output', in a gzip compressed NUL delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    handles_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    handles_parser.add_argument(
+        'brick', metavar='BRICK', type=str,
+        help="Brick path")
+    handles_parser.set_defaults(func=handles)
+
+    ec_parser = subparsers.add_parser(
+        'ec',
+        help=("Dump the type, fragment size and trusted.ec.version, "
+              "trusted.ec.size and trusted.ec.dirty of the entries under "
+              "'dir' (a brick of a disperse volume) to 'output', in a gzip "
+              "compressed NUL delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    ec_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    ec_parser.add_argument(
+        'dir', metavar='DIR', type=str,
+        help="Directory to scan")
+    ec_parser.set_defaults(func=ec)
+
+    linkto_parser = subparsers.add_parser(
+        'linkto',
+        help=("Dump the kind (data, DHT linkto or sticky empty), gfid and "
+              "linkto target of the regular files under 'dir' (a brick) to "
+              "'output', in a gzip compressed NUL delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    linkto_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    linkto_parser.add_argument(
+        'dir', metavar='DIR', type=str,
+        help="Directory to scan")
+    linkto_parser.set_defaults(func=linkto)
+
+    arbiter_parser = subparsers.add_parser(
+        'arbiter',
+        help=("Dump the digests of the entry names of the directories of "
+              "'dir' (a replica brick) and its entries without gfid, and "
+              "with --arbiter its files with data or without AFR "
+              "changelog, to 'output', in a gzip compressed NUL delimited "
+              "stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    arbiter_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    arbiter_parser.add_argument(
+        '--arbiter', help="'dir' is an arbiter brick",
+        dest='arbiter', action='store_true')
+    arbiter_parser.add_argument(
+        '--afr-prefix', help=("Prefix of the names of the AFR changelog "
+                              "attributes"),
+        dest='afr_prefix', default='trusted.afr.')
+    arbiter_parser.add_argument(
+        '--files-from', help=("File with the NUL delimited paths, relative "
+                              "to 'dir', of the directories whose entries "
+                              "are dumped instead"),
+        dest='files_from', default=None)
+    arbiter_parser.add_argument(
+        'dir', metavar='DIR', type=str,
+        help="Directory to scan")
+    arbiter_parser.set_defaults(func=arbiter)
+
+    pathinfo_parser = subparsers.add_parser(
+        'pathinfo',
+        help=("Dump the trusted.glusterfs.pathinfo of the regular files "
+              "under 'dir' (a glusterfs mount) to 'output', in a gzip "
+              "compressed NUL delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    pathinfo_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    pathinfo_parser.add_argument(
+        '--files-from', help=("File with the NUL delimited paths, relative "
+                              "to 'dir', of the files to dump instead of "
+                              "all the files"),
+        dest='files_from', default=None)
+    pathinfo_parser.add_argument(
+        'dir', metavar='DIR', type=str,
+        help="Directory to scan")
+    pathinfo_parser.set_defaults(func=pathinfo)
+
+    bitrot_parser = subparsers.add_parser(
+        'bitrot',
+        help=("Dump the sha256, the bit-rot signature and bad-file flag, "
+              "the mtime and the time of the read of the regular files "
+              "under 'dir' (a brick) to 'output', in a gzip compressed NUL "
+              "delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    bitrot_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    bitrot_parser.add_argument(
+        '-j', '--jobs', help="Number of files hashed in parallel",
+        dest='jobs', type=int, default=4)
+    bitrot_parser.add_argument(
+        '--no-hash', help="Only dump the extended attributes",
+        dest='no_hash', action='store_true')
+    bitrot_parser.add_argument(
+        '--files-from', help=("File with the NUL delimited absolute paths "
+                              "of the files to dump instead of all the "
+                              "files under 'dir'"),
+        dest='files_from', default=None)
+    bitrot_parser.add_argument(
+        'dir', metavar='DIR', type=str, nargs='?', default=None,
+        help="Directory to scan")
+    bitrot_parser.set_defaults(func=bitrot)
+    stat_parser = subparsers.add_parser(
+        'stat',
+        help=("Dump the stat, the extended attributes and optionally the "
+              "pathinfo and the md5sum of the files listed in 'files_from' "
+              "to 'output', in a gzip compressed NUL delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    stat_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    stat_parser.add_argument(
+        '-j', '--jobs', help="Number of files read in parallel",
+        dest='jobs', type=int, default=4)
+    stat_parser.add_argument(
+        '--pathinfo', help=("Dump the trusted.glusterfs.pathinfo of the "
+                            "files (on a glusterfs mount)"),
+        dest='pathinfo', action='store_true')
+    stat_parser.add_argument(
+        '--md5', help="Dump the md5sum of the regular files",
+        dest='md5', action='store_true')
+    stat_parser.add_argument(
+        '--files-from', help=("File with the NUL delimited absolute paths "
+                              "of the files to dump"),
+        dest='files_from', required=True)
+    stat_parser.set_defaults(func=file_stats)
+    checksum_parser = subparsers.add_parser(
+        'checksum',
+        help=("Dump the checksums of the files listed in 'files_from', or "
+              "of the files under 'dir', optionally with the Merkle "
+              "digests of the directories, to 'output', in a gzip "
+              "compressed NUL delimited stream."),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    checksum_parser.add_argument(
+        '-o', '--output', help="Output file", dest='output', required=True)
+    checksum_parser.add_argument(
+        '-a', '--algorithm', help="Hash algorithm (as hashlib)",
+        dest='algorithm', default='sha256')
+    checksum_parser.add_argument(
+        '-j', '--jobs', help=("Number of files hashed in parallel. "
+                              "Defaults to the number of cpus"),
+        dest='jobs', type=int, default=None)
+    checksum_parser.add_argument(
+        '--merkle', help=("Dump all the entries of 'dir', with the digests "
+                          "of the directories"),
+        dest='merkle', action='store_true')
+    checksum_parser.add_argument(
+        '--brick', help=("'dir' is a brick: skip .glusterfs, .trashcan and "
+                         "the DHT linkto files"),
+        dest='brick', action='store_true')
+    checksum_parser.add_argument(
+        '--manifest', help=("Manifest of the files of 'dir' kept on the "
+                            "node, to hash again only the files changed "
+                            "since the previous run (with --merkle)"),
+        dest='manifest', default=None)
+    checksum_parser.add_argument(
+        '--full', help=("Hash all the files, ignoring the manifest, and "
+                        "write a new one"),
+        dest='full', action='store_true')
+    checksum_parser.add_argument(
+        '--files-from', help=("File with the NUL delimited absolute paths "
+                              "of the files to hash instead of the files "
+                              "under 'dir', '-' for the standard input"),
+        dest='files_from', default=None)
+    checksum_parser.add_argument(
+        'dir', metavar='DIR', type=str, nargs='?', default=None,
+        help="Directory to scan")
+    checksum_parser.set_defaults(func=checksum)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
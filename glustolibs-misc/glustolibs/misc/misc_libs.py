@@ -433,6 +433,17 @@ def reboot_nodes(nodes):
         g.log.info("Rebooting the node %s", node)
         ret = g.run(node, cmd)
 
+    # The peer connectivity matrix and the snapshot catalog cached by
+    # glustolibs-gluster are stale once a node goes down.
+    try:
+        from glustolibs.gluster.peer_ops import (
+            invalidate_peer_connectivity_cache)
+        from glustolibs.gluster.snap_ops import invalidate_snap_catalog
+        invalidate_peer_connectivity_cache()
+        invalidate_snap_catalog()
+    except ImportError:
+        pass
+
     halt = 120
     counter = 0
 
@@ -556,7 +567,7 @@ def drop_caches(hosts):
     cmd = "echo 3 > /proc/sys/vm/drop_caches"
     results = g.run_parallel(hosts, cmd)
     _rc = True
-    for host, ret_values in results.iteritems():
+    for host, ret_values in results.items():
         retcode, _, _ = ret_values
         if retcode != 0:
             g.log.error("Unable to drop cache on host %s", host)